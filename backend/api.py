@@ -1,18 +1,29 @@
+from startup import profiler  # first, so STARTUP_PROFILE=1 times every import below
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from main import Main, preprocess_user_input
+from main import Main, preprocess_user_input, preprocess_batch_input
 from pydantic import BaseModel
-from fastapi import Query
 import pandas as pd
-from models.linear_regression import Linear_Regression
-from models.random_forest import Random_Forest
-from models.xgboost import XGBoost_Regression
-import requests
-import os
-from fastapi import Body
-from segmentation import Segmentation
-from churn import Churn
+import numpy as np
+from segmentation import Segmentation, summarize_clusters
+from churn import churn_model_ready, get_churn_model
+from ingest import append_records
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import HTTPException
+from fastapi.responses import JSONResponse, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi import Header
+from fastapi import UploadFile, File
+from artifacts import training_mode
+from registry import normalize_model_name, registry
+from plot_cache import (DEFAULT_PLOT_SIZE, get_residual_plot, get_residual_points, plot_cache,
+                        prerender_residual_plot, residual_plot_key, residual_points_key)
+from plotting import MAX_RESIDUAL_POINTS, PLOT_FORMATS
+from quantiles import MAX_BOXPLOT_OUTLIERS
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, CPU_REQUESTS_ADMITTED, MetricsMiddleware,
+                     count_cache, render_metrics, timed)
+from workers import WorkerPoolBusy, admitted_count, offload, shutdown_process_pool, start_process_pool
 
 '''
 To start FastAPI Server from root of repository
@@ -22,9 +33,61 @@ Open Swagger UI
 http://127.0.0.1:8000/docs
 '''
 
-app = FastAPI()
-main_instance = Main()
-df = main_instance.get_df()
+profiler.mark("import dependencies")
+
+main_instance = Main()  # cheap: the dataset is loaded on first use
+
+# imported by the workers as they start, in the background, rather than by their first task
+WORKER_PRELOAD_MODULES = ["segmentation", "sklearn.cluster", "sklearn.neighbors", "sklearn.metrics",
+                          "matplotlib.figure", "matplotlib.backends.backend_agg"]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # fits, clustering and plots run on this pool (see workers.py)
+    with profiler.stage("start process pool"):
+        start_process_pool(preload_modules=WORKER_PRELOAD_MODULES)
+    # residual plots are rendered as soon as a model is loaded or trained (see plot_cache.py)
+    registry.add_listener(prerender_residual_plot)
+    # warm start from artifacts built by `python -m backend.train` (no training here)
+    with profiler.stage("load artifacts"):
+        registry.load_from_store(main_instance.fingerprint)
+    profiler.report()
+    profiler.uninstall()  # later imports (lazy ones on request paths) are not timed
+    yield
+    shutdown_process_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def get_model(model_name):
+    """Shared trained model for the current dataset (trained or loaded once, see registry.py)."""
+    # the dataset is only loaded if the model has to be trained
+    return registry.get(model_name, lambda: main_instance.feature_matrix,
+                        fingerprint=main_instance.fingerprint,
+                        standardization_params=lambda: main_instance.standardization_params)
+
+
+async def load_model(model_name):
+    """get_model for async handlers: only a model that still has to be loaded or trained leaves the event loop."""
+    model = registry.get_loaded(model_name, main_instance.fingerprint)
+    if model is None:
+        model = await asyncio.to_thread(get_model, model_name)
+    return model
+
+
+async def load_churn_model():
+    if churn_model_ready():
+        return get_churn_model()
+    return await asyncio.to_thread(get_churn_model)
+
+
+@app.exception_handler(WorkerPoolBusy)
+async def worker_pool_busy(request, exc):
+    # admission control: shed CPU-bound requests instead of queueing them behind a busy pool
+    return JSONResponse(status_code=503, headers={"Retry-After": "1"},
+                        content={"detail": "Server is busy with other CPU-bound requests, retry shortly."})
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,6 +96,21 @@ app.add_middleware(
     allow_methods=["*"],  # allows all http methods (GET, POST, PUT, etc)
     allow_headers=["*"],  # allows all headers
 )
+# outermost: request latency per route template and in-flight requests, see metrics.py
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Request latencies, stage timers, retrains and cache hit rates in the Prometheus text format."""
+    CPU_REQUESTS_ADMITTED.set(admitted_count())
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
+def json_response(content):
+    """Encode a large JSON response in the handler, so the time it takes shows up as the "serialize" stage."""
+    with timed("serialize"):
+        return JSONResponse(jsonable_encoder(content))
 
 # input schema
 
@@ -50,55 +128,44 @@ class ModelInput(BaseModel):
 
 
 @app.post("/predict/linear-regression")
-def predict_linear_regression(input: ModelInput):
+async def predict_linear_regression(input: ModelInput):
     user_input = input.model_dump()
-    model = Linear_Regression(df)
-    model.linear_regression()
+    model = await load_model("linear-regression")
     feature_columns = list(model.feature_columns)
     input_df = preprocess_user_input(user_input, feature_columns)
-    prediction = model.model.predict(input_df)[0]
+    with timed("predict"):
+        prediction = model.predict(input_df)[0]
     return {"prediction": prediction}
 
 
 @app.post("/predict/random-forest")
-def predict_random_forest(input: ModelInput):
+async def predict_random_forest(input: ModelInput):
     user_input = input.model_dump()
-    model = Random_Forest(df)
-    model.random_forest_regressor()
+    model = await load_model("random-forest")
     feature_columns = model.feature_columns
     input_df = preprocess_user_input(user_input, feature_columns)
-    prediction = model.predict(input_df)[0]
+    with timed("predict"):
+        prediction = model.predict(input_df)[0]
     return {"prediction": prediction}
 
 
 @app.post("/predict/xgboost")
-def predict_xgboost(input: ModelInput):
+async def predict_xgboost(input: ModelInput):
     user_input = input.model_dump()
-    model = XGBoost_Regression(df)
-    model.xgboost_regression()
+    model = await load_model("xgboost")
     feature_columns = list(model.feature_columns)
     input_df = preprocess_user_input(user_input, feature_columns)
-    prediction = model.model.predict(input_df)[0]
+    with timed("predict"):
+        prediction = model.predict(input_df)[0]
     return {"prediction": float(prediction)}
 
 
 @app.get("/model-stats/{model_name}")
-def get_model_stats(model_name: str):
-    if model_name == "linear-regression":
-        model = Linear_Regression(df)
-        model.linear_regression()
-        stats = model.get_stats()
-    elif model_name == "random-forest":
-        model = Random_Forest(df)
-        model.random_forest_regressor()
-        stats = model.get_stats()
-    elif model_name == "xgboost":
-        model = XGBoost_Regression(df)
-        model.xgboost_regression()
-        stats = model.get_stats()
-    else:
+async def get_model_stats(model_name: str):
+    if model_name not in ["linear-regression", "random-forest", "xgboost"]:
         return {"error": "Invalid model name"}
-    return stats
+    model = await load_model(model_name)
+    return model.get_stats()
 
 
 @app.get("/segmentation/features")
@@ -150,113 +217,97 @@ def get_segmentation_features():
 class KMeansInput(BaseModel):
     features: list[str]
     n_clusters: int = 3
+    engine: str = "auto"  # "auto", "exact" or "minibatch" (see Segmentation.fit_kmeans)
 
 
 @app.post("/segmentation/kmeans")
-def kmeans_segmentation(input: KMeansInput):
-    seg = Segmentation(df)
-    df_clusters = seg.k_means_cluster(
-        input.features, n_clusters=input.n_clusters, plot=False)
-
-    clusters = df_clusters['Cluster'].unique()
-    stats = {}
-    for cluster in clusters:
-        cluster_df = df_clusters[df_clusters['Cluster'] == cluster]
-        size = len(cluster_df)
-
-        numeric_features = [
-            ("avg_total_spend", "Total Spend"),
-            ("avg_age", "Age"),
-            ("avg_items_purchased", "Items Purchased"),
-            ("avg_rating", "Average Rating"),
-            ("avg_days_since_last_purchase", "Days Since Last Purchase")
-        ]
-        numeric_averages = {}
-        for stat_name, col_name in numeric_features:
-            if col_name in cluster_df.columns:
-                value = cluster_df[col_name].mean()
-
-                # unstandardize columns before returning to frontend
-                if col_name in ["Age", "Items Purchased", "Average Rating", "Days Since Last Purchase"]:
-                    std = main_instance.standardization_params[col_name]["std"]
-                    mean = main_instance.standardization_params[col_name]["mean"]
-                    value = (value * std) + mean
-                numeric_averages[stat_name] = value
-            else:
-                numeric_averages[stat_name] = 0
-        pct_discount = cluster_df['Discount Applied'].mean() * 100
-
-        gender_dist = cluster_df['Gender'].value_counts(
-            normalize=True).to_dict() if 'Gender' in cluster_df.columns else {}
-        membership_dist = cluster_df['Membership Type'].value_counts(
-            normalize=True).to_dict() if 'Membership Type' in cluster_df.columns else {}
-        satisfaction_dist = cluster_df['Satisfaction Level'].value_counts(
-            normalize=True).to_dict() if 'Satisfaction Level' in cluster_df.columns else {}
-        stats[int(cluster)] = {
-            'size': size,
-            **numeric_averages,
-            'pct_discount_applied': pct_discount,
-            'gender_distribution': gender_dist,
-            'membership_type_distribution': membership_dist,
-            'satisfaction_level_distribution': satisfaction_dist
+async def kmeans_segmentation(input: KMeansInput):
+    return json_response(await offload(run_kmeans_segmentation, input))
+
+
+def run_kmeans_segmentation(input):
+    seg = Segmentation(main_instance.get_df(), fingerprint=main_instance.fingerprint,
+                       matrix=main_instance.feature_matrix)
+    try:
+        result = seg.fit_kmeans(input.features, n_clusters=input.n_clusters, engine=input.engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # the labels of the fit above: no second cache lookup
+    df_clusters = seg.df.assign(Cluster=result.labels)
+
+    stats = summarize_clusters(df_clusters, main_instance.standardization_params)
+    return {
+        "stats": stats,
+        "fit": {
+            "engine": result.engine,
+            "inertia": result.inertia,
+            "n_iter": result.n_iter,
+            "converged": result.converged
         }
-    return {"stats": stats}
+    }
+
+
+class KMeansSweepInput(BaseModel):
+    features: list[str]
+    k_min: int = 2
+    k_max: int = 10
+    engine: str = "auto"
+
+
+@app.post("/segmentation/kmeans/sweep")
+async def kmeans_sweep(input: KMeansSweepInput):
+    """Inertia (elbow), silhouette and cluster sizes for every k in [k_min, k_max]."""
+    return json_response(await offload(run_kmeans_sweep, input))
+
+
+def run_kmeans_sweep(input):
+    seg = Segmentation(main_instance.get_df(), fingerprint=main_instance.fingerprint,
+                       matrix=main_instance.feature_matrix)
+    try:
+        results = seg.kmeans_sweep(input.features, k_min=input.k_min, k_max=input.k_max,
+                                   engine=input.engine)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    sweep = []
+    for result in results:
+        n_clusters = len(result.centers)
+        sweep.append({
+            "n_clusters": n_clusters,
+            "inertia": result.inertia,
+            "silhouette": result.silhouette,
+            "sizes": np.bincount(result.labels, minlength=n_clusters).tolist(),
+            "engine": result.engine,
+            "n_iter": result.n_iter,
+            "converged": result.converged
+        })
+    return {"features": results[0].features, "sweep": sweep}
 
 
 class DBSCANInput(BaseModel):
     features: list[str]
     eps: float = 0.5
     min_samples: int = 5
+    mode: str = "auto"  # "auto", "exact", "indexed" or "sampled" (see Segmentation.fit_dbscan)
+    sample_size: int | None = None
 
 
 @app.post("/segmentation/dbscan")
-def dbscan_segmentation(input: DBSCANInput):
-    seg = Segmentation(df)
-    df_clusters = seg.dbscan_cluster(
-        input.features, eps=input.eps, min_samples=input.min_samples, plot=False)
-
-    clusters = df_clusters['Cluster'].unique()
-    stats = {}
-    for cluster in clusters:
-        cluster_df = df_clusters[df_clusters['Cluster'] == cluster]
-        size = len(cluster_df)
-
-        numeric_features = [
-            ("avg_total_spend", "Total Spend"),
-            ("avg_age", "Age"),
-            ("avg_items_purchased", "Items Purchased"),
-            ("avg_rating", "Average Rating"),
-            ("avg_days_since_last_purchase", "Days Since Last Purchase")
-        ]
-        numeric_averages = {}
-        for stat_name, col_name in numeric_features:
-
-            # unstandardize data before sending to frontend
-            if col_name in cluster_df.columns:
-                value = cluster_df[col_name].mean()
-                if col_name in ["Age", "Items Purchased", "Average Rating", "Days Since Last Purchase"]:
-                    std = main_instance.standardization_params[col_name]["std"]
-                    mean = main_instance.standardization_params[col_name]["mean"]
-                    value = (value * std) + mean
-                numeric_averages[stat_name] = value
-            else:
-                numeric_averages[stat_name] = 0
-        pct_discount = cluster_df['Discount Applied'].mean() * 100
-
-        gender_dist = cluster_df['Gender'].value_counts(
-            normalize=True).to_dict() if 'Gender' in cluster_df.columns else {}
-        membership_dist = cluster_df['Membership Type'].value_counts(
-            normalize=True).to_dict() if 'Membership Type' in cluster_df.columns else {}
-        satisfaction_dist = cluster_df['Satisfaction Level'].value_counts(
-            normalize=True).to_dict() if 'Satisfaction Level' in cluster_df.columns else {}
-        stats[int(cluster)] = {
-            'size': size,
-            **numeric_averages,
-            'pct_discount_applied': pct_discount,
-            'gender_distribution': gender_dist,
-            'membership_type_distribution': membership_dist,
-            'satisfaction_level_distribution': satisfaction_dist
-        }
+async def dbscan_segmentation(input: DBSCANInput):
+    return json_response(await offload(run_dbscan_segmentation, input))
+
+
+def run_dbscan_segmentation(input):
+    seg = Segmentation(main_instance.get_df(), fingerprint=main_instance.fingerprint,
+                       matrix=main_instance.feature_matrix)
+    try:
+        df_clusters = seg.dbscan_cluster(
+            input.features, eps=input.eps, min_samples=input.min_samples, plot=False,
+            mode=input.mode, sample_size=input.sample_size)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    stats = summarize_clusters(df_clusters, main_instance.standardization_params)
     return {"stats": stats}
 
 
@@ -274,19 +325,8 @@ class ChurnInput(BaseModel):
 
 
 @app.post("/predict/churn")
-def predict_churn(input: ChurnInput):
-    csv_path = os.path.join(os.path.dirname(__file__),
-                            'e-com_customer_behavior.csv')
-    raw_df = pd.read_csv(csv_path)
-
-    most_common = raw_df["Satisfaction Level"].mode()[0]
-    raw_df["Satisfaction Level"] = raw_df["Satisfaction Level"].fillna(
-        most_common)
-    raw_df["Discount Applied"] = raw_df["Discount Applied"].astype(int)
-
-    raw_df = pd.get_dummies(
-        raw_df, columns=['Gender', 'City', 'Membership Type', 'Satisfaction Level'])
-    churn_model = Churn(raw_df)
+async def predict_churn(input: ChurnInput):
+    churn_model = await load_churn_model()
 
     input_dict = input.model_dump()
     input_dict["Total Spend"] = input_dict.pop("Total_Spend")
@@ -296,16 +336,9 @@ def predict_churn(input: ChurnInput):
     input_dict["Days Since Last Purchase"] = input_dict.pop(
         "Days_Since_Last_Purchase")
 
-    input_df = preprocess_user_input(input_dict, churn_model.df.drop(
-        columns=["Customer ID", "churn_risk"]).columns)
-
-    risk = int(churn_model.model.predict(input_df)[0])
-    proba_array = churn_model.model.predict_proba(input_df)[0]
-
-    if len(proba_array) == 1:
-        proba = float(proba_array[0])
-    else:
-        proba = float(proba_array[1])
+    input_df = preprocess_user_input(input_dict, churn_model.feature_columns)
+    with timed("predict"):
+        risk, proba = churn_model.predict_risk(input_df)
     return {
         "churn_risk": risk,
         "probability": proba,
@@ -313,49 +346,293 @@ def predict_churn(input: ChurnInput):
     }
 
 
+# ---------------------- Batch Prediction ---------------------- #
+
+REGRESSION_MODELS = ["linear-regression", "random-forest", "xgboost"]
+
+# columns a batch CSV needs, using the same names as e-com_customer_behavior.csv
+REGRESSION_CSV_COLUMNS = [
+    "Gender", "Age", "City", "Membership Type", "Items Purchased", "Average Rating",
+    "Discount Applied", "Days Since Last Purchase", "Satisfaction Level"
+]
+CHURN_CSV_COLUMNS = REGRESSION_CSV_COLUMNS + ["Total Spend"]
+
+
+class BatchModelInput(BaseModel):
+    records: list[ModelInput]
+
+
+class BatchChurnInput(BaseModel):
+    records: list[ChurnInput]
+
+
+def read_batch_csv(file, required_columns):
+    try:
+        batch_df = pd.read_csv(file.file)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Could not parse the uploaded CSV file.")
+    missing = [col for col in required_columns if col not in batch_df.columns]
+    if missing:
+        raise HTTPException(
+            status_code=400, detail=f"CSV is missing required columns: {missing}")
+    batch_df["Discount Applied"] = batch_df["Discount Applied"].astype(int)
+    return batch_df
+
+
+def predict_regression_batch(model_name, batch_df):
+    if model_name not in REGRESSION_MODELS:
+        raise HTTPException(
+            status_code=400, detail="Invalid model name. Use 'linear-regression', 'random-forest', 'xgboost' or 'churn'.")
+    model = get_model(model_name)
+    input_df = preprocess_batch_input(batch_df, list(model.feature_columns))
+    with timed("predict"):
+        predictions = model.predict(input_df)
+    result = {"model": model_name, "predictions": predictions.astype(float).tolist()}
+    if "Customer ID" in batch_df.columns:
+        result["customer_id"] = batch_df["Customer ID"].tolist()
+    return result
+
+
+def predict_churn_batch(batch_df):
+    churn_model = get_churn_model()
+    input_df = preprocess_batch_input(batch_df, churn_model.feature_columns)
+    with timed("predict"):
+        risks, probas = churn_model.predict_risk_batch(input_df)
+    result = {
+        "churn_risk": risks.tolist(),
+        "probability": probas.astype(float).tolist(),
+        "model_accuracy": churn_model.accuracy
+    }
+    if "Customer ID" in batch_df.columns:
+        result["customer_id"] = batch_df["Customer ID"].tolist()
+    return result
+
+
+# churn routes are declared first so they take precedence over /predict/{model_name}/batch
+@app.post("/predict/churn/batch")
+def predict_churn_batch_records(input: BatchChurnInput):
+    batch_df = pd.DataFrame([record.model_dump() for record in input.records])
+    return predict_churn_batch(batch_df)
+
+
+@app.post("/predict/churn/batch/csv")
+def predict_churn_batch_csv(file: UploadFile = File(...)):
+    return predict_churn_batch(read_batch_csv(file, CHURN_CSV_COLUMNS))
+
+
+@app.post("/predict/{model_name}/batch")
+def predict_batch_records(model_name: str, input: BatchModelInput):
+    batch_df = pd.DataFrame([record.model_dump() for record in input.records])
+    return predict_regression_batch(model_name, batch_df)
+
+
+@app.post("/predict/{model_name}/batch/csv")
+def predict_batch_csv(model_name: str, file: UploadFile = File(...)):
+    return predict_regression_batch(model_name, read_batch_csv(file, REGRESSION_CSV_COLUMNS))
+
+
+# plot endpoints answer with "base64" (JSON {"image_base64": ...}, the default), "image"
+# (the raw image bytes) or "data" (what the chart is drawn from, for client-side rendering)
+PLOT_RESPONSES = ["base64", "image", "data"]
+
+
+def check_plot_response(response, fmt):
+    if response not in PLOT_RESPONSES:
+        raise HTTPException(status_code=400, detail=f"Invalid response '{response}'. Use one of {PLOT_RESPONSES}.")
+    if fmt not in PLOT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format '{fmt}'. Use one of {list(PLOT_FORMATS)}.")
+
+
 class ResidualPlotRequest(BaseModel):
     model: str
+    width: float = DEFAULT_PLOT_SIZE[0]  # inches
+    height: float = DEFAULT_PLOT_SIZE[1]
+    format: str = "png"  # "png", "svg" or "webp"
+    response: str = "base64"  # see PLOT_RESPONSES
+    points: int = MAX_RESIDUAL_POINTS  # residual points returned with response="data"
 
 
-@app.post("/residual-plot")
-def get_residual_plot(request: ResidualPlotRequest):
-    model_name = request.model.lower()
-    if model_name == "linear_regression":
-        model = Linear_Regression(df)
-        model.linear_regression()
-        img_base64 = model.plot_residuals()
-    elif model_name == "random_forest":
-        model = Random_Forest(df)
-        model.random_forest_regressor()
-        img_base64 = model.plot_residuals()
-    elif model_name == "xgboost":
-        model = XGBoost_Regression(df)
-        model.xgboost_regression()
-        img_base64 = model.plot_residuals()
-    else:
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+async def residual_plot_entry(model_name, response="base64", width=DEFAULT_PLOT_SIZE[0],
+                              height=DEFAULT_PLOT_SIZE[1], fmt="png", points=MAX_RESIDUAL_POINTS):
+    """Cached residual plot (or its points): a dictionary lookup unless it still has to be rendered."""
+    model_name = model_name.lower()
+    if model_name not in ["linear_regression", "random_forest", "xgboost"]:
         raise HTTPException(
             status_code=400, detail="Invalid model name. Use 'linear_regression', 'random_forest', or 'xgboost'.")
-    return {"image_base64": img_base64}
+    check_plot_response(response, fmt)
+    name = normalize_model_name(model_name)
+    fingerprint = main_instance.fingerprint
+    # a stale model and the refit replacing it share a registry key, not their plots;
+    # in-memory and streaming fits of a model (see artifacts.py) share neither
+    model = await load_model(name)
+    stale, training = registry.is_stale(name, fingerprint), training_mode(model)
+    if response == "data":
+        key = residual_points_key(name, fingerprint, max_points=points, stale=stale, training=training)
+        build, options = get_residual_points, {"max_points": points, "stale": stale}
+    else:
+        key = residual_plot_key(name, fingerprint, width=width, height=height, fmt=fmt, stale=stale,
+                                training=training)
+        build, options = get_residual_plot, {"width": width, "height": height, "fmt": fmt, "stale": stale}
+
+    entry = plot_cache.get(key)
+    count_cache("plots", hit=entry is not None)
+    if entry is None:
+        try:
+            entry = await offload(build, name, model, fingerprint, **options)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    return entry
+
+
+def cached_plot_response(entry, if_none_match, response="base64"):
+    # the URL stays the same when the model is retrained: clients revalidate with the ETag
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    if response == "base64":
+        return JSONResponse({"image_base64": entry.base64}, headers=headers)
+    return Response(content=entry.data, media_type=entry.media_type, headers=headers)
+
+
+@app.post("/residual-plot")
+async def get_residual_plot_json(request: ResidualPlotRequest, if_none_match: str | None = Header(default=None)):
+    entry = await residual_plot_entry(request.model, request.response, request.width, request.height,
+                                      request.format, request.points)
+    return cached_plot_response(entry, if_none_match, request.response)
+
+
+@app.get("/residual-plot/{model_name}")
+async def get_residual_plot_cached(model_name: str, response: str = "base64", width: float = DEFAULT_PLOT_SIZE[0],
+                                   height: float = DEFAULT_PLOT_SIZE[1], format: str = "png",
+                                   points: int = MAX_RESIDUAL_POINTS,
+                                   if_none_match: str | None = Header(default=None)):
+    """
+    Same as POST /residual-plot, as a GET so browsers can cache it and revalidate with If-None-Match.
+    With response=image it can be used directly as an <img> src.
+    """
+    entry = await residual_plot_entry(model_name, response, width, height, format, points)
+    return cached_plot_response(entry, if_none_match, response)
 
 
 class BoxplotRequest(BaseModel):
     features: list[str]
     n_clusters: int
     feature_to_plot: str
+    engine: str = "auto"
+    format: str = "png"  # image format with response="image"
+    response: str = "base64"  # see PLOT_RESPONSES; "data" returns per-cluster quartiles and whiskers
+    method: str = "auto"  # quartiles: "exact", "sketch" (approximate, for very large segments) or "auto"
+
+
+class BoxplotStatsRequest(BaseModel):
+    features: list[str]
+    n_clusters: int
+    feature_to_plot: str
+    engine: str = "auto"
+    method: str = "auto"
+    max_outliers: int = MAX_BOXPLOT_OUTLIERS
 
 
 @app.post("/segmentation/boxplot")
-def get_segmentation_boxplot(request: BoxplotRequest):
-    seg = Segmentation(df)
-    img_base64 = seg.plot_feature_boxplot_by_cluster(
-        request.features,
+async def get_segmentation_boxplot(request: BoxplotRequest):
+    check_plot_response(request.response, request.format)
+    return await offload(run_segmentation_boxplot, request)
+
+
+def run_segmentation_boxplot(request):
+    seg = Segmentation(main_instance.get_df(), fingerprint=main_instance.fingerprint,
+                       matrix=main_instance.feature_matrix)
+    options = dict(
         n_clusters=request.n_clusters,
         feature_to_plot=request.feature_to_plot,
-        standardization_params=main_instance.standardization_params
+        standardization_params=main_instance.standardization_params,
+        engine=request.engine,
+        method=request.method
     )
+    try:
+        if request.response == "data":
+            stats = seg.feature_boxplot_stats(request.features, **options)
+            return {"feature": request.feature_to_plot, "method": request.method, "clusters": stats}
+        if request.response == "image":
+            image = seg.plot_feature_boxplot_by_cluster(request.features, fmt=request.format, **options)
+            return Response(content=image, media_type=PLOT_FORMATS[request.format])
+        img_base64 = seg.plot_feature_boxplot_by_cluster(request.features, **options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return {"image_base64": img_base64}
 
 
+@app.post("/segmentation/boxplot/stats")
+async def get_segmentation_boxplot_stats(request: BoxplotStatsRequest):
+    """Per-cluster quartiles, whiskers and a capped outlier sample of one feature, as JSON."""
+    if request.max_outliers < 0:
+        raise HTTPException(status_code=400, detail="max_outliers must not be negative")
+    return json_response(await offload(run_segmentation_boxplot_stats, request))
+
+
+def run_segmentation_boxplot_stats(request):
+    seg = Segmentation(main_instance.get_df(), fingerprint=main_instance.fingerprint,
+                       matrix=main_instance.feature_matrix)
+    try:
+        stats = seg.feature_boxplot_stats(
+            request.features,
+            n_clusters=request.n_clusters,
+            feature_to_plot=request.feature_to_plot,
+            standardization_params=main_instance.standardization_params,
+            engine=request.engine,
+            method=request.method,
+            max_outliers=request.max_outliers
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"feature": request.feature_to_plot, "method": request.method, "clusters": stats}
+
+
+class AppendRecord(BaseModel):
+    Customer_ID: int | None = None  # numbered on from the largest id when missing
+    Gender: str
+    Age: float
+    City: str
+    Membership_Type: str
+    Total_Spend: float
+    Items_Purchased: int
+    Average_Rating: float
+    Discount_Applied: bool
+    Days_Since_Last_Purchase: int
+    Satisfaction_Level: str | None = None  # imputed with the most common level when missing
+
+
+class AppendInput(BaseModel):
+    records: list[AppendRecord]
+
+
+@app.post("/data/append")
+async def append_data(input: AppendInput):
+    """
+    Append customer records to the dataset. Linear regression and XGBoost are updated from the
+    new rows right away; the other models and the cached clusterings are refit in the background
+    (see ingest.py), the previous fits being served until then.
+    """
+    return await offload(run_append, input)
+
+
+def run_append(input):
+    records = pd.DataFrame([record.model_dump() for record in input.records])
+    try:
+        return append_records(records, dataset=main_instance.dataset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+profiler.mark("define routes")
+
 '''
 # testing api-endpoints
 url = "http://127.0.0.1:8000/predict/linear-regression"
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from functools import lru_cache
+from importlib import import_module, metadata
+
+import joblib
+
+# Bump when the payload layout below changes so old artifacts are ignored.
+# 2: the linear regression metrics saved with version 1 hold the MSE under "rmse"
+ARTIFACT_FORMAT_VERSION = 2
+
+DEFAULT_ARTIFACT_DIR = os.path.join(os.path.dirname(__file__), 'artifacts')
+
+# How a model was trained: on the in-memory dataset (train/test split of all rows) or
+# out-of-core from CSV chunks (per-chunk split, sampled holdout; see streaming.py).
+# Both fit the same data but are different models, so they never share an artifact.
+IN_MEMORY = "in-memory"
+STREAMING = "streaming"
+TRAINING_MODES = (IN_MEMORY, STREAMING)
+
+
+def training_mode(model):
+    """Training mode of a model wrapper; the streaming trainers set model.training."""
+    return getattr(model, 'training', IN_MEMORY)
+
+
+@lru_cache(maxsize=None)
+def library_version(module_name, distribution):
+    """Installed version of an ML library, read from its package metadata so it is not imported."""
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return import_module(module_name).__version__
+
+
+def artifact_key(model_name, params, data_hash, training=IN_MEMORY):
+    """
+    Version key of a trained model: changes whenever the training data, the
+    hyperparameters, the training mode, the payload format or the ML library versions change.
+    """
+    if training not in TRAINING_MODES:
+        raise ValueError(f"Unknown training mode '{training}', expected one of {', '.join(TRAINING_MODES)}")
+    spec = {
+        "format": ARTIFACT_FORMAT_VERSION,
+        "model": model_name,
+        "params": sorted(params.items()),
+        "data": data_hash,
+        "training": training,
+        "sklearn": library_version("sklearn", "scikit-learn"),
+        "xgboost": library_version("xgboost", "xgboost"),
+    }
+    encoded = json.dumps(spec, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class ArtifactStore:
+    """
+    On-disk store of fitted models.
+
+    Each artifact holds the fitted estimator state, the feature column order, the
+    standardization params of the training data and the holdout metrics. Artifacts
+    are written atomically, so several workers can share one directory, and are
+    loaded with mmap_mode='r' so workers share the numpy buffers through the OS page cache.
+    """
+
+    def __init__(self, root=DEFAULT_ARTIFACT_DIR):
+        self.root = root
+
+    def path_for(self, model_name, params, data_hash, training=IN_MEMORY):
+        key = artifact_key(model_name, params, data_hash, training)
+        return os.path.join(self.root, f"{model_name}-{key}.joblib")
+
+    def exists(self, model_name, params, data_hash, training=IN_MEMORY):
+        return os.path.exists(self.path_for(model_name, params, data_hash, training))
+
+    def save(self, model_name, params, data_hash, model, standardization_params=None):
+        """
+        Serialize a trained model wrapper (without its training DataFrame), under the
+        key of its own training mode (see training_mode).
+        """
+        training = training_mode(model)
+        state = {k: v for k, v in vars(model).items() if k != 'df'}
+        payload = {
+            "meta": {
+                "model": model_name,
+                "params": dict(params),
+                "data_hash": data_hash,
+                "training": training,
+                "format": ARTIFACT_FORMAT_VERSION,
+                "sklearn": library_version("sklearn", "scikit-learn"),
+                "xgboost": library_version("xgboost", "xgboost"),
+                "created_at": time.time(),
+            },
+            "state": state,
+            "feature_columns": list(model.feature_columns),
+            "standardization_params": {
+                col: dict(values) for col, values in (standardization_params or {}).items()},
+            "metrics": model.get_stats(),
+        }
+
+        path = self.path_for(model_name, params, data_hash, training)
+        os.makedirs(self.root, exist_ok=True)
+        # write to a temp file first so readers never see a partial artifact
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        os.close(fd)
+        try:
+            joblib.dump(payload, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+
+    def load(self, model_name, params, data_hash, model_class, training=IN_MEMORY):
+        """
+        Rebuild a trained model wrapper from its artifact, or return None if there
+        is no usable artifact for this (model, params, data, training mode) combination.
+        """
+        path = self.path_for(model_name, params, data_hash, training)
+        if not os.path.exists(path):
+            return None
+        try:
+            payload = joblib.load(path, mmap_mode='r')
+        except Exception:
+            # corrupt or unreadable artifact: fall back to retraining
+            return None
+        if payload["meta"].get("training") != training:
+            return None
+
+        model = model_class(None, **params)
+        vars(model).update(payload["state"])
+        model.standardization_params = payload["standardization_params"]
+        model.metrics = payload["metrics"]
+        model.training = training
+        return model
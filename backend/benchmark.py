@@ -0,0 +1,371 @@
+import argparse
+import fnmatch
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+
+if __package__:
+    # `python -m backend.benchmark` from the repository root: the backend modules use flat imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+from artifacts import library_version
+from dataset import CustomerDataset, clean_data, encode_and_standardize
+from main import Main, preprocess_batch_input, preprocess_user_input
+from registry import MODEL_SPECS, model_class
+from synthetic import write_csv
+
+'''
+Performance benchmarks on synthetic data (see synthetic.py), from 10k to 10M+ rows.
+
+Every case is timed `repeat` times (the median is reported) and then run once more
+under tracemalloc for its peak memory. Cases run in this process, without the worker
+pool, so the numbers are the work itself:
+
+load/parse, load/cached           reading and preprocessing the CSV, without / with the columnar cache
+fit/<model>, fit/churn            training each model on the full dataset
+predict/<model>/one, .../batch    one API record (preprocess_user_input + predict), a 1000-row batch
+preprocess_user_input             encoding one API record
+cluster/kmeans, cluster/dbscan    Segmentation.fit_kmeans / fit_dbscan (engine and mode "auto")
+cluster/k_means_cluster, ...      Segmentation.k_means_cluster / dbscan_cluster (plot=False): the fit
+  cluster/dbscan_cluster          and the frame with the labels, as the scripts and notebooks call them
+cluster/summary                   the per-cluster statistics of the K-Means result
+plot/...                          residual plot and points, boxplot statistics and rendering
+
+Fits and clusterings run --fit-repeat times (default once, they are slow at scale).
+
+Results are written as JSON. Given a baseline file (an earlier run), cases that got slower
+or use more memory by more than the tolerance are reported and the exit status is 1, so a
+CI job can stop a regression before it is deployed. A single run is too noisy for that
+tolerance: timings of fewer than MIN_GATED_REPEAT runs only count as regressions beyond
+SINGLE_RUN_TOLERANCE. For a tight gate on the fits as well, pass --fit-repeat 3 or more.
+
+From the root of the repository:
+python -m backend.benchmark                                    (10k and 100k rows)
+python -m backend.benchmark --rows 10000 1000000 10000000 --cases "fit/*" "load/*"
+python -m backend.benchmark --save-baseline backend/benchmark-baseline.json
+python -m backend.benchmark --baseline backend/benchmark-baseline.json --tolerance 0.3
+python -m backend.benchmark --fit-repeat 3 --baseline backend/benchmark-baseline.json
+
+Environment:
+BENCHMARK_DATA_DIR  where generated CSVs are kept and reused (default: a temporary directory)
+'''
+
+DEFAULT_ROWS = [10_000, 100_000]
+DEFAULT_REPEAT = 3
+DEFAULT_FIT_REPEAT = 1
+DEFAULT_TOLERANCE = 0.25
+
+# timings of fewer runs than this are a single sample: gated with the wider tolerance only
+MIN_GATED_REPEAT = 3
+SINGLE_RUN_TOLERANCE = 1.0
+
+# differences below these are timer and allocator noise, not regressions
+MIN_REGRESSION_SECONDS = 0.005
+MIN_REGRESSION_MB = 1.0
+
+# imported before the first case, so no case is charged for loading a library
+WARM_IMPORTS = ["sklearn.cluster", "sklearn.ensemble", "sklearn.metrics", "sklearn.neighbors",
+                "matplotlib.figure", "matplotlib.backends.backend_agg"]
+
+PREDICT_BATCH_ROWS = 1000
+CLUSTER_FEATURES = ["Age", "Items Purchased", "Average Rating"]
+SAMPLE_RECORD = {
+    "Gender": "Male", "Age": 27, "City": "San Francisco", "Membership_Type": "Gold",
+    "Items_Purchased": 14, "Average_Rating": 4.4, "Discount_Applied": True,
+    "Days_Since_Last_Purchase": 14, "Satisfaction_Level": "Satisfied",
+}
+
+# seconds: median over the timed runs; peak_mb: tracemalloc peak of one more run (None with memory off)
+BenchmarkResult = namedtuple("BenchmarkResult", ["case", "rows", "seconds", "min_seconds", "repeat", "peak_mb"])
+Regression = namedtuple("Regression", ["case", "rows", "metric", "baseline", "current"])
+
+
+class BenchmarkRun:
+    """Measures the selected cases of one dataset size and collects their results."""
+
+    def __init__(self, rows, patterns=None, repeat=DEFAULT_REPEAT, memory=True, fit_repeat=DEFAULT_FIT_REPEAT):
+        self.rows = rows
+        self.patterns = patterns
+        self.repeat = repeat
+        self.fit_repeat = fit_repeat
+        self.memory = memory
+        self.results = []
+
+    def selected(self, case):
+        return not self.patterns or any(fnmatch.fnmatch(case, pattern) for pattern in self.patterns)
+
+    def wanted(self, *cases):
+        return any(self.selected(case) for case in cases)
+
+    def measure(self, case, fn, repeat=None, needed=False):
+        """
+        Time fn() and record its result under `case`; returns what fn returned. A case that
+        is not selected is skipped, or run once untimed if a later case needs its result.
+        """
+        if not self.selected(case):
+            return fn() if needed else None
+        times = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            value = fn()
+            times.append(time.perf_counter() - start)
+        peak_mb = None
+        if self.memory:
+            tracemalloc.start()
+            try:
+                fn()
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            finally:
+                tracemalloc.stop()
+        result = BenchmarkResult(case, self.rows, statistics.median(times), min(times), len(times), peak_mb)
+        self.results.append(result)
+        print(format_result(result), flush=True)
+        return value
+
+
+def run_benchmarks(csv_path, rows, patterns=None, repeat=DEFAULT_REPEAT, memory=True,
+                   fit_repeat=DEFAULT_FIT_REPEAT):
+    """Run every selected case on the CSV (of `rows` rows). Returns [BenchmarkResult]."""
+    from churn import Churn, load_churn_data
+    from plotting import cluster_boxplot, residual_plot, residual_points
+    from quantiles import boxplot_stats
+    from segmentation import Segmentation, cluster_cache, neighbor_graph_cache, summarize_clusters
+
+    for module in WARM_IMPORTS:
+        importlib.import_module(module)
+    for name in MODEL_SPECS:
+        model_class(name)
+    run = BenchmarkRun(rows, patterns, repeat, memory, fit_repeat)
+
+    run.measure("load/parse", lambda: encode_and_standardize(clean_data(pd.read_csv(csv_path))))
+    CustomerDataset(csv_path).feature_matrix  # builds the columnar cache that load/cached reads
+    dataset = run.measure("load/cached", lambda: _load(csv_path), needed=True)
+    customers = Main(dataset=dataset)
+    matrix = customers.feature_matrix
+    batch = dataset.clean_df.head(PREDICT_BATCH_ROWS)
+
+    run.measure("preprocess_user_input", lambda: preprocess_user_input(SAMPLE_RECORD, matrix.feature_columns))
+
+    models = {}
+    for name, (_, train_method) in MODEL_SPECS.items():
+        dependents = [f"predict/{name}/one", f"predict/{name}/batch"]
+        if name == "linear-regression":
+            dependents += ["plot/residuals", "plot/residual_points"]
+        model = run.measure(f"fit/{name}", lambda: _fit(name, train_method, matrix), repeat=run.fit_repeat,
+                            needed=run.wanted(*dependents))
+        if model is None:
+            continue
+        models[name] = model
+        features = list(model.feature_columns)
+        run.measure(f"predict/{name}/one",
+                    lambda: model.predict(preprocess_user_input(SAMPLE_RECORD, features)))
+        run.measure(f"predict/{name}/batch", lambda: model.predict(preprocess_batch_input(batch, features)))
+
+    churn = run.measure("fit/churn", lambda: Churn(load_churn_data(dataset)), repeat=run.fit_repeat,
+                        needed=run.wanted("predict/churn/one"))
+    if churn is not None:
+        run.measure("predict/churn/one",
+                    lambda: churn.predict_risk(preprocess_user_input(SAMPLE_RECORD, churn.feature_columns)))
+
+    segmentation = Segmentation(customers.df, fingerprint=dataset.fingerprint, matrix=matrix)
+
+    def fit_kmeans():
+        cluster_cache.clear()  # time the fit, not the cache
+        return segmentation.fit_kmeans(CLUSTER_FEATURES, 3, engine="auto")
+
+    def fit_dbscan():
+        cluster_cache.clear()
+        neighbor_graph_cache.clear()  # every repeat builds the graph again
+        return segmentation.fit_dbscan(CLUSTER_FEATURES, eps=0.5, min_samples=5, mode="auto")
+
+    kmeans = run.measure("cluster/kmeans", fit_kmeans, repeat=run.fit_repeat,
+                         needed=run.wanted("cluster/summary", "plot/boxplot_stats", "plot/cluster_boxplot"))
+    run.measure("cluster/dbscan", fit_dbscan, repeat=run.fit_repeat)
+
+    def k_means_cluster():
+        cluster_cache.clear()
+        return segmentation.k_means_cluster(CLUSTER_FEATURES, 3, plot=False, engine="auto")
+
+    def dbscan_cluster():
+        cluster_cache.clear()
+        neighbor_graph_cache.clear()
+        return segmentation.dbscan_cluster(CLUSTER_FEATURES, eps=0.5, min_samples=5, plot=False, mode="auto")
+
+    run.measure("cluster/k_means_cluster", k_means_cluster, repeat=run.fit_repeat)
+    run.measure("cluster/dbscan_cluster", dbscan_cluster, repeat=run.fit_repeat)
+    if kmeans is not None:
+        run.measure("cluster/summary", lambda: summarize_clusters(
+            customers.df.assign(Cluster=kmeans.labels), customers.standardization_params))
+
+    if "linear-regression" in models:
+        model = models["linear-regression"]
+        y_true, y_pred = model.residual_data()
+        run.measure("plot/residuals", lambda: residual_plot(y_true, y_pred, model.residual_plot_title))
+        run.measure("plot/residual_points", lambda: residual_points(y_true, y_pred))
+    if kmeans is not None:
+        ages = dataset.clean_df["Age"].to_numpy()
+        stats = run.measure("plot/boxplot_stats", lambda: boxplot_stats(kmeans.labels + 1, ages),
+                            needed=run.wanted("plot/cluster_boxplot"))
+        if stats is not None:
+            run.measure("plot/cluster_boxplot", lambda: cluster_boxplot(stats, "Age"))
+    return run.results
+
+
+def _load(csv_path):
+    dataset = CustomerDataset(csv_path)
+    dataset.feature_matrix
+    return dataset
+
+
+def _fit(model_name, train_method, data):
+    model = model_class(model_name)(data)
+    getattr(model, train_method)()
+    return model
+
+
+# ---------------------- Results ---------------------- #
+
+
+def format_result(result):
+    memory = f"{result.peak_mb:9.1f} MB" if result.peak_mb is not None else ""
+    return f"{result.rows:>10}  {result.case:<32} {result.seconds * 1e3:12.2f} ms {memory}"
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "sklearn": library_version("sklearn", "scikit-learn"),
+        "xgboost": library_version("xgboost", "xgboost"),
+        "created_at": time.time(),
+    }
+
+
+def write_results(path, results):
+    payload = {"environment": environment(), "results": [result._asdict() for result in results]}
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(payload, file, indent=2)
+    return path
+
+
+def load_results(path):
+    with open(path) as file:
+        payload = json.load(file)
+    return [BenchmarkResult(**result) for result in payload["results"]]
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Regressions of `results` against `baseline` (both [BenchmarkResult]): cases, matched by name
+    and size, whose median time or peak memory grew by more than `tolerance` (0.25 = 25%) and
+    by more than the noise floor. Times measured fewer than MIN_GATED_REPEAT times on either
+    side are compared with SINGLE_RUN_TOLERANCE instead, if that is wider. Cases missing from
+    either side are not compared.
+    """
+    base = {(result.case, result.rows): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = base.get((result.case, result.rows))
+        if previous is None:
+            continue
+        single_run = min(result.repeat, previous.repeat) < MIN_GATED_REPEAT
+        for metric, floor in (("seconds", MIN_REGRESSION_SECONDS), ("peak_mb", MIN_REGRESSION_MB)):
+            current, before = getattr(result, metric), getattr(previous, metric)
+            if current is None or before is None:
+                continue
+            allowed = max(tolerance, SINGLE_RUN_TOLERANCE) if metric == "seconds" and single_run else tolerance
+            if current > before * (1 + allowed) and current - before > floor:
+                regressions.append(Regression(result.case, result.rows, metric, before, current))
+    return regressions
+
+
+def format_regression(regression):
+    unit = "s" if regression.metric == "seconds" else " MB"
+    return (f"REGRESSION {regression.case} ({regression.rows} rows): {regression.metric} "
+            f"{regression.baseline:.4g}{unit} -> {regression.current:.4g}{unit} "
+            f"({regression.current / regression.baseline - 1:+.0%})")
+
+
+# ---------------------- CLI ---------------------- #
+
+
+def dataset_path(data_dir, rows, seed):
+    """The synthetic CSV for this size, generated unless data_dir already has it."""
+    path = os.path.join(data_dir, f"customers-{rows}-seed{seed}.csv")
+    if not os.path.exists(path):
+        start = time.perf_counter()
+        write_csv(path, rows, seed=seed)
+        print(f"generated {rows} rows in {time.perf_counter() - start:.1f}s -> {path}", flush=True)
+    return path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading, training, inference, clustering and plotting.")
+    parser.add_argument("--rows", nargs="+", type=int, default=DEFAULT_ROWS,
+                        help="dataset sizes to benchmark (default: 10000 100000)")
+    parser.add_argument("--cases", nargs="+", metavar="PATTERN",
+                        help="only the cases matching these glob patterns, e.g. 'fit/*' (default: all)")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="timed runs per case, except fits and clusterings (see --fit-repeat)")
+    parser.add_argument("--fit-repeat", type=int, default=DEFAULT_FIT_REPEAT,
+                        help=f"timed runs of the fits and clusterings (default {DEFAULT_FIT_REPEAT}); with fewer "
+                             f"than {MIN_GATED_REPEAT} their times are gated with a {SINGLE_RUN_TOLERANCE:.0%} tolerance")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run of each case")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--data-dir", default=os.environ.get("BENCHMARK_DATA_DIR"),
+                        help="keep and reuse the generated CSVs here (default: a temporary directory)")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown (or memory growth) reported as a regression")
+    parser.add_argument("--save-baseline", metavar="PATH", help="also write the results here, as the new baseline")
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.fit_repeat < 1:
+        parser.error("--repeat and --fit-repeat must be at least 1")
+    if any(rows < 100 for rows in args.rows):
+        parser.error("--rows must be at least 100")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="benchmark-")
+    results = []
+    try:
+        for rows in args.rows:
+            csv_path = dataset_path(data_dir, rows, args.seed)
+            results.extend(run_benchmarks(csv_path, rows, args.cases, args.repeat, not args.no_memory,
+                                          args.fit_repeat))
+    finally:
+        if not args.data_dir:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(f"results -> {write_results(args.output, results)}")
+    if args.save_baseline:
+        print(f"baseline -> {write_results(args.save_baseline, results)}")
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.tolerance)
+        for regression in regressions:
+            print(format_regression(regression))
+        if regressions:
+            return 1
+        print(f"no regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
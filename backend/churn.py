@@ -1,11 +1,17 @@
+import threading
+
 import pandas as pd
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
+from dataset import get_dataset
+from metrics import count_train, timed
 
 
 class Churn:
     def __init__(self, df):
+        # sklearn is imported on the first fit, not when the API imports this module
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.metrics import accuracy_score
+        from sklearn.model_selection import train_test_split
+
         self.df = df.copy()
         self.df['churn_risk'] = (
             self.df['Days Since Last Purchase'] > 45).astype(int)
@@ -13,6 +19,7 @@ class Churn:
         X = self.df.drop(
             columns=["Customer ID", "churn_risk"], errors='ignore')
         y = self.df['churn_risk']
+        self.feature_columns = X.columns.tolist()
 
         self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
             X, y, test_size=0.2, random_state=42)
@@ -32,3 +39,83 @@ class Churn:
         X_new = customer_row.drop(
             labels=["Customer ID", "churn_risk"], errors='ignore').to_frame().T
         return int(self.model.predict(X_new)[0])
+
+    def predict_risk(self, input_df):
+        """
+        Return (churn_risk, probability of churn) for the first row of an encoded input,
+        using a single predict_proba call.
+        """
+        risks, probas = self.predict_risk_batch(input_df)
+        return int(risks[0]), float(probas[0])
+
+    def predict_risk_batch(self, input_df):
+        """Return arrays of churn risk labels and churn probabilities for every encoded row."""
+        proba_matrix = self.model.predict_proba(input_df)
+        risks = self.model.classes_[proba_matrix.argmax(axis=1)].astype(int)
+        if proba_matrix.shape[1] == 1:
+            probas = proba_matrix[:, 0]
+        else:
+            probas = proba_matrix[:, 1]
+        return risks, probas
+
+
+def load_churn_data(dataset=None):
+    """Cleaned customer data ('Satisfaction Level' imputed), one-hot encoded for the churn model."""
+    dataset = dataset or get_dataset()
+    return pd.get_dummies(
+        dataset.clean_df, columns=['Gender', 'City', 'Membership Type', 'Satisfaction Level'])
+
+
+def fit_churn_model(dataset=None):
+    data = load_churn_data(dataset)
+    with timed("fit"):
+        model = Churn(data)
+    count_train("churn")
+    return model
+
+
+_churn_model = None
+_churn_fingerprint = None  # of the dataset the shared churn model was fitted on
+_churn_lock = threading.Lock()
+_rebuild_lock = threading.Lock()
+
+
+def churn_model_ready():
+    """True once get_churn_model() has built the model, i.e. it returns without training."""
+    return _churn_model is not None
+
+
+def get_churn_model():
+    """
+    Shared churn pipeline: the encoded frame, its dummy column layout, the fitted
+    classifier and its accuracy are built once per process on first use. When the dataset
+    changed since (rows appended, possibly by another API worker), the model is refit in the
+    background and the previous one is served until then.
+    """
+    global _churn_model, _churn_fingerprint
+    if _churn_model is None:
+        with _churn_lock:
+            if _churn_model is None:
+                fingerprint = get_dataset().fingerprint
+                _churn_model, _churn_fingerprint = fit_churn_model(), fingerprint
+    elif _churn_fingerprint != get_dataset().fingerprint and not _rebuild_lock.locked():
+        threading.Thread(target=rebuild_churn_model, name="churn-refit", daemon=True).start()
+    return _churn_model
+
+
+def rebuild_churn_model(dataset=None):
+    """
+    Refit the shared churn model on the current data (e.g. after rows were appended, see
+    ingest.py) and swap it in; requests keep using the previous model until the fit is done.
+    Does nothing if the model already matches the data.
+    """
+    global _churn_model, _churn_fingerprint
+    dataset = dataset or get_dataset()
+    with _rebuild_lock:
+        fingerprint = dataset.fingerprint
+        if _churn_model is not None and _churn_fingerprint == fingerprint:
+            return _churn_model
+        model = fit_churn_model(dataset)
+        with _churn_lock:
+            _churn_model, _churn_fingerprint = model, fingerprint
+    return model
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+'''
+Typed columnar cache for CSV files.
+
+The first read of a CSV parses it with pandas and writes every column next to it as a .npy
+file: numeric and boolean columns keep their dtype, text columns are dictionary encoded
+(integer codes + a category list in the manifest). Later reads memory-map those files
+instead of parsing text, so several workers share the pages through the OS cache.
+
+Layout, for backend/e-com_customer_behavior.csv:
+backend/e-com_customer_behavior.csv.cache/current.json     -> {mtime_ns, size, sha256}
+backend/e-com_customer_behavior.csv.cache/<sha256[:16]>/   -> manifest.json + one .npy per column
+'''
+
+CACHE_FORMAT_VERSION = 1
+
+
+def cache_root_for(csv_path):
+    return csv_path + '.cache'
+
+
+def _file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _codes_dtype(n_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _atomic_write_json(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(df, cache_dir):
+    """Write df as one .npy file per column plus manifest.json into cache_dir (atomically)."""
+    parent = os.path.dirname(cache_dir)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.building-')
+    os.chmod(tmp_dir, 0o755)
+    try:
+        columns = []
+        for position, name in enumerate(df.columns):
+            series = df[name]
+            file_name = f"{position}.npy"
+            if pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+                np.save(os.path.join(tmp_dir, file_name), series.to_numpy())
+                columns.append({"name": name, "kind": "numeric",
+                               "dtype": str(series.dtype), "file": file_name})
+            else:
+                categories = sorted(series.dropna().unique().tolist())
+                codes = pd.Categorical(series, categories=categories).codes
+                np.save(os.path.join(tmp_dir, file_name),
+                        codes.astype(_codes_dtype(len(categories))))
+                columns.append({"name": name, "kind": "categorical",
+                               "categories": categories, "file": file_name})
+
+        manifest = {"format": CACHE_FORMAT_VERSION, "n_rows": len(df), "columns": columns}
+        with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        try:
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # another worker finished the same cache first
+            if not os.path.isdir(cache_dir):
+                raise
+    finally:
+        if os.path.isdir(tmp_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_cache(cache_dir):
+    """Memory-map a cache written by write_cache back into a DataFrame, or None if unusable."""
+    manifest = _read_json(os.path.join(cache_dir, 'manifest.json'))
+    if manifest is None or manifest.get("format") != CACHE_FORMAT_VERSION:
+        return None
+
+    data = {}
+    for column in manifest["columns"]:
+        values = np.load(os.path.join(cache_dir, column["file"]), mmap_mode='r')
+        if column["kind"] == "categorical":
+            data[column["name"]] = pd.Categorical.from_codes(
+                values, categories=column["categories"])
+        else:
+            data[column["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _fresh_pointer(csv_path, stat):
+    """The cache pointer of csv_path if it was written for the file's current mtime and size."""
+    pointer = _read_json(os.path.join(cache_root_for(csv_path), 'current.json'))
+    if pointer and pointer.get("mtime_ns") == stat.st_mtime_ns and pointer.get("size") == stat.st_size:
+        return pointer
+    return None
+
+
+def content_hash(csv_path):
+    """sha256 of the CSV's bytes, taken from the cache pointer while the file is unchanged."""
+    pointer = _fresh_pointer(csv_path, os.stat(csv_path))
+    if pointer is not None:
+        return pointer["sha256"]
+    return _file_sha256(csv_path)
+
+
+def read_csv_cached(csv_path):
+    """
+    pd.read_csv with a columnar cache. The cache is reused while the CSV's mtime and size
+    are unchanged; otherwise the file is hashed, and a cache is rebuilt only if its content
+    changed. Falls back to a plain read when the cache cannot be written.
+    """
+    cache_root = cache_root_for(csv_path)
+    pointer_path = os.path.join(cache_root, 'current.json')
+    stat = os.stat(csv_path)
+
+    pointer = _fresh_pointer(csv_path, stat)
+    if pointer is not None:
+        df = load_cache(os.path.join(cache_root, pointer["sha256"][:16]))
+        if df is not None:
+            return df
+
+    sha256 = _file_sha256(csv_path)
+    cache_dir = os.path.join(cache_root, sha256[:16])
+    df = load_cache(cache_dir)
+    if df is None:
+        parsed = pd.read_csv(csv_path)
+        try:
+            write_cache(parsed, cache_dir)
+        except OSError:
+            # read-only location: serve the parsed CSV without caching
+            return parsed
+        _remove_stale_caches(cache_root, keep=sha256[:16])
+        df = load_cache(cache_dir)
+
+    try:
+        _atomic_write_json(pointer_path, {
+            "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha256})
+    except OSError:
+        pass
+    return df
+
+
+def _remove_stale_caches(cache_root, keep):
+    """Drop caches of older CSV contents (open memory maps stay valid after unlinking)."""
+    for name in os.listdir(cache_root):
+        path = os.path.join(cache_root, name)
+        if name != keep and not name.startswith('.') and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
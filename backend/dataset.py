@@ -0,0 +1,471 @@
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from types import MappingProxyType
+
+import joblib
+import numpy as np
+import pandas as pd
+from csv_cache import content_hash, read_csv_cached
+from encoding import CATEGORICAL_COLUMNS, INPUT_RENAME_MAP, get_encoder
+from features import FeatureMatrix
+from metrics import timed
+
+try:
+    import fcntl
+except ImportError:  # Windows: reads and appends of several processes are not serialized
+    fcntl = None
+
+CSV_PATH = os.path.join(os.path.dirname(__file__), 'e-com_customer_behavior.csv')
+
+# set DATASET_CACHE=0 to always parse the CSV instead of using the columnar cache
+USE_COLUMNAR_CACHE = os.environ.get("DATASET_CACHE", "1") != "0"
+
+# how often (at most) a dataset checks whether another process appended to its CSV;
+# 0 checks on every access of the fingerprint
+DATASET_RECHECK_SECONDS = float(os.environ.get("DATASET_RECHECK_SECONDS", 1.0))
+
+# bump when clean_data or encode_and_standardize change: it is part of the dataset fingerprint,
+# so model artifacts trained on the old preprocessing stop matching
+PREPROCESSING_VERSION = 2
+
+STANDARDIZED_COLUMNS = [
+    "Age", "Items Purchased",
+    "Average Rating", "Days Since Last Purchase"
+]
+
+# rows: the appended records, cleaned (CSV columns, indexed from first_index);
+# previous_params: the standardization params before the append
+AppendedRows = namedtuple("AppendedRows", ["rows", "first_index", "previous_fingerprint", "fingerprint",
+                                           "previous_params"])
+
+
+def dataset_fingerprint(df):
+    """Content hash of a DataFrame (column names, index and values)."""
+    digest = hashlib.sha256()
+    digest.update("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def csv_fingerprint(csv_path, sha256=None):
+    """
+    Fingerprint of the training data produced from a CSV: its content hash plus the
+    preprocessing version. Needs no parsing, so in-memory and streamed training share it.
+    sha256 is the hex digest of the file's bytes when the caller already has it.
+    """
+    key = f"{PREPROCESSING_VERSION}:{sha256 or content_hash(csv_path)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def file_state(path):
+    """(size, mtime, inode) of a file: changes whenever it is appended to or replaced."""
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+@contextmanager
+def locked_csv(csv_path, exclusive=False):
+    """
+    Advisory lock on a CSV shared by several processes (e.g. uvicorn --workers): shared while
+    it is read, exclusive while rows are appended, so no process reads a half-written append.
+    Not reentrant within a process: do not nest it.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(csv_path, 'rb') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def merge_moments(moments, values):
+    """
+    Running (count, mean, M2) of a column updated with more values (Chan et al.), so means
+    and variances can grow with the data without another pass over the earlier rows.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return moments
+    n_a, mean_a, m2_a = moments
+    n_b, mean_b = len(values), values.mean()
+    m2_b = ((values - mean_b) ** 2).sum()
+    n = n_a + n_b
+    delta = mean_b - mean_a
+    return (n, mean_a + delta * n_b / n, m2_a + m2_b + delta * delta * n_a * n_b / n)
+
+
+def params_from_moments(moments):
+    """Standardization params (mean and sample std, ddof=1, like encode_and_standardize) from running moments."""
+    return {col: {"mean": float(mean), "std": float(np.sqrt(m2 / (n - 1)))}
+            for col, (n, mean, m2) in moments.items()}
+
+
+def clean_data(df):
+    """Impute missing values in 'Satisfaction Level' and convert 'Discount Applied' to numeric."""
+    most_common = df["Satisfaction Level"].mode()[0]
+    df["Satisfaction Level"] = df["Satisfaction Level"].fillna(most_common)
+    df["Discount Applied"] = df["Discount Applied"].astype(int)
+    return df
+
+
+def encode_and_standardize(df, columns_path=None):
+    """
+    One-hot encode categorical columns and standardize numerical columns.
+    Returns (encoded df, standardization params). The dummy column layout is only
+    written to disk when columns_path is given.
+    """
+    df = pd.get_dummies(df, columns=CATEGORICAL_COLUMNS)
+    if columns_path is not None:
+        joblib.dump(df.columns, columns_path)
+
+    standardization_params = {}
+    for col in STANDARDIZED_COLUMNS:
+        mean = df[col].mean()
+        std = df[col].std()
+        standardization_params[col] = {"mean": mean, "std": std}
+        df[col] = (df[col] - mean) / std
+    return df, standardization_params
+
+
+class CustomerDataset:
+    """
+    The customer CSV, loaded lazily on first access and then shared by the whole process.
+
+    Frames are handed out as shallow copies: with pandas copy-on-write they cost no data
+    copy, and changes made by a caller never leak back into the shared data. The encoded
+    data is kept once, as a FeatureMatrix (see features.py); encoded_df is a frame over it.
+
+    append() adds records without reloading: the standardization statistics are kept as
+    running moments, so only the new rows have to be summarized. The appended rows are
+    held back and folded into clean_df and the feature matrix (re-standardized with the
+    new params) on the next read of either, so a run of appends costs one pass over the data.
+
+    Several processes (API workers) may serve the same CSV. Each one remembers the state of
+    the file its data and fingerprint were read from; refresh() (called from the fingerprint,
+    at most every DATASET_RECHECK_SECONDS) reloads them once another process appended to it,
+    so every worker moves on to the new fingerprint, its models and its clusterings.
+    """
+
+    def __init__(self, csv_path=CSV_PATH):
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+        self._clean_df = None
+        self._feature_matrix = None
+        self._encoded_columns = None  # the one-hot layout of encode_and_standardize
+        self._standardization_params = None
+        self._fingerprint = None
+        self._moments = None  # column -> (count, mean, M2) of the standardized columns
+        self._satisfaction_counts = None  # imputation of appended rows uses the running mode
+        self._pending_rows = []  # appended rows not yet in clean_df and the feature matrix
+        self._n_rows = 0  # including the pending ones
+        self._max_customer_id = None  # appended records without an id are numbered on from it
+        self._csv_digest = None  # running sha256 of the CSV's bytes, kept up to date by append
+        self._csv_digest_state = None  # file_state() the digest is for
+        self._data_state = None  # file_state() of the CSV the data was read from
+        self._fingerprint_state = None  # and the one the fingerprint was computed from
+        self._checked_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._feature_matrix is not None:
+            return
+        with self._lock:
+            if self._feature_matrix is not None:
+                return
+            with locked_csv(self.csv_path):
+                self._load()
+
+    def _ensure_current(self):
+        """Load the data and fold in the rows appended since it was last read."""
+        self._ensure_loaded()
+        if not self._pending_rows:
+            return
+        with self._lock:
+            if self._pending_rows:
+                self._apply_appends()
+
+    def _load(self):
+        """Read the CSV into this dataset. Callers hold self._lock and a locked_csv() lock."""
+        state = file_state(self.csv_path)
+        with timed("load"):
+            raw_df = read_csv_cached(self.csv_path) if USE_COLUMNAR_CACHE else pd.read_csv(self.csv_path)
+            clean_df = clean_data(raw_df)
+            encoded_df, params = encode_and_standardize(clean_df.copy())
+        self._clean_df = clean_df
+        self._standardization_params = MappingProxyType(
+            {col: MappingProxyType(values) for col, values in params.items()})
+        self._moments = {col: merge_moments((0, 0.0, 0.0), clean_df[col]) for col in STANDARDIZED_COLUMNS}
+        self._satisfaction_counts = {
+            value: int(count) for value, count in clean_df["Satisfaction Level"].value_counts().items()}
+        self._encoded_columns = list(encoded_df.columns)
+        self._feature_matrix = FeatureMatrix.from_frame(encoded_df)
+        self._pending_rows = []
+        self._n_rows = len(clean_df)
+        self._max_customer_id = int(clean_df["Customer ID"].max())
+        self._data_state = state
+        if self._fingerprint_state != state:
+            self._fingerprint = None
+
+    def refresh(self, force=False):
+        """
+        Reload the data (if it was loaded) and the fingerprint when the CSV changed on disk since
+        they were read, e.g. because another API worker appended rows. Returns True if it did.
+        Checks the file at most every DATASET_RECHECK_SECONDS unless force is given.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < DATASET_RECHECK_SECONDS:
+            return False
+        self._checked_at = now
+        if self._data_state is None and self._fingerprint_state is None:
+            return False  # nothing read yet
+        state = file_state(self.csv_path)
+        if not self._stale(state):
+            return False
+        with self._lock:
+            with locked_csv(self.csv_path):
+                state = file_state(self.csv_path)
+                if not self._stale(state):
+                    return False
+                if self._feature_matrix is not None and state != self._data_state:
+                    self._load()
+                if self._fingerprint is not None and state != self._fingerprint_state:
+                    self._fingerprint = None
+        return True
+
+    def _stale(self, state):
+        """True if the loaded data or the fingerprint was read from another version of the CSV."""
+        return ((self._feature_matrix is not None and state != self._data_state)
+                or (self._fingerprint is not None and state != self._fingerprint_state))
+
+    def _current_fingerprint(self):
+        """The fingerprint of the loaded data. Callers hold self._lock and a locked_csv() lock."""
+        if self._fingerprint is None or self._fingerprint_state != self._data_state:
+            self._fingerprint = csv_fingerprint(self.csv_path)
+            self._fingerprint_state = self._data_state
+        return self._fingerprint
+
+    @property
+    def loaded(self):
+        return self._feature_matrix is not None
+
+    @property
+    def n_rows(self):
+        """Number of rows, appended ones included (does not apply pending appends)."""
+        self._ensure_loaded()
+        return self._n_rows
+
+    @property
+    def clean_df(self):
+        """Imputed data with the original categorical columns (not encoded or standardized)."""
+        self._ensure_current()
+        return self._clean_df.copy(deep=False)
+
+    @property
+    def encoded_df(self):
+        """
+        One-hot encoded data with standardized numeric columns, as used for training: a frame
+        over feature_matrix (float32 features, then the float64 id and target), not a copy.
+        """
+        return self.feature_matrix.frame()
+
+    @property
+    def feature_matrix(self):
+        """The encoded data as a FeatureMatrix (see features.py): the one copy kept in memory."""
+        self._ensure_current()
+        return self._feature_matrix
+
+    @property
+    def standardization_params(self):
+        """Read-only {column: {"mean": ..., "std": ...}} used to standardize encoded_df."""
+        self._ensure_loaded()
+        return self._standardization_params
+
+    @property
+    def dummy_columns(self):
+        self._ensure_loaded()
+        return list(self._encoded_columns)
+
+    @property
+    def fingerprint(self):
+        """Fingerprint of the CSV contents and preprocessing (does not load the data)."""
+        self.refresh()
+        fingerprint = self._fingerprint
+        if fingerprint is None:
+            with self._lock:
+                if self._fingerprint is None:
+                    with locked_csv(self.csv_path):
+                        state = file_state(self.csv_path)
+                        if self._feature_matrix is not None and state != self._data_state:
+                            self._load()  # the loaded data must match the fingerprint
+                        self._fingerprint = csv_fingerprint(self.csv_path)
+                        self._fingerprint_state = state
+                fingerprint = self._fingerprint
+        return fingerprint
+
+    # ---------------------- Appends ---------------------- #
+
+    def append(self, records, persist=True):
+        """
+        Add customer records without reloading the dataset. records is a DataFrame with the CSV's
+        columns (or the API's field names); 'Customer ID' is optional (numbered on from the largest
+        id) and a missing 'Satisfaction Level' is imputed with the current most common level.
+        Categories must be known ones, since a new category would change every model's input layout.
+
+        Only the new rows are touched: the standardization params are updated from running
+        moments, and the rows are queued until clean_df or the feature matrix is read next
+        (see _apply_appends). With persist=True the rows are appended to the CSV as well, and
+        the fingerprint becomes the new file's, from a running hash of its bytes. If another
+        process appended to the CSV in the meantime, its rows are loaded first. Returns an
+        AppendedRows.
+        """
+        self._ensure_loaded()
+        with self._lock, locked_csv(self.csv_path, exclusive=persist):
+            if file_state(self.csv_path) != self._data_state:
+                self._load()
+            rows = self._prepare_records(records)
+            first_index = self._n_rows
+            rows.index = pd.RangeIndex(first_index, first_index + len(rows))
+            previous_fingerprint = self._current_fingerprint()
+            previous_params = {col: dict(values) for col, values in self._standardization_params.items()}
+
+            moments = {col: merge_moments(self._moments[col], rows[col]) for col in STANDARDIZED_COLUMNS}
+            if persist:
+                digest = self._file_digest()
+                digest.update(self._append_to_csv(rows))
+                self._data_state = self._fingerprint_state = self._csv_digest_state = file_state(self.csv_path)
+                fingerprint = csv_fingerprint(self.csv_path, digest.hexdigest())
+            else:
+                key = f"{previous_fingerprint}:{dataset_fingerprint(rows)}"
+                fingerprint = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+            self._pending_rows.append(rows)
+            self._n_rows += len(rows)
+            self._max_customer_id = max(self._max_customer_id, int(rows["Customer ID"].max()))
+            self._moments = moments
+            self._standardization_params = MappingProxyType(
+                {col: MappingProxyType(values) for col, values in params_from_moments(moments).items()})
+            for value, count in rows["Satisfaction Level"].value_counts().items():
+                self._satisfaction_counts[value] = self._satisfaction_counts.get(value, 0) + int(count)
+            self._fingerprint = fingerprint
+        return AppendedRows(rows, first_index, previous_fingerprint, fingerprint, previous_params)
+
+    def _apply_appends(self):
+        """
+        Fold the pending appended rows into clean_df and the feature matrix. The standardized
+        columns of every row are recomputed from the raw values with the current params: a
+        vectorized pass over four columns, once for however many appends were queued. Callers
+        hold self._lock.
+        """
+        rows = pd.concat(self._pending_rows)
+        clean_df = pd.concat([self._clean_df, rows])
+        encoded_rows = FeatureMatrix.from_frame(pd.get_dummies(rows, columns=CATEGORICAL_COLUMNS).reindex(
+            columns=self._encoded_columns, fill_value=False))
+        matrix = self._feature_matrix
+        values = np.concatenate([matrix.values, encoded_rows.values])
+        for col, params in self._standardization_params.items():
+            # from the raw values, so appends do not accumulate float32 rounding
+            raw = clean_df[col].to_numpy(dtype=np.float64)
+            values[:, matrix.column_index[col]] = (raw - params["mean"]) / params["std"]
+        extras = {name: np.concatenate([column, encoded_rows.extras[name]])
+                  for name, column in matrix.extras.items()}
+        self._clean_df = clean_df
+        self._feature_matrix = FeatureMatrix(values, matrix.feature_columns, extras)
+        self._pending_rows = []
+
+    def _file_digest(self):
+        """
+        The running sha256 of the CSV, hashing the whole file only when it changed since the
+        last append of this process. Callers hold self._lock and an exclusive locked_csv() lock.
+        """
+        if self._csv_digest is None or self._csv_digest_state != file_state(self.csv_path):
+            digest = hashlib.sha256()
+            with open(self.csv_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            self._csv_digest = digest
+        return self._csv_digest
+
+    def _prepare_records(self, records):
+        """Validate records and convert them to the cleaned layout and dtypes of clean_df."""
+        rows = records.rename(columns=INPUT_RENAME_MAP).reset_index(drop=True)
+        if len(rows) == 0:
+            raise ValueError("No records to append")
+        optional = ("Customer ID", "Satisfaction Level")
+        missing = [col for col in self._clean_df.columns if col not in rows.columns and col not in optional]
+        if missing:
+            raise ValueError(f"Records are missing columns: {', '.join(missing)}")
+
+        known = get_encoder(self._encoded_columns).category_index
+        for col in CATEGORICAL_COLUMNS:
+            if col not in rows.columns:
+                continue
+            unknown = sorted(set(rows[col].dropna().astype(str)) - set(known[col]))
+            if unknown:
+                raise ValueError(f"Unknown {col} values: {', '.join(unknown)} (only existing categories can be appended)")
+
+        for col in optional:
+            if col not in rows.columns:
+                rows[col] = np.nan
+        if rows["Satisfaction Level"].isna().any():
+            # like clean_data: the most frequent level (ties broken like Series.mode)
+            top = max(self._satisfaction_counts.values())
+            mode = min(value for value, count in self._satisfaction_counts.items() if count == top)
+            rows["Satisfaction Level"] = rows["Satisfaction Level"].fillna(mode)
+        missing_ids = rows["Customer ID"].isna()
+        if missing_ids.any():
+            next_id = self._max_customer_id + 1
+            rows.loc[missing_ids, "Customer ID"] = np.arange(next_id, next_id + missing_ids.sum())
+
+        rows = rows[list(self._clean_df.columns)].copy()
+        for col, dtype in self._clean_df.dtypes.items():
+            if isinstance(dtype, pd.CategoricalDtype):
+                rows[col] = pd.Categorical(rows[col].astype(str), categories=dtype.categories)
+                continue
+            values = pd.to_numeric(rows[col].astype(np.float64) if col == "Discount Applied" else rows[col],
+                                   errors='coerce')
+            if values.isna().any():
+                raise ValueError(f"Column {col} must be numeric and not missing")
+            if pd.api.types.is_integer_dtype(dtype) and not (values == values.round()).all():
+                raise ValueError(f"Column {col} must hold whole numbers")
+            rows[col] = values.astype(dtype)
+        return rows
+
+    def _append_to_csv(self, rows):
+        """Write rows to the end of the CSV and return the bytes written."""
+        out = rows.copy()
+        out["Discount Applied"] = np.where(out["Discount Applied"] == 1, "TRUE", "FALSE")
+        with open(self.csv_path, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(-1, os.SEEK_END)
+            needs_newline = size > 0 and f.read(1) != b'\n'
+        data = out.to_csv(header=False, index=False, lineterminator='\n')
+        data = (('\n' if needs_newline else '') + data).encode('utf-8')
+        with open(self.csv_path, 'ab') as f:
+            f.write(data)
+        return data
+
+    def save_columns(self, path='columns.pkl'):
+        """Write the dummy column layout (what Main used to dump on every construction)."""
+        self._ensure_loaded()
+        joblib.dump(pd.Index(self._encoded_columns), path)
+
+
+_datasets = {}
+_datasets_lock = threading.Lock()
+
+
+def get_dataset(csv_path=CSV_PATH):
+    """Process-wide CustomerDataset per CSV path. Creating it does not read the file."""
+    with _datasets_lock:
+        dataset = _datasets.get(csv_path)
+        if dataset is None:
+            dataset = _datasets[csv_path] = CustomerDataset(csv_path)
+    return dataset
@@ -0,0 +1,111 @@
+import threading
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# API field names -> dataset column names
+INPUT_RENAME_MAP = {
+    "Customer_ID": "Customer ID",
+    "Total_Spend": "Total Spend",
+    "Average_Rating": "Average Rating",
+    "Items_Purchased": "Items Purchased",
+    "Discount_Applied": "Discount Applied",
+    "Days_Since_Last_Purchase": "Days Since Last Purchase",
+    "Membership_Type": "Membership Type",
+    "Satisfaction_Level": "Satisfaction Level"
+}
+
+CATEGORICAL_COLUMNS = ['Gender', 'City', 'Membership Type', 'Satisfaction Level']
+
+
+class FeatureEncoder:
+    """
+    Precompiled one-hot encoder for a fixed training dummy layout.
+
+    Built once from the model's feature columns (e.g. 'Age', 'City_Denver', ...), it maps
+    numeric inputs and category values straight to column indices and writes them into a
+    preallocated float matrix. Output matches pd.get_dummies + reindexing to the same
+    layout: unknown categories and missing inputs encode as 0.
+    """
+
+    def __init__(self, feature_columns):
+        self.feature_columns = list(feature_columns)
+        self.n_features = len(self.feature_columns)
+        self.numeric_index = {}      # column name -> position
+        self.category_index = {}     # categorical column -> {value: position}
+
+        for position, column in enumerate(self.feature_columns):
+            for categorical in CATEGORICAL_COLUMNS:
+                prefix = categorical + "_"
+                if column.startswith(prefix):
+                    value = column[len(prefix):]
+                    self.category_index.setdefault(categorical, {})[value] = position
+                    break
+            else:
+                self.numeric_index[column] = position
+
+        # per categorical column: known values and their positions, for vectorized lookups
+        self._category_values = {
+            categorical: (pd.Index(list(mapping)), np.fromiter(mapping.values(), dtype=np.intp))
+            for categorical, mapping in self.category_index.items()
+        }
+
+    @classmethod
+    def from_columns_file(cls, path, drop=("Customer ID", "Total Spend")):
+        """Build from the dummy layout saved by Main (columns.pkl), minus id/target columns."""
+        columns = [col for col in joblib.load(path) if col not in drop]
+        return cls(columns)
+
+    def encode_one(self, user_input):
+        """Encode a single record (dict with API or dataset field names) into a (1, n_features) row."""
+        row = np.zeros((1, self.n_features), dtype=np.float64)
+        values = row[0]
+        for key, value in user_input.items():
+            name = INPUT_RENAME_MAP.get(key, key)
+            position = self.numeric_index.get(name)
+            if position is not None:
+                values[position] = value
+                continue
+            mapping = self.category_index.get(name)
+            if mapping is not None:
+                position = mapping.get(str(value))
+                if position is not None:
+                    values[position] = 1.0
+        return row
+
+    def encode_batch(self, input_df):
+        """Encode a DataFrame of records (API or dataset column names) into an (n_rows, n_features) matrix."""
+        input_df = input_df.rename(columns=INPUT_RENAME_MAP)
+        matrix = np.zeros((len(input_df), self.n_features), dtype=np.float64)
+
+        for column, position in self.numeric_index.items():
+            if column in input_df.columns:
+                matrix[:, position] = input_df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        rows = np.arange(len(input_df))
+        for column, (values, positions) in self._category_values.items():
+            if column not in input_df.columns:
+                continue
+            codes = values.get_indexer(input_df[column].astype(str))  # -1 for unknown values
+            known = codes >= 0
+            matrix[rows[known], positions[codes[known]]] = 1.0
+        return matrix
+
+    def to_frame(self, matrix):
+        """Wrap an encoded matrix with the feature names the models were fitted with."""
+        return pd.DataFrame(matrix, columns=self.feature_columns, copy=False)
+
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(feature_columns):
+    """Shared FeatureEncoder per feature layout, compiled on first use."""
+    key = tuple(feature_columns)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        with _encoders_lock:
+            encoder = _encoders.setdefault(key, FeatureEncoder(key))
+    return encoder
@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+'''
+Compact feature matrix of the encoded dataset.
+
+encoded_df holds each one-hot column as its own bool array next to the float64
+numerics, so every model or clustering input built from it (df.drop(...), df[features])
+is a fresh mixed-dtype copy that sklearn then converts to a float64 array once more.
+A FeatureMatrix stores the model features once, as one C-contiguous float32 array (the
+precision the tree models train in anyway) with a column index, and hands out views:
+
+- the model features are the array's columns, in encoded_df order, so a regression
+  model's X is the array itself, not a copy;
+- the id and target columns are kept apart as float64 arrays: ids and spend amounts
+  are not rounded to float32, and the models are fitted on the exact target;
+- take() of any other set of columns copies only those columns.
+'''
+
+FEATURE_DTYPE = np.float32
+
+# columns kept out of the model features, stored as float64 next to them
+ID_COLUMN = "Customer ID"
+TARGET_COLUMN = "Total Spend"
+
+
+class FeatureMatrix:
+    """The encoded dataset: the features as one contiguous array with a column index, plus float64 extras."""
+
+    def __init__(self, values, columns, extras=None):
+        if values.ndim != 2 or values.shape[1] != len(columns):
+            raise ValueError("values must be a 2-d array with one column per name")
+        extras = dict(extras or {})
+        if any(len(column) != len(values) for column in extras.values()):
+            raise ValueError("extra columns must have one value per row")
+        self.values = values
+        self.extras = extras
+        self.feature_columns = list(columns)
+        self.columns = self.feature_columns + list(extras)
+        self.column_index = {name: position for position, name in enumerate(self.feature_columns)}
+
+    @classmethod
+    def from_frame(cls, df, dtype=FEATURE_DTYPE, extras=(ID_COLUMN, TARGET_COLUMN)):
+        """Copy an encoded DataFrame into one array, except the `extras` columns, kept as float64."""
+        columns = [col for col in df.columns if col not in extras]
+        values = np.empty((len(df), len(columns)), dtype=dtype)
+        for position, col in enumerate(columns):
+            values[:, position] = df[col].to_numpy(dtype=dtype)
+        return cls(values, columns, {col: df[col].to_numpy(dtype=np.float64) for col in extras if col in df.columns})
+
+    @property
+    def shape(self):
+        return (len(self.values), len(self.columns))
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + sum(column.nbytes for column in self.extras.values())
+
+    def __len__(self):
+        return len(self.values)
+
+    def positions(self, names):
+        """Positions of feature columns in the array (the extras have none)."""
+        missing = [name for name in names if name not in self.column_index]
+        if missing:
+            raise ValueError(f"Unknown feature columns: {', '.join(missing)}")
+        return [self.column_index[name] for name in names]
+
+    def take(self, names):
+        """
+        The named columns as a 2-d array: a view when they are adjacent and in order, else a copy.
+        With an id or target column among them the copy is float64.
+        """
+        names = list(names)
+        if any(name in self.extras for name in names):
+            self.positions([name for name in names if name not in self.extras])
+            result = np.empty((len(self), len(names)), dtype=np.float64)
+            for position, name in enumerate(names):
+                result[:, position] = self.column(name)
+            return result
+        positions = self.positions(names)
+        if positions and positions == list(range(positions[0], positions[0] + len(positions))):
+            return self.values[:, positions[0]:positions[-1] + 1]
+        return self.values[:, positions]
+
+    def column(self, name):
+        """One column as a (strided) view."""
+        if name in self.extras:
+            return self.extras[name]
+        return self.values[:, self.positions([name])[0]]
+
+    def frame(self, names=None):
+        """
+        DataFrame over the named columns (default: every column, features first). The features
+        are one block over take(); the extras are added as columns of their own, without a copy.
+        """
+        names = list(self.columns if names is None else names)
+        features = [name for name in names if name not in self.extras]
+        df = pd.DataFrame(self.take(features), columns=features, copy=False)
+        for name in names:
+            if name in self.extras:
+                df[name] = self.extras[name]
+        return df if list(df.columns) == names else df[names]
+
+
+def model_inputs(data):
+    """
+    (X, y) of the regression models: the features as a DataFrame and the target as a float64
+    Series. From a FeatureMatrix X is a view of its array; an encoded DataFrame works as well.
+    """
+    if isinstance(data, FeatureMatrix):
+        X = data.frame(data.feature_columns)
+        y = pd.Series(data.column(TARGET_COLUMN), name=TARGET_COLUMN, copy=False)
+        return X, y
+    return data.drop(columns=[ID_COLUMN, TARGET_COLUMN]), data[TARGET_COLUMN]
@@ -0,0 +1,133 @@
+import threading
+
+import numpy as np
+
+from churn import churn_model_ready, rebuild_churn_model
+from dataset import STANDARDIZED_COLUMNS, get_dataset
+from encoding import get_encoder
+from metrics import count_train, timed
+from registry import INCREMENTAL_UPDATERS, MODEL_SPECS, model_class, registry
+from segmentation import Segmentation
+from workers import run_in_pool
+
+'''
+Incremental ingestion of new customer records.
+
+append_records adds records to the dataset (see CustomerDataset.append: running
+standardization moments, no reload) and then brings the models loaded for the previous
+version of the data up to date, in time proportional to the new rows where possible:
+
+- linear regression adds the new training rows to its normal-equation sums and re-solves;
+- XGBoost boosts a few more trees from its current booster on the new training rows;
+- the random forest (and anything else without an incremental update) keeps serving the
+  previous fit, marked stale in the registry, while it is refit in the background.
+
+Incrementally updated models keep the feature scale they were trained with (their
+standardization_params); the new rows are standardized with those params. A fixed share
+of the new rows, drawn from a seed per append, is held out for their metrics and plots.
+The cached clusterings and the churn model are refit in the background as well.
+
+Only the process that receives the append updates models in place. Other processes serving
+the same CSV (API workers) see the file change (see CustomerDataset.refresh), reload it and
+move on to the new fingerprint: they load the updated models from the artifact store, or
+train them when the artifact is not written yet.
+'''
+
+APPEND_HOLDOUT_FRACTION = 0.2  # like the models' train_test_split
+
+_append_lock = threading.Lock()
+
+
+def model_rows(model, rows, standardization_params):
+    """
+    New clean rows as (X, y) for a model: its feature layout, standardized with its params.
+    The target (Total Spend) is never standardized, so y is the raw spend.
+    """
+    encoder = get_encoder(model.feature_columns)
+    X = encoder.to_frame(encoder.encode_batch(rows)).set_axis(rows.index)
+    y = rows['Total Spend'].astype(np.float64)
+    for col in STANDARDIZED_COLUMNS:
+        params = standardization_params.get(col)
+        if params is not None and col in X.columns:
+            X[col] = (X[col] - params["mean"]) / params["std"]
+    return X, y
+
+
+def refit_model(model_name, df, params):
+    """Train a registered model from scratch on df (runs on the process pool)."""
+    model = model_class(model_name)(df, **params)
+    getattr(model, MODEL_SPECS[model_name][1])()
+    model.df = None  # the caller has the frame: do not send it back
+    return model
+
+
+def append_records(records, dataset=None, model_registry=registry, persist=True, background=True):
+    """
+    Append customer records (a DataFrame, see CustomerDataset.append) and update the models
+    loaded for the previous data. Models without an incremental update are registered as
+    stale and refit on a background thread (inline with background=False), as are the cached
+    clusterings and, for the default dataset, the churn model. Raises ValueError for
+    records that cannot be appended.
+    """
+    dataset = dataset or get_dataset()
+    with _append_lock:
+        appended = dataset.append(records, persist=persist)
+        previous, fingerprint = appended.previous_fingerprint, appended.fingerprint
+        rng = np.random.default_rng([42, appended.first_index])
+        holdout = rng.random(len(appended.rows)) < APPEND_HOLDOUT_FRACTION
+
+        updated, stale = [], []
+        for name, params, model in model_registry.loaded(previous):
+            scale = getattr(model, 'standardization_params', None) or appended.previous_params
+            new_model = None
+            if name in INCREMENTAL_UPDATERS:
+                X, y = model_rows(model, appended.rows, scale)
+                with timed("fit"):
+                    new_model = getattr(model, INCREMENTAL_UPDATERS[name])(X, y, holdout)
+            if new_model is None:
+                model_registry.put(name, fingerprint, model, stale=True, **params)
+                stale.append((name, params))
+                continue
+            count_train(name, kind="incremental")
+            new_model.df = None
+            new_model.standardization_params = scale
+            model_registry.put(name, fingerprint, new_model, **params)
+            if model_registry.store is not None:
+                model_registry.store.save(name, params, fingerprint, new_model, standardization_params=scale)
+            updated.append(name)
+
+        refit_churn = churn_model_ready() and dataset is get_dataset()
+        standardization_params = {col: dict(values) for col, values in dataset.standardization_params.items()}
+
+        def refit():
+            # reading the matrix applies the appended rows (see CustomerDataset.append), off the request path
+            matrix = dataset.feature_matrix
+            if dataset.fingerprint != fingerprint:
+                return  # a later append superseded these rows: its refit covers them
+            for name, params in stale:
+                with timed("fit"):
+                    model = run_in_pool(refit_model, name, matrix, params)
+                count_train(name)
+                model.df = matrix
+                model.standardization_params = standardization_params
+                if model_registry.store is not None:
+                    model_registry.store.save(name, params, fingerprint, model,
+                                              standardization_params=standardization_params)
+                model_registry.put(name, fingerprint, model, **params)
+            Segmentation(matrix.frame(), fingerprint=fingerprint, matrix=matrix).refit_cached(previous)
+            if refit_churn:
+                rebuild_churn_model(dataset)
+
+        if background:
+            threading.Thread(target=refit, name="append-refit", daemon=True).start()
+        else:
+            refit()
+
+    return {
+        "appended": len(appended.rows),
+        "n_rows": dataset.n_rows,
+        "fingerprint": fingerprint,
+        "standardization_params": standardization_params,
+        "updated": updated,
+        "refitting": [name for name, _ in stale],
+    }
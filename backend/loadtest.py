@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+if __package__:
+    # `python -m backend.loadtest` from the repository root: the backend modules use flat imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+'''
+Load test of the API: a closed-loop generator that keeps `concurrency` requests in flight,
+each drawn from a weighted mix of endpoints, and reports per endpoint the throughput,
+p50/p95/p99 latency and error rate.
+
+By default the app from api.py runs in this process (its lifespan included, so the worker
+pool and artifact loading are as in production) and requests are ASGI calls, which measures
+the app without a network stack. With --url the requests go to a running server instead,
+e.g. uvicorn with several workers.
+
+The first request of every endpoint (loading or training a model, a first clustering) is
+sent before the clock starts, --warmup times per endpoint, and left out of the results.
+
+From the root of the repository:
+python -m backend.loadtest --concurrency 16 --duration 30
+python -m backend.loadtest --mix predict/xgboost=5 segmentation/kmeans=1 --requests 2000
+python -m backend.loadtest --url http://127.0.0.1:8000 --concurrency 64 --output load.json
+'''
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DURATION = 10.0  # seconds, when no request count is given
+PERCENTILES = (50, 95, 99)
+
+CLUSTER_FEATURES = ["Age", "Items Purchased", "Average Rating"]
+CITIES = ["Atlanta", "Boston", "Chicago", "Denver", "Miami", "New York", "San Francisco", "Seattle"]
+MEMBERSHIPS = ["Bronze", "Silver", "Gold"]
+SATISFACTION_LEVELS = ["Neutral", "Satisfied", "Unsatisfied"]
+
+
+def model_input(rng):
+    return {
+        "Gender": str(rng.choice(["Male", "Female"])),
+        "Age": int(rng.integers(26, 46)),
+        "City": str(rng.choice(CITIES)),
+        "Membership_Type": str(rng.choice(MEMBERSHIPS)),
+        "Items_Purchased": int(rng.integers(7, 22)),
+        "Average_Rating": round(float(rng.uniform(2.5, 5.0)), 1),
+        "Discount_Applied": bool(rng.random() < 0.5),
+        "Days_Since_Last_Purchase": int(rng.integers(8, 81)),
+        "Satisfaction_Level": str(rng.choice(SATISFACTION_LEVELS)),
+    }
+
+
+def churn_input(rng):
+    record = model_input(rng)
+    record["Total_Spend"] = round(float(rng.uniform(250, 1800)), 2)
+    record["Discount_Applied"] = int(record["Discount_Applied"])
+    return record
+
+
+# endpoint name -> (method, path, payload(rng) or None). Cluster counts and plot models
+# are drawn from small sets, so after a few requests those endpoints are served from cache.
+ENDPOINTS = {
+    "predict/linear-regression": ("POST", "/predict/linear-regression", model_input),
+    "predict/random-forest": ("POST", "/predict/random-forest", model_input),
+    "predict/xgboost": ("POST", "/predict/xgboost", model_input),
+    "predict/churn": ("POST", "/predict/churn", churn_input),
+    "segmentation/kmeans": ("POST", "/segmentation/kmeans", lambda rng: {
+        "features": CLUSTER_FEATURES, "n_clusters": int(rng.integers(2, 7))}),
+    "segmentation/dbscan": ("POST", "/segmentation/dbscan", lambda rng: {
+        "features": CLUSTER_FEATURES, "eps": float(rng.choice([0.3, 0.5])), "min_samples": 5}),
+    "segmentation/boxplot": ("POST", "/segmentation/boxplot", lambda rng: {
+        "features": CLUSTER_FEATURES, "n_clusters": int(rng.integers(2, 7)), "feature_to_plot": "Age"}),
+    "residual-plot": ("POST", "/residual-plot", lambda rng: {
+        "model": str(rng.choice(["linear_regression", "random_forest", "xgboost"]))}),
+}
+
+# endpoint name -> share of the requests
+DEFAULT_MIX = {
+    "predict/linear-regression": 4,
+    "predict/random-forest": 4,
+    "predict/xgboost": 4,
+    "predict/churn": 4,
+    "segmentation/kmeans": 2,
+    "segmentation/dbscan": 1,
+    "segmentation/boxplot": 1,
+    "residual-plot": 2,
+}
+
+# latency in seconds; status is None when the request failed without a response
+Sample = namedtuple("Sample", ["endpoint", "status", "latency"])
+
+
+# ---------------------- Transports ---------------------- #
+
+
+class AsgiTransport:
+    """Requests as direct ASGI calls into an app running in this process."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __aenter__(self):
+        self._lifespan = self.app.router.lifespan_context(self.app)
+        await self._lifespan.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._lifespan.__aexit__(*exc_info)
+
+    async def request(self, method, path, body):
+        """Send one request; returns the response status."""
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+            "root_path": "", "client": ("127.0.0.1", 0), "server": ("loadtest", 80),
+            "headers": [(b"host", b"loadtest"), (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode())],
+        }
+        status = None
+        done = asyncio.Event()
+        body_sent = False
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()  # the client only goes away once the response is complete
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        return status
+
+
+class HttpTransport:
+    """Requests over HTTP to a running server, one keep-alive session per concurrent request."""
+
+    def __init__(self, url, concurrency):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+
+    async def __aenter__(self):
+        import requests
+
+        self._sessions = [requests.Session() for _ in range(self.concurrency)]
+        self._free = list(self._sessions)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="loadtest")
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._executor.shutdown(wait=True)
+        for session in self._sessions:
+            session.close()
+
+    async def request(self, method, path, body):
+        session = self._free.pop()
+        try:
+            response = await asyncio.get_running_loop().run_in_executor(
+                self._executor, lambda: session.request(
+                    method, self.url + path, data=body, headers={"Content-Type": "application/json"}))
+            return response.status_code
+        finally:
+            self._free.append(session)
+
+
+# ---------------------- Load Generator ---------------------- #
+
+
+async def send(transport, endpoint, rng):
+    method, path, payload = ENDPOINTS[endpoint]
+    body = json.dumps(payload(rng)).encode("utf-8") if payload is not None else b""
+    start = time.perf_counter()
+    try:
+        status = await transport.request(method, path, body)
+    except Exception:
+        status = None
+    return Sample(endpoint, status, time.perf_counter() - start)
+
+
+async def run_load(transport, mix=None, concurrency=DEFAULT_CONCURRENCY, n_requests=None,
+                   duration=DEFAULT_DURATION, warmup=1, seed=0):
+    """
+    Keep `concurrency` requests in flight until n_requests were sent (or, without a count,
+    for `duration` seconds), each to an endpoint drawn by the weights of `mix`.
+    Returns ([Sample], elapsed seconds); warmup requests are not included.
+    """
+    mix = mix or DEFAULT_MIX
+    endpoints = list(mix)
+    weights = np.array([mix[name] for name in endpoints], dtype=np.float64)
+    weights /= weights.sum()
+
+    rng = np.random.default_rng(seed)
+    for endpoint in endpoints:
+        for _ in range(warmup):
+            await send(transport, endpoint, rng)
+
+    samples = []
+    sent = 0
+    start = time.perf_counter()
+    deadline = None if n_requests else start + duration
+
+    async def worker(worker_id):
+        nonlocal sent
+        worker_rng = np.random.default_rng([seed, worker_id])
+        while True:
+            if n_requests is not None:
+                if sent >= n_requests:
+                    return
+                sent += 1
+            elif time.perf_counter() >= deadline:
+                return
+            endpoint = endpoints[worker_rng.choice(len(endpoints), p=weights)]
+            samples.append(await send(transport, endpoint, worker_rng))
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """Per endpoint (and "total"): requests, throughput, error rate, latency percentiles in ms, status counts."""
+    by_endpoint = {}
+    for sample in samples:
+        by_endpoint.setdefault(sample.endpoint, []).append(sample)
+    summary = {}
+    for endpoint, group in sorted(by_endpoint.items()) + [("total", samples)]:
+        if not group:
+            continue
+        latencies = np.array([sample.latency for sample in group]) * 1e3
+        errors = sum(1 for sample in group if sample.status is None or sample.status >= 400)
+        statuses = {}
+        for sample in group:
+            key = str(sample.status) if sample.status is not None else "failed"
+            statuses[key] = statuses.get(key, 0) + 1
+        summary[endpoint] = {
+            "requests": len(group),
+            "throughput": len(group) / elapsed,
+            "error_rate": errors / len(group),
+            "mean_ms": float(latencies.mean()),
+            **{f"p{p}_ms": float(np.percentile(latencies, p)) for p in PERCENTILES},
+            "max_ms": float(latencies.max()),
+            "statuses": statuses,
+        }
+    return summary
+
+
+def format_summary(summary, elapsed, concurrency):
+    lines = [f"{summary.get('total', {}).get('requests', 0)} requests in {elapsed:.1f}s "
+             f"at concurrency {concurrency}",
+             f"{'endpoint':<28}{'requests':>9}{'req/s':>9}{'errors':>8}"
+             f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"]
+    for endpoint, stats in summary.items():
+        lines.append(f"{endpoint:<28}{stats['requests']:>9}{stats['throughput']:>9.1f}"
+                     f"{stats['error_rate']:>8.1%}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+                     f"{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+    return "\n".join(lines)
+
+
+# ---------------------- CLI ---------------------- #
+
+
+def parse_mix(values):
+    mix = {}
+    for value in values:
+        endpoint, _, weight = value.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{endpoint}', expected one of {', '.join(ENDPOINTS)}")
+        mix[endpoint] = float(weight) if weight else 1.0
+        if mix[endpoint] <= 0:
+            raise ValueError(f"Weight of '{endpoint}' must be positive")
+    return mix
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the API with a weighted mix of requests.")
+    parser.add_argument("--url", help="base URL of a running server (default: the app, in this process)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="requests in flight")
+    parser.add_argument("--requests", type=int, help="total requests to send (default: run for --duration)")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds to run for")
+    parser.add_argument("--mix", nargs="+", metavar="ENDPOINT=WEIGHT",
+                        help=f"endpoints and weights (default: all of {', '.join(ENDPOINTS)})")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed requests per endpoint first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the summary here, as JSON")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    if args.requests is not None and args.requests < 1:
+        parser.error("--requests must be at least 1")
+    if args.url and urlsplit(args.url).scheme not in ("http", "https"):
+        parser.error("--url must be an http(s) URL")
+    try:
+        args.mix = parse_mix(args.mix) if args.mix else dict(DEFAULT_MIX)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    if args.url:
+        transport = HttpTransport(args.url, args.concurrency)
+    else:
+        from api import app
+        transport = AsgiTransport(app)
+    async with transport:
+        samples, elapsed = await run_load(transport, args.mix, args.concurrency, args.requests,
+                                          args.duration, args.warmup, args.seed)
+    summary = summarize(samples, elapsed)
+    print(format_summary(summary, elapsed, args.concurrency))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"url": args.url, "concurrency": args.concurrency, "elapsed_seconds": elapsed,
+                       "mix": args.mix, "endpoints": summary}, file, indent=2)
+        print(f"summary -> {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,60 +1,47 @@
-import numpy as np
 import pandas as pd
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import r2_score, mean_squared_error
-from xgboost import XGBRegressor
-from models.linear_regression import Linear_Regression
-from models.random_forest import Random_Forest
-from models.xgboost import XGBoost_Regression
-import joblib
-import os
-from churn import Churn
+from dataset import get_dataset, encode_and_standardize
+from encoding import get_encoder
+from metrics import timed
 
 # ---------------------- Data Cleaning ---------------------- #
 
 
 class Main:
 
-    def __init__(self):
-        """Read the CSV file, impute missing values in 'Satisfaction Level', and convert booleans to numeric."""
-        csv_path = os.path.join(os.path.dirname(
-            __file__), 'e-com_customer_behavior.csv')
-        self.df = pd.read_csv(csv_path)
-
-        # Impute missing values in 'Satisfaction Level
-        most_common = self.df["Satisfaction Level"].mode()[0]
-        self.df["Satisfaction Level"] = self.df["Satisfaction Level"].fillna(
-            most_common)
-
-        # Convert boolean column 'Discount Applied' to numeric
-        self.df["Discount Applied"] = self.df["Discount Applied"].astype(int)
-        self.standardization_params = {}  # Store means and stds for unstandardization
-        self.df = self.encode_and_standardize_data(self.df)
+    def __init__(self, dataset=None, save_columns=False):
+        """
+        Cheap to construct: the CSV is read, imputed, encoded and standardized lazily, once per
+        process, by the shared CustomerDataset. Pass save_columns=True to also write the dummy
+        column layout to columns.pkl in the current directory.
+        """
+        self.dataset = dataset or get_dataset()
+        if save_columns:
+            self.dataset.save_columns('columns.pkl')
+
+    @property
+    def df(self):
+        return self.dataset.encoded_df
+
+    @property
+    def feature_matrix(self):
+        """The encoded data as one float32 array that models and clustering take views of."""
+        return self.dataset.feature_matrix
+
+    @property
+    def standardization_params(self):
+        """Means and stds for unstandardization (read-only)"""
+        return self.dataset.standardization_params
+
+    @property
+    def fingerprint(self):
+        return self.dataset.fingerprint
 
     # ---------------------- Encoding & Standardization ---------------------- #
 
-    def encode_and_standardize_data(self, df):
+    def encode_and_standardize_data(self, df, columns_path=None):
         """One-hot encode categorical columns and standardize numerical columns.
             clean_data must be called before this function is called"""
-
-        # One hot encode categorical columns
-        df = pd.get_dummies(
-            df, columns=['Gender', 'City', 'Membership Type', 'Satisfaction Level'])
-
-        dummy_columns = df.columns
-        joblib.dump(dummy_columns, 'columns.pkl')
-
-        columns_to_standardize = [
-            "Age", "Items Purchased",
-            "Average Rating", "Days Since Last Purchase"
-        ]
-        for col in columns_to_standardize:
-            mean = df[col].mean()
-            std = df[col].std()
-            self.standardization_params[col] = {"mean": mean, "std": std}
-            df[col] = (df[col] - mean) / std
+        df, _ = encode_and_standardize(df, columns_path)
         return df
 
     # ---------------------- Utility Methods ---------------------- #
@@ -144,55 +131,39 @@ class Main:
 
 
 def preprocess_user_input(user_input: dict, feature_columns: list) -> pd.DataFrame:
-    rename_map = {
-        "Average_Rating": "Average Rating",
-        "Items_Purchased": "Items Purchased",
-        "Discount_Applied": "Discount Applied",
-        "Days_Since_Last_Purchase": "Days Since Last Purchase",
-        "Membership_Type": "Membership Type",
-        "Satisfaction_Level": "Satisfaction Level"
-    }
+    """Encode one API record into a single-row frame with the model's feature columns."""
+    with timed("encode"):
+        encoder = get_encoder(feature_columns)
+        return encoder.to_frame(encoder.encode_one(user_input))
 
-    user_input = {rename_map.get(k, k): v for k, v in user_input.items()}
-    df = pd.DataFrame([user_input])
 
-    for col in ['Gender', 'City', 'Membership Type', 'Satisfaction Level']:
-        if col in df.columns:
-            df = pd.get_dummies(df, columns=[col])
-
-    for col in feature_columns:
-        if col not in df.columns:
-            df[col] = 0
-
-    df = df[feature_columns]
-
-    return df
+def preprocess_batch_input(input_df: pd.DataFrame, feature_columns: list) -> pd.DataFrame:
+    """
+    Encode many records at once (API-style or CSV-style column names) into the
+    model's feature layout in one vectorized pass.
+    """
+    with timed("encode"):
+        encoder = get_encoder(feature_columns)
+        return encoder.to_frame(encoder.encode_batch(input_df))
 
 
 # ---------------------- Main Execution ---------------------- #
 
 def test_all_models(df):
-    print("\n==================== TESTING ALL MODELS ====================\n")
-    print("1. LINEAR REGRESSION MODEL:")
-    lin_reg_test = Linear_Regression(df)
-    lin_reg_test.linear_regression()
-    lin_reg_test.evaluate_model()
-    print("\n" + "-"*60 + "\n")
-
-    print("2. RANDOM FOREST REGRESSOR:")
-    rf_test = Random_Forest(df)
-    rf_test.random_forest_regressor()
-    rf_test.evaluate_model()
-    print("\n" + "-"*60 + "\n")
+    # every registered model trains at the same time, on its own share of the cores
+    from training import format_result, train_parallel
 
-    print("3. XGBOOST REGRESSION MODEL:")
-    xgb = XGBoost_Regression(df)
-    xgb.xgboost_regression()
-    xgb.evaluate_model()
-    print("\n==================== ALL MODELS TESTED ====================\n")
+    print("\n==================== TESTING ALL MODELS ====================\n")
+    results = train_parallel(df)
+    for i, (name, result) in enumerate(results.items(), start=1):
+        print(f"{i}. {format_result(name, result)}")
+        result.model.evaluate_model()
+        print("\n" + "-"*60 + "\n")
+    print("==================== ALL MODELS TESTED ====================\n")
 
 
 if __name__ == "__main__":
+    from churn import Churn
 
     main = Main()
     df = main.df
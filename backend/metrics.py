@@ -0,0 +1,297 @@
+import bisect
+import math
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+
+'''
+In-process metrics in the Prometheus text format, served by GET /metrics.
+
+- http_request_duration_seconds: latency histogram per route template and method (see
+  MetricsMiddleware), next to http_requests_total per status and http_requests_in_flight;
+- stage_duration_seconds: where the time goes inside a request. timed(stage) wraps data
+  loading ("load"), encoding of user input ("encode"), model and clustering fits ("fit"),
+  predictions ("predict"), cluster statistics ("aggregate"), plot rendering ("render") and
+  JSON encoding of large responses ("serialize");
+- model_trains_total: models trained from scratch or updated with appended rows;
+- cache_requests_total: hits and misses of the model registry, clustering and plot caches.
+
+Recording is a perf_counter() pair, a lock and a bisect: a few microseconds per stage, next
+to stages that take milliseconds. Work done on the process pool is timed from the API
+process (including the wait for a free worker). Every API worker process (uvicorn
+--workers) keeps its own metrics; process_start_time_seconds{pid} tells them apart.
+
+Environment:
+METRICS_ENABLED  0 to record nothing and serve an empty /metrics (default on)
+'''
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1").lower() not in ("0", "false", "no")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; from encoding one record (~100µs) to fitting a model on a large dataset
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------------------- Metric Types ---------------------- #
+
+
+class Metric:
+    """A named metric with a fixed set of label names; one value (or histogram) per label combination."""
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {', '.join(self.labelnames) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """[(suffix, label values, extra label pairs, value)] for the exposition format."""
+        with self._lock:
+            return [("", key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    """Observations counted into fixed buckets (non-cumulative internally, cumulative when rendered)."""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # [count per bucket (the last one is +Inf), sum]
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][position] += 1
+            entry[1] += value
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def samples(self):
+        with self._lock:
+            entries = [(key, list(counts), total) for key, (counts, total) in sorted(self._values.items())]
+        samples = []
+        for key, counts, total in entries:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                samples.append(("_bucket", key, (("le", _format_value(float(bound))),), cumulative))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), cumulative))
+        return samples
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = [line for metric in metrics for line in metric.render()]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def clear(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+metrics_registry = MetricsRegistry()
+
+PROCESS_START_TIME = metrics_registry.gauge(
+    "process_start_time_seconds", "Start time of the process since the epoch, in seconds.", ["pid"])
+PROCESS_START_TIME.set(time.time(), pid=os.getpid())
+
+REQUEST_DURATION = metrics_registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ["method", "route"])
+REQUESTS = metrics_registry.counter(
+    "http_requests_total", "HTTP requests answered, by route template and status.", ["method", "route", "status"])
+REQUESTS_IN_FLIGHT = metrics_registry.gauge(
+    "http_requests_in_flight", "HTTP requests being processed.")
+CPU_REQUESTS_ADMITTED = metrics_registry.gauge(
+    "cpu_requests_admitted", "CPU-bound requests admitted to the process pool, running or queued.")
+STAGE_DURATION = metrics_registry.histogram(
+    "stage_duration_seconds", "Time spent in each processing stage.", ["stage"])
+MODEL_TRAINS = metrics_registry.counter(
+    "model_trains_total", "Models trained from scratch (full) or updated with appended rows (incremental).",
+    ["model", "kind"])
+CACHE_REQUESTS = metrics_registry.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"])
+
+
+# ---------------------- Recording ---------------------- #
+
+
+class timed(ContextDecorator):
+    """
+    Record the duration of a block (or of every call, as a decorator) in stage_duration_seconds:
+
+        with timed("fit"):
+            ...
+    """
+
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def _recreate_cm(self):
+        return timed(self.stage)  # one instance per call: decorated functions run concurrently
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if METRICS_ENABLED:
+            STAGE_DURATION.observe(time.perf_counter() - self._start, stage=self.stage)
+        return False
+
+
+def count_cache(cache, hit):
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def count_train(model, kind="full"):
+    if METRICS_ENABLED:
+        MODEL_TRAINS.inc(model=model, kind=kind)
+
+
+def render_metrics():
+    return metrics_registry.render() if METRICS_ENABLED else ""
+
+
+# ---------------------- ASGI Middleware ---------------------- #
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and concurrency of HTTP requests. Requests are
+    labelled with the route template they matched ("/predict/{model_name}/batch"), so the
+    number of label values stays bounded; requests that match no route share "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_DURATION.observe(time.perf_counter() - start, method=method, route=route)
+            REQUESTS.inc(method=method, route=route, status=status)
@@ -1,20 +1,23 @@
+import copy
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import r2_score, mean_absolute_error, mean_squared_error
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
+import pandas as pd
+from plotting import residual_plot_base64
+from features import model_inputs
 
 
 class Linear_Regression:
+    residual_plot_title = "Residual Plot (Linear Regression)"
 
     def __init__(self, df):
         self.df = df
+        self.metrics = None  # holdout metrics when they are not computed from X_test/y_test
+        self.sufficient_stats = None  # normal-equation sums of the training rows, for appends
 
     def linear_regression(self):
-        X = self.df.drop(columns=['Customer ID', 'Total Spend'])
-        y = self.df['Total Spend']
+        X, y = model_inputs(self.df)
 
         # Identify categorical and numeric columns
         categorical_cols = X.select_dtypes(
@@ -25,11 +28,58 @@ class Linear_Regression:
         X_train, self.X_test, y_train, self.y_test = train_test_split(
             X, y, test_size=0.2, random_state=42)
         self.model = LinearRegression()
-        self.model.fit(X_train, y_train)
+        # a FeatureMatrix holds float32 features: solve the least-squares problem in float64
+        self.model.fit(X_train.astype(np.float64), y_train)
         self.y_pred = self.model.predict(self.X_test)
         self.feature_columns = X.columns
+        from streaming import sufficient_stats
+        self.sufficient_stats = sufficient_stats(X_train, y_train)
         return self.model
 
+    def linear_regression_streaming(self, csv_path, chunksize=None):
+        '''
+        Out-of-core alternative to linear_regression(): reads the CSV in chunks and solves
+        the accumulated normal equations, so memory is bounded by the chunk size.
+        X_test/y_test keep only a sample of the holdout rows (for plots);
+        get_stats() reports metrics over the whole holdout set.
+        '''
+        from artifacts import STREAMING
+        from streaming import DEFAULT_CHUNKSIZE, fit_linear_regression_streaming
+
+        fit = fit_linear_regression_streaming(csv_path, chunksize or DEFAULT_CHUNKSIZE)
+        self.model = fit.model
+        self.feature_columns = pd.Index(fit.feature_columns)
+        self.standardization_params = fit.standardization_params
+        self.metrics = fit.metrics
+        self.sufficient_stats = fit.sufficient_stats
+        self.training = STREAMING  # saved under its own artifact key
+        self.X_test, self.y_test, self.y_pred = fit.X_sample, fit.y_sample, fit.y_pred_sample
+        return self.model
+
+    def with_appended_rows(self, X, y, holdout):
+        '''
+        A copy of this model updated with new rows, in time proportional to the new rows:
+        the training rows (~holdout) are added to the normal-equation sums and the coefficients
+        re-solved; the holdout rows extend X_test/y_test. X must be encoded in feature_columns
+        order and standardized like the training data. Returns None when the model has no
+        sums (an artifact from before they were kept): it has to be refit instead.
+        '''
+        from streaming import linear_model_from_sufficient_stats, sufficient_stats
+
+        if self.sufficient_stats is None:
+            return None
+        updated = copy.copy(self)
+        updated.sufficient_stats = sufficient_stats(X[~holdout], y[~holdout], self.sufficient_stats)
+        updated.model = linear_model_from_sufficient_stats(*updated.sufficient_stats, list(self.feature_columns))
+        updated.X_test = pd.concat([self.X_test, X[holdout].astype(self.X_test.dtypes.to_dict())])
+        updated.y_test = pd.concat([self.y_test, y[holdout]])
+        updated.y_pred = updated.model.predict(updated.X_test)
+        updated.metrics = None
+        return updated
+
+    def predict(self, input_data):
+        return self.model.predict(input_data)
+
     def evaluate_model(self):
         print("----------------------------LIN REG RESULTS----------------------------")
         print("R^2 score:", r2_score(self.y_test, self.y_pred))
@@ -40,30 +90,19 @@ class Linear_Regression:
         print("Coefficients:", list(zip(self.feature_columns, self.model.coef_)))
 
     def get_stats(self):
+        if self.metrics is not None:
+            return self.metrics
         y_true = self.y_test
         y_pred = self.model.predict(self.X_test)
         return {
             "r2": r2_score(y_true, y_pred),
             "mae": mean_absolute_error(y_true, y_pred),
-            "rmse": mean_squared_error(y_true, y_pred)
+            "rmse": np.sqrt(mean_squared_error(y_true, y_pred))
         }
 
-    def plot_residuals(self):
-        y_true = self.y_test
-        y_pred = self.model.predict(self.X_test)
-        residuals = y_true - y_pred
+    def residual_data(self):
+        """(y_true, y_pred) on the holdout set, as plotted by plot_residuals."""
+        return self.y_test, self.model.predict(self.X_test)
 
-        plt.figure(figsize=(6, 4))
-        plt.scatter(y_pred, residuals, alpha=0.6)
-        plt.axhline(0, color='red', linestyle='--')
-        plt.xlabel("Predicted Values")
-        plt.ylabel("Residuals")
-        plt.title("Residual Plot (Linear Regression)")
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close()
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        return img_base64
+    def plot_residuals(self):
+        return residual_plot_base64(*self.residual_data(), self.residual_plot_title)
@@ -3,19 +3,23 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import io
-import base64
+from plotting import residual_plot_base64
+from features import model_inputs
 
 
 class Random_Forest:
+    residual_plot_title = "Residual Plot (Random Forest)"
 
-    def __init__(self, df):
+    def __init__(self, df, n_estimators=50, random_state=42, n_jobs=None):
         self.df = df
+        self.n_estimators = n_estimators
+        self.random_state = random_state
+        self.n_jobs = n_jobs  # trees fitted in parallel (None: one core)
         self.rf_model = None
         self.feature_columns = None
         self.y_test = None
         self.y_pred = None
+        self.metrics = None  # holdout metrics when they are not computed from y_test/y_pred
 
     def random_forest_regressor(self):
         '''
@@ -25,8 +29,7 @@ class Random_Forest:
         - each tree gives its own numeric prediction
         - final output is the average of all tree outputs
         '''
-        X = self.df.drop(columns=["Customer ID", "Total Spend"])
-        y = self.df['Total Spend']
+        X, y = model_inputs(self.df)
 
         # Store feature columns for later use
         self.feature_columns = X.columns.tolist()
@@ -34,9 +37,12 @@ class Random_Forest:
         X_train, X_test, y_train, self.y_test = train_test_split(
             X, y, test_size=0.2, random_state=42)
 
-        self.rf_model = RandomForestRegressor(n_estimators=50, random_state=42)
+        self.rf_model = RandomForestRegressor(
+            n_estimators=self.n_estimators, random_state=self.random_state, n_jobs=self.n_jobs)
         self.rf_model.fit(X_train, y_train)
         self.y_pred = self.rf_model.predict(X_test)
+        # the core budget is for training: API requests predict a few rows each, on one core
+        self.rf_model.set_params(n_jobs=None)
         return self.rf_model
 
     def evaluate_model(self):
@@ -52,6 +58,8 @@ class Random_Forest:
         print(f"RMSE: {rmse:.2f}")
 
     def get_stats(self):
+        if self.metrics is not None:
+            return self.metrics
         if self.y_test is None or self.y_pred is None:
             raise ValueError(
                 "Model must be trained first. Call random_forest_regressor().")
@@ -71,22 +79,11 @@ class Random_Forest:
                 "Model must be trained first. Call random_forest_regressor().")
         return self.rf_model.predict(input_data)
 
-    def plot_residuals(self):
+    def residual_data(self):
+        """(y_true, y_pred) on the holdout set, as plotted by plot_residuals."""
         if self.y_test is None or self.y_pred is None:
             raise ValueError("Model must be trained first.")
-        residuals = self.y_test - self.y_pred
-
-        plt.figure(figsize=(6, 4))
-        plt.scatter(self.y_pred, residuals, alpha=0.6)
-        plt.axhline(0, color='red', linestyle='--')
-        plt.xlabel("Predicted Values")
-        plt.ylabel("Residuals")
-        plt.title("Residual Plot (Random Forest)")
-        plt.tight_layout()
+        return self.y_test, self.y_pred
 
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close()
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        return img_base64
+    def plot_residuals(self):
+        return residual_plot_base64(*self.residual_data(), self.residual_plot_title)
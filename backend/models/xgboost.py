@@ -1,30 +1,83 @@
+import copy
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
 from xgboost import XGBRegressor
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import base64
+import pandas as pd
+from plotting import residual_plot_base64
+from features import model_inputs
 
 
 class XGBoost_Regression:
-    def __init__(self, df):
+    residual_plot_title = "Residual Plot (XGBoost)"
+
+    def __init__(self, df, n_estimators=100, learning_rate=0.1, max_depth=4, random_state=42, n_jobs=None):
         self.df = df
+        self.n_estimators = n_estimators
+        self.learning_rate = learning_rate
+        self.max_depth = max_depth
+        self.random_state = random_state
+        self.n_jobs = n_jobs  # XGBoost threads (nthread); None lets XGBoost use every core
+        self.metrics = None  # holdout metrics when they are not computed from y_test/y_pred
 
     def xgboost_regression(self):
-        X = self.df.drop(columns=["Customer ID", "Total Spend"])
-        y = self.df['Total Spend']
+        X, y = model_inputs(self.df)
 
         X_train, X_test, y_train, self.y_test = train_test_split(
             X, y, test_size=0.2, random_state=42)
         self.X_test = X_test
-        self.model = XGBRegressor(n_estimators=100, learning_rate=0.1,
-                                  max_depth=4, random_state=42)
+        self.model = XGBRegressor(n_estimators=self.n_estimators, learning_rate=self.learning_rate,
+                                  max_depth=self.max_depth, random_state=self.random_state,
+                                  n_jobs=self.n_jobs)
         self.model.fit(X_train, y_train)
         self.y_pred = self.model.predict(X_test)
         self.feature_columns = X.columns
         return self.model
 
+    def xgboost_regression_streaming(self, csv_path, chunksize=None):
+        '''
+        Out-of-core alternative to xgboost_regression(): streams CSV chunks into XGBoost's
+        external-memory ExtMemQuantileDMatrix, so memory is bounded by the chunk size.
+        X_test/y_test keep only a sample of the holdout rows (for plots);
+        get_stats() reports metrics over the whole holdout set.
+        '''
+        from artifacts import STREAMING
+        from streaming import DEFAULT_CHUNKSIZE, fit_xgboost_streaming
+
+        fit = fit_xgboost_streaming(csv_path, n_estimators=self.n_estimators,
+                                    learning_rate=self.learning_rate, max_depth=self.max_depth,
+                                    random_state=self.random_state,
+                                    chunksize=chunksize or DEFAULT_CHUNKSIZE)
+        self.model = fit.model
+        self.feature_columns = pd.Index(fit.feature_columns)
+        self.standardization_params = fit.standardization_params
+        self.metrics = fit.metrics
+        self.training = STREAMING  # saved under its own artifact key
+        self.X_test, self.y_test, self.y_pred = fit.X_sample, fit.y_sample, fit.y_pred_sample
+        return self.model
+
+    def with_appended_rows(self, X, y, holdout, boost_rounds=10):
+        '''
+        A copy of this model that continues boosting from the current booster: boost_rounds more
+        trees are fitted to the new training rows (~holdout) only, and the holdout rows extend
+        X_test/y_test. X must be encoded in feature_columns order and standardized like the
+        training data. The current booster is left untouched.
+        '''
+        updated = copy.copy(self)
+        if (~holdout).any():
+            params = self.model.get_params()
+            params["n_estimators"] = boost_rounds
+            updated.model = XGBRegressor(**params)
+            updated.model.fit(X[~holdout], y[~holdout], xgb_model=self.model.get_booster())
+        updated.X_test = pd.concat([self.X_test, X[holdout].astype(self.X_test.dtypes.to_dict())])
+        updated.y_test = pd.concat([self.y_test, y[holdout]])
+        updated.y_pred = updated.model.predict(updated.X_test)
+        updated.metrics = None
+        return updated
+
+    def predict(self, input_data):
+        return self.model.predict(input_data)
+
     def evaluate_model(self):
         print("----------------------------XGBOOST RESULTS----------------------------")
         print("R^2 score:", r2_score(self.y_test, self.y_pred))
@@ -33,6 +86,8 @@ class XGBoost_Regression:
         print(f"RMSE: {rmse}")
 
     def get_stats(self):
+        if self.metrics is not None:
+            return self.metrics
         r2 = r2_score(self.y_test, self.y_pred)
         mae = mean_absolute_error(self.y_test, self.y_pred)
         rmse = np.sqrt(mean_squared_error(self.y_test, self.y_pred))
@@ -42,22 +97,9 @@ class XGBoost_Regression:
             "rmse": rmse
         }
 
+    def residual_data(self):
+        """(y_true, y_pred) on the holdout set, as plotted by plot_residuals."""
+        return self.y_test, self.model.predict(self.X_test)
+
     def plot_residuals(self):
-        y_true = self.y_test
-        y_pred = self.model.predict(self.X_test)
-        residuals = y_true - y_pred
-
-        plt.figure(figsize=(6, 4))
-        plt.scatter(y_pred, residuals, alpha=0.6)
-        plt.axhline(0, color='red', linestyle='--')
-        plt.xlabel("Predicted Values")
-        plt.ylabel("Residuals")
-        plt.title("Residual Plot (XGBoost)")
-        plt.tight_layout()
-
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close()
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        return img_base64
+        return residual_plot_base64(*self.residual_data(), self.residual_plot_title)
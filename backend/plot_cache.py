@@ -0,0 +1,161 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from artifacts import IN_MEMORY, artifact_key, training_mode
+from metrics import timed
+from plotting import MAX_RESIDUAL_POINTS, PLOT_FORMATS, residual_plot, residual_points
+from workers import run_in_pool
+
+'''
+Cache of rendered plots and of the chart data served instead of images.
+
+A residual plot only changes when its model does, so rendered images are keyed by
+(model artifact key, plot type, variant), the variant being size and format for images
+and the point budget for residual data (stored as encoded JSON). The artifact key already covers the
+training data, hyperparameters, training mode and library versions (see artifacts.py). A stale model, served
+after rows were appended until its refit replaces it under the same key (see ModelRegistry.put),
+has stale=True in its variant, so its plots and ETags differ from the refit's. The ETag is
+derived from that cache key, so every API worker hands out the same ETag for the same
+image and clients can revalidate with If-None-Match.
+'''
+
+DEFAULT_PLOT_SIZE = (6, 4)  # inches, as rendered by the dashboard
+MAX_PLOT_INCHES = 20
+
+# data: response bytes; base64: the same bytes for JSON responses (images only); etag: quoted HTTP ETag
+RenderedPlot = namedtuple("RenderedPlot", ["data", "media_type", "etag", "base64"])
+
+
+def plot_key(model_key, plot_type, **variant):
+    return (model_key, plot_type, tuple(sorted(variant.items())))
+
+
+def make_etag(key):
+    return '"' + hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32] + '"'
+
+
+class PlotCache:
+    """LRU cache of RenderedPlot entries, bounded by the total size of the image bytes."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, media_type):
+        encoded = base64.b64encode(data).decode('utf-8') if media_type.startswith('image/') else None
+        entry = RenderedPlot(data, media_type, make_etag(key), encoded)
+        if len(data) > self.max_bytes:
+            return entry
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= len(self._entries.pop(key).data)
+            self._entries[key] = entry
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted.data)
+        return entry
+
+    def invalidate(self, model_key):
+        """Drop every entry of one model artifact key (see plot_key)."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == model_key]:
+                self.total_bytes -= len(self._entries.pop(key).data)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+plot_cache = PlotCache(max_bytes=int(os.environ.get("PLOT_CACHE_MB", 64)) * 1024 * 1024)
+
+_render_locks = {}
+_render_locks_lock = threading.Lock()
+
+
+def _render_lock(key):
+    with _render_locks_lock:
+        return _render_locks.setdefault(key, threading.Lock())
+
+
+def residual_plot_key(model_name, fingerprint, params=None, width=DEFAULT_PLOT_SIZE[0],
+                      height=DEFAULT_PLOT_SIZE[1], fmt='png', stale=False, training=IN_MEMORY):
+    return plot_key(artifact_key(model_name, params or {}, fingerprint, training), "residuals",
+                    width=float(width), height=float(height), fmt=fmt, stale=bool(stale))
+
+
+def residual_points_key(model_name, fingerprint, params=None, max_points=MAX_RESIDUAL_POINTS, stale=False,
+                        training=IN_MEMORY):
+    return plot_key(artifact_key(model_name, params or {}, fingerprint, training), "residual-points",
+                    max_points=int(max_points), stale=bool(stale))
+
+
+def get_residual_plot(model_name, model, fingerprint, params=None, width=DEFAULT_PLOT_SIZE[0],
+                      height=DEFAULT_PLOT_SIZE[1], fmt='png', stale=False):
+    """The residual plot of a trained model, rendered once (on the process pool) and then cached."""
+    if fmt not in PLOT_FORMATS:
+        raise ValueError(f"Unknown plot format '{fmt}', expected one of {', '.join(PLOT_FORMATS)}")
+    if not (0 < width <= MAX_PLOT_INCHES and 0 < height <= MAX_PLOT_INCHES):
+        raise ValueError(f"Plot width and height must be between 0 and {MAX_PLOT_INCHES} inches")
+    key = residual_plot_key(model_name, fingerprint, params, width, height, fmt, stale, training_mode(model))
+    entry = plot_cache.get(key)
+    if entry is not None:
+        return entry
+    # a request arriving while the plot is pre-rendered waits for that render
+    with _render_lock(key):
+        entry = plot_cache.get(key)
+        if entry is None:
+            y_true, y_pred = model.residual_data()
+            with timed("render"):
+                data = run_in_pool(residual_plot, y_true, y_pred, model.residual_plot_title, width, height, fmt)
+            entry = plot_cache.put(key, data, PLOT_FORMATS[fmt])
+    return entry
+
+
+def get_residual_points(model_name, model, fingerprint, params=None, max_points=MAX_RESIDUAL_POINTS,
+                        stale=False):
+    """Downsampled residual points of a trained model as cached JSON bytes (see plotting.residual_points)."""
+    if max_points < 1:
+        raise ValueError("max_points must be positive")
+    key = residual_points_key(model_name, fingerprint, params, max_points, stale, training_mode(model))
+    entry = plot_cache.get(key)
+    if entry is None:
+        with timed("aggregate"):
+            payload = {"model": model_name, **residual_points(*model.residual_data(), max_points=max_points)}
+        entry = plot_cache.put(key, json.dumps(payload).encode('utf-8'), "application/json")
+    return entry
+
+
+def prerender_residual_plot(model_name, params, fingerprint, model):
+    """
+    Registry listener: render the default residual plot of a newly trained or loaded model
+    in the background, so the first dashboard request is already a cache hit. A model put in
+    place of another one for the same key (see ModelRegistry.put) drops the cached plots of
+    the one it replaces.
+    """
+    plot_cache.invalidate(artifact_key(model_name, params or {}, fingerprint, training_mode(model)))
+
+    def render():
+        try:
+            get_residual_plot(model_name, model, fingerprint, params)
+        except Exception:
+            pass  # the plot is rendered on demand instead
+
+    threading.Thread(target=render, name=f"prerender-{model_name}", daemon=True).start()
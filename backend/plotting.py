@@ -0,0 +1,135 @@
+import io
+import os
+import base64
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+'''
+Chart rendering shared by the models and the segmentation endpoints.
+
+These are pure functions of plain data (arrays and per-cluster statistics) returning image bytes
+or a base64 string, so the API can run them on the worker process pool (see workers.py).
+residual_points is the data-only alternative: the points a client needs to draw the chart itself.
+
+Charts are drawn on matplotlib Figure objects with their own Agg canvas, never through
+pyplot: pyplot keeps one global "current figure" per process, which concurrent requests on
+the API threadpool would draw into at the same time, and it selects a GUI backend on import.
+Figures are taken from a small pool and cleared after use, and matplotlib is only imported
+by the first render, so processes that never plot do not pay for it.
+
+Environment:
+FIGURE_POOL_SIZE  idle figures kept for reuse per process (default 4)
+'''
+
+# format -> media type of the rendered bytes
+PLOT_FORMATS = {"png": "image/png", "svg": "image/svg+xml", "webp": "image/webp"}
+
+MAX_RESIDUAL_POINTS = 1000
+
+FIGURE_POOL_SIZE = int(os.environ.get("FIGURE_POOL_SIZE", 4))
+
+_figure_pool = []
+_figure_pool_lock = threading.Lock()
+
+
+def _new_figure():
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    return figure
+
+
+@contextmanager
+def _figure(width, height):
+    """A blank figure of the given size (inches) owned by the caller for the duration of the block."""
+    with _figure_pool_lock:
+        figure = _figure_pool.pop() if _figure_pool else None
+    if figure is None:
+        figure = _new_figure()
+    figure.set_size_inches(width, height)
+    try:
+        yield figure
+    finally:
+        figure.clear()
+        with _figure_pool_lock:
+            if len(_figure_pool) < FIGURE_POOL_SIZE:
+                _figure_pool.append(figure)
+
+
+def _render(figure, fmt='png'):
+    buf = io.BytesIO()
+    figure.savefig(buf, format=fmt)
+    return buf.getvalue()
+
+
+def residual_plot(y_true, y_pred, title, width=6, height=4, fmt='png'):
+    """Scatter of residuals (y_true - y_pred) against the predictions, as image bytes."""
+    residuals = y_true - y_pred
+
+    with _figure(width, height) as figure:
+        ax = figure.add_subplot()
+        ax.scatter(y_pred, residuals, alpha=0.6)
+        ax.axhline(0, color='red', linestyle='--')
+        ax.set_xlabel("Predicted Values")
+        ax.set_ylabel("Residuals")
+        ax.set_title(title)
+        figure.tight_layout()
+        return _render(figure, fmt)
+
+
+def residual_plot_base64(y_true, y_pred, title):
+    return base64.b64encode(residual_plot(y_true, y_pred, title)).decode('utf-8')
+
+
+def residual_points(y_true, y_pred, max_points=MAX_RESIDUAL_POINTS, random_state=42):
+    """
+    (predicted, residual) pairs for a client-side scatter: a seeded uniform sample of at most
+    max_points holdout rows, rounded to 3 decimals to keep the payload small.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    n_total = len(y_pred)
+    if n_total > max_points:
+        rng = np.random.default_rng(random_state)
+        keep = np.sort(rng.choice(n_total, size=max_points, replace=False))
+        y_true, y_pred = y_true[keep], y_pred[keep]
+    return {
+        "n_total": n_total,
+        "n_points": len(y_pred),
+        "predicted": np.round(y_pred, 3).tolist(),
+        "residual": np.round(y_true - y_pred, 3).tolist()
+    }
+
+
+def cluster_boxplot(stats, feature_to_plot, fmt='png'):
+    """
+    Boxplot of feature_to_plot per cluster from precomputed statistics (quantiles.boxplot_stats),
+    as image bytes. Drawing cost does not depend on how many rows the clusters hold.
+    """
+    from matplotlib import colormaps
+    palette = colormaps['Set2'].colors  # seaborn's "Set2" palette, repeated past 8 clusters
+
+    boxes = [{
+        'label': str(group['cluster']),
+        'q1': group['q1'],
+        'med': group['median'],
+        'q3': group['q3'],
+        'whislo': group['whisker_low'],
+        'whishi': group['whisker_high'],
+        'fliers': group['outliers']
+    } for group in stats]
+
+    with _figure(8, 5) as figure:
+        ax = figure.add_subplot()
+        artists = ax.bxp(boxes, patch_artist=True, widths=0.8,
+                         medianprops={'color': '0.25'}, flierprops={'marker': 'd', 'markersize': 4})
+        for i, patch in enumerate(artists['boxes']):
+            patch.set_facecolor(palette[i % len(palette)])
+        ax.set_title(f"{feature_to_plot} Distribution by Cluster")
+        ax.set_xlabel("Cluster")
+        ax.set_ylabel(feature_to_plot)
+        figure.tight_layout()
+        return _render(figure, fmt)
@@ -0,0 +1,192 @@
+import os
+
+import numpy as np
+
+'''
+Per-group quantile summaries for boxplots.
+
+boxplot_stats computes what a Tukey boxplot draws (quartiles, whiskers, outliers) for every
+group at once. With method="exact" the quartiles come from a single sort of (group, value);
+with method="sketch" each group is summarized by a KLLSketch, whose memory does not grow
+with the group size, so segments of tens of millions of rows can be summarized in chunks.
+Either way one more vectorized pass over the values gives exact whiskers and outlier counts
+for those quartiles.
+'''
+
+# boxplot payloads keep at most this many outliers per group
+MAX_BOXPLOT_OUTLIERS = 200
+
+# method="auto" uses sketches above this many values
+BOXPLOT_SKETCH_THRESHOLD = int(os.environ.get("BOXPLOT_SKETCH_THRESHOLD", 1_000_000))
+BOXPLOT_METHODS = ("auto", "exact", "sketch")
+
+SKETCH_CHUNKSIZE = 1_000_000
+
+
+# ---------------------- KLL Sketch ---------------------- #
+
+
+class KLLSketch:
+    """
+    Approximate quantiles in bounded memory (Karnin, Lang & Liberty style compactors).
+
+    Values enter level 0. When a level outgrows its capacity it is sorted and every other
+    value (random offset) is promoted to the next level with twice the weight. Capacities
+    shrink geometrically towards the lower levels, so about 3k values are kept in total
+    and the rank error is about 1/k. Sketches of disjoint parts of the data can be merged.
+    """
+
+    def __init__(self, k=200, random_state=0):
+        self.k = k
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self._levels = [np.empty(0)]
+        self._rng = np.random.default_rng(random_state)
+
+    def _capacity(self, level):
+        depth = len(self._levels) - level - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return self
+        self.n += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._levels[0] = np.concatenate([self._levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        while len(self._levels) < len(other._levels):
+            self._levels.append(np.empty(0))
+        for level, values in enumerate(other._levels):
+            self._levels[level] = np.concatenate([self._levels[level], values])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self._levels):
+            values = self._levels[level]
+            if len(values) > self._capacity(level):
+                if level + 1 == len(self._levels):
+                    self._levels.append(np.empty(0))
+                values = np.sort(values)
+                # an odd value out stays on this level
+                keep, values = (values[:1], values[1:]) if len(values) % 2 else (values[:0], values)
+                promoted = values[self._rng.integers(2)::2]
+                self._levels[level] = keep
+                self._levels[level + 1] = np.concatenate([self._levels[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q):
+        """Approximate q-quantile(s); the exact min and max for q = 0 and 1."""
+        q = np.asarray(q, dtype=np.float64)
+        if self.n == 0:
+            return np.full(q.shape, np.nan)
+        values = np.concatenate(self._levels)
+        weights = np.concatenate([np.full(len(values_), 2.0 ** level)
+                                  for level, values_ in enumerate(self._levels)])
+        order = np.argsort(values, kind='stable')
+        values, cumulative = values[order], np.cumsum(weights[order])
+        ranks = q * cumulative[-1]
+        result = values[np.minimum(np.searchsorted(cumulative, ranks, side='left'), len(values) - 1)]
+        return np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+
+
+# ---------------------- Boxplot Statistics ---------------------- #
+
+
+def _exact_quartiles(codes, values, n_groups):
+    """Quartiles of every group from one lexsort of (group, value), interpolated like np.percentile."""
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    def quantile(q):
+        position = starts + (counts - 1) * q
+        below = np.floor(position).astype(np.int64)
+        above = np.ceil(position).astype(np.int64)
+        return sorted_values[below] + (sorted_values[above] - sorted_values[below]) * (position - below)
+
+    return quantile(0.25), quantile(0.5), quantile(0.75)
+
+
+def _group_slices(codes, values, n_groups):
+    """values split by group code (one stable argsort, in their original order within a group)."""
+    order = np.argsort(codes, kind='stable')
+    bounds = np.cumsum(np.bincount(codes, minlength=n_groups))[:-1]
+    return np.split(values[order], bounds)
+
+
+def _sketch_quartiles(codes, values, n_groups, k=200):
+    sketches = [KLLSketch(k=k, random_state=group) for group in range(n_groups)]
+    for start in range(0, len(values), SKETCH_CHUNKSIZE):
+        chunk_codes = codes[start:start + SKETCH_CHUNKSIZE]
+        chunk_values = values[start:start + SKETCH_CHUNKSIZE]
+        for sketch, group_values in zip(sketches, _group_slices(chunk_codes, chunk_values, n_groups)):
+            sketch.update(group_values)
+    quartiles = np.array([sketch.quantile([0.25, 0.5, 0.75]) for sketch in sketches])
+    return quartiles[:, 0], quartiles[:, 1], quartiles[:, 2]
+
+
+def boxplot_stats(labels, values, whis=1.5, max_outliers=MAX_BOXPLOT_OUTLIERS, method="auto"):
+    """
+    Tukey boxplot statistics (the numbers matplotlib/seaborn draw) for every label, in label order:
+    count, q1, median, q3, whisker_low/high (the most extreme values within whis * IQR of the box),
+    the number of outliers and at most max_outliers of them, evenly spaced and keeping the extremes.
+    NaNs are skipped. method: "exact", "sketch" (approximate quartiles, see KLLSketch) or "auto".
+    """
+    if method not in BOXPLOT_METHODS:
+        raise ValueError(f"Unknown boxplot method '{method}', expected one of {', '.join(BOXPLOT_METHODS)}")
+    labels = np.asarray(labels)
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    labels, values = labels[present], values[present]
+    groups, codes = np.unique(labels, return_inverse=True)
+    n_groups = len(groups)
+    if method == "auto":
+        method = "sketch" if len(values) > BOXPLOT_SKETCH_THRESHOLD else "exact"
+
+    if method == "exact":
+        q1, median, q3 = _exact_quartiles(codes, values, n_groups)
+    else:
+        q1, median, q3 = _sketch_quartiles(codes, values, n_groups)
+
+    # whiskers and outliers for these quartiles, in one pass over the values
+    iqr = q3 - q1
+    inside = (values >= (q1 - whis * iqr)[codes]) & (values <= (q3 + whis * iqr)[codes])
+    whisker_low = np.full(n_groups, np.inf)
+    whisker_high = np.full(n_groups, -np.inf)
+    np.minimum.at(whisker_low, codes[inside], values[inside])
+    np.maximum.at(whisker_high, codes[inside], values[inside])
+    counts = np.bincount(codes, minlength=n_groups)
+    outlier_codes, outlier_values = codes[~inside], values[~inside]
+    n_outliers = np.bincount(outlier_codes, minlength=n_groups)
+    outliers_by_group = _group_slices(outlier_codes, outlier_values, n_groups)
+
+    stats = []
+    for i, group in enumerate(groups):
+        outliers = np.sort(outliers_by_group[i])
+        if len(outliers) > max_outliers:
+            outliers = outliers[np.linspace(0, len(outliers) - 1, max_outliers).round().astype(np.int64)]
+        stats.append({
+            'cluster': group.item(),
+            'count': int(counts[i]),
+            'q1': float(q1[i]),
+            'median': float(median[i]),
+            'q3': float(q3[i]),
+            'whisker_low': float(whisker_low[i]),
+            'whisker_high': float(whisker_high[i]),
+            'n_outliers': int(n_outliers[i]),
+            'outliers': outliers.tolist()
+        })
+    return stats
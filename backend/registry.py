@@ -0,0 +1,226 @@
+import importlib
+import os
+import threading
+
+from artifacts import ArtifactStore, DEFAULT_ARTIFACT_DIR, IN_MEMORY, TRAINING_MODES
+from dataset import dataset_fingerprint
+from metrics import count_cache, count_train, timed
+
+# ---------------------- Model Specs ---------------------- #
+
+# model name -> ("module:class" of the model, name of the method that trains it);
+# the model modules pull in sklearn/xgboost, so they are only imported by model_class()
+MODEL_SPECS = {
+    "linear-regression": ("models.linear_regression:Linear_Regression", "linear_regression"),
+    "random-forest": ("models.random_forest:Random_Forest", "random_forest_regressor"),
+    "xgboost": ("models.xgboost:XGBoost_Regression", "xgboost_regression"),
+}
+
+# model name -> out-of-core training method, taking (csv_path, chunksize); see streaming.py
+STREAMING_TRAINERS = {
+    "linear-regression": "linear_regression_streaming",
+    "xgboost": "xgboost_regression_streaming",
+}
+
+# model name -> method returning a copy of a trained model updated with appended rows,
+# taking (X, y, holdout); see ingest.py. The other models are refit from scratch.
+INCREMENTAL_UPDATERS = {
+    "linear-regression": "with_appended_rows",
+    "xgboost": "with_appended_rows",
+}
+
+
+def normalize_model_name(model_name):
+    """Accept both 'random-forest' and 'random_forest' style names."""
+    return model_name.lower().replace("_", "-")
+
+
+def model_class(model_name):
+    """The model class registered under model_name, importing its module on first use."""
+    module_name, class_name = MODEL_SPECS[model_name][0].split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+# ---------------------- Registry ---------------------- #
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of trained models.
+
+    Each model is trained once per (model name, hyperparameters, dataset fingerprint)
+    and then shared by every request. Concurrent requests for a model that is still
+    training wait for that single fit instead of starting their own.
+
+    With an ArtifactStore attached, a missing model is first loaded from disk and
+    only trained (then saved) when no artifact exists for its key. `training` picks the
+    artifacts that are loaded: "in-memory" ones, or "streaming" ones built with
+    `python -m backend.train --streaming` for the models that have a streaming trainer.
+    Models trained by the registry itself are in-memory fits and are saved as such.
+
+    Listeners added with add_listener are called as listener(model_name, params, fingerprint, model)
+    whenever a model becomes available (trained or loaded), e.g. to pre-render its plots.
+
+    put() registers a model built elsewhere (an incremental update or a background refit);
+    a model put with stale=True was trained on older data and is served until it is replaced.
+    Listeners are not called for stale models, only for the model that replaces them; anything
+    derived from the model served under a key (a plot's ETag) has to include is_stale().
+    """
+
+    def __init__(self, store=None, training=IN_MEMORY):
+        if training not in TRAINING_MODES:
+            raise ValueError(f"Unknown training mode '{training}', expected one of {', '.join(TRAINING_MODES)}")
+        self.store = store
+        self.training = training
+        self._models = {}
+        self._stale = set()
+        self._key_locks = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self, name, params, fingerprint, model):
+        for listener in self._listeners:
+            listener(name, dict(params), fingerprint, model)
+
+    def artifact_training(self, model_name):
+        """Training mode of the artifacts loaded for a model."""
+        return self.training if normalize_model_name(model_name) in STREAMING_TRAINERS else IN_MEMORY
+
+    @staticmethod
+    def make_key(model_name, fingerprint, params):
+        return (normalize_model_name(model_name), tuple(sorted(params.items())), fingerprint)
+
+    def get(self, model_name, df, fingerprint=None, standardization_params=None, **params):
+        """
+        Return a trained model, training it on df (an encoded DataFrame or a FeatureMatrix,
+        see features.py) the first time it is requested.
+        df and standardization_params may be zero-argument callables, so the data is only
+        loaded when a model actually has to be trained. Pass a precomputed fingerprint to
+        avoid hashing df on every call; standardization_params are only saved alongside a
+        newly written artifact.
+        """
+        name = normalize_model_name(model_name)
+        if name not in MODEL_SPECS:
+            raise ValueError(f"Unknown model '{model_name}'")
+        if fingerprint is None:
+            df = df() if callable(df) else df
+            fingerprint = dataset_fingerprint(df)
+        key = self.make_key(name, fingerprint, params)
+
+        model = self._models.get(key)
+        if model is not None:
+            count_cache("models", hit=True)
+            return model
+
+        with self._lock_for(key):
+            model = self._models.get(key)
+            count_cache("models", hit=model is not None)
+            if model is None:
+                cls, train_method = model_class(name), MODEL_SPECS[name][1]
+                if self.store is not None:
+                    model = self.store.load(name, params, fingerprint, cls, self.artifact_training(name))
+                if model is None:
+                    data = df() if callable(df) else df
+                    with timed("fit"):
+                        model = cls(data, **params)
+                        getattr(model, train_method)()
+                    count_train(name)
+                    if self.store is not None:
+                        if callable(standardization_params):
+                            standardization_params = standardization_params()
+                        self.store.save(name, params, fingerprint, model,
+                                        standardization_params=standardization_params)
+                self._models[key] = model
+                self._notify(name, params, fingerprint, model)
+        return model
+
+    def get_loaded(self, model_name, fingerprint, **params):
+        """
+        The model if it is already trained or loaded in this process, else None (never trains).
+        Only a hit counts as a lookup in the metrics: a caller falls back to get() on a miss.
+        """
+        model = self._models.get(self.make_key(model_name, fingerprint, params))
+        if model is not None:
+            count_cache("models", hit=True)
+        return model
+
+    def loaded(self, fingerprint):
+        """[(model name, params, model)] of every model trained or loaded for this dataset."""
+        with self._lock:
+            items = list(self._models.items())
+        return [(name, dict(params), model) for (name, params, key_fingerprint), model in items
+                if key_fingerprint == fingerprint]
+
+    def put(self, model_name, fingerprint, model, stale=False, **params):
+        """Register a trained model for this dataset, replacing any model under the same key."""
+        name = normalize_model_name(model_name)
+        key = self.make_key(name, fingerprint, params)
+        with self._lock_for(key):
+            with self._lock:
+                self._models[key] = model
+                if stale:
+                    self._stale.add(key)
+                else:
+                    self._stale.discard(key)
+            if not stale:
+                self._notify(name, params, fingerprint, model)
+        return model
+
+    def is_stale(self, model_name, fingerprint, **params):
+        """True while the model served for this dataset is one trained on older data."""
+        return self.make_key(model_name, fingerprint, params) in self._stale
+
+    def load_from_store(self, fingerprint, model_names=None):
+        """
+        Warm start: load every model that already has an artifact for this dataset
+        (default hyperparameters) without training anything. Returns the names loaded.
+        """
+        if self.store is None:
+            return []
+        loaded = []
+        for name in model_names or MODEL_SPECS:
+            key = self.make_key(name, fingerprint, {})
+            if key in self._models:
+                loaded.append(name)
+                continue
+            training = self.artifact_training(name)
+            if not self.store.exists(name, {}, fingerprint, training):
+                continue  # nothing to load: do not import the model's libraries yet
+            with self._lock_for(key):
+                model = self.store.load(name, {}, fingerprint, model_class(name), training)
+                if model is not None and key not in self._models:
+                    self._models[key] = model
+                    self._notify(name, {}, fingerprint, model)
+                if model is not None:
+                    loaded.append(name)
+        return loaded
+
+    def warm(self, df, fingerprint=None, model_names=None):
+        """Train every registered model (or the given subset) ahead of the first request."""
+        if fingerprint is None:
+            fingerprint = dataset_fingerprint(df)
+        for name in model_names or MODEL_SPECS:
+            self.get(name, df, fingerprint=fingerprint)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stale.clear()
+            self._key_locks.clear()
+
+    def _lock_for(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+
+def default_store():
+    """Artifact store from MODEL_ARTIFACT_DIR; set it to an empty string to disable persistence."""
+    root = os.environ.get("MODEL_ARTIFACT_DIR", DEFAULT_ARTIFACT_DIR)
+    return ArtifactStore(root) if root else None
+
+
+registry = ModelRegistry(store=default_store(), training=os.environ.get("MODEL_ARTIFACT_TRAINING", IN_MEMORY))
@@ -1,31 +1,620 @@
 import pandas as pd
-from sklearn.cluster import KMeans, DBSCAN
-from sklearn.datasets import make_blobs
-from sklearn.preprocessing import StandardScaler
-import matplotlib.pyplot as plt
-import seaborn as sns  # data viz library
-from mpl_toolkits.mplot3d import Axes3D  # for 3D plotting
-import io
+import numpy as np
+import os
 import base64
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+from dataset import dataset_fingerprint
+from features import FeatureMatrix
+from metrics import count_cache, timed
+from plotting import cluster_boxplot
+from quantiles import BOXPLOT_METHODS, MAX_BOXPLOT_OUTLIERS, boxplot_stats
+from training import SharedMatrix, attach_matrix, share_matrix
+from workers import map_in_pool, process_pool_running, run_in_pool
+
+# sklearn is imported by the functions that fit, which normally run in the worker processes
+# (see workers.py): the API process itself does not pay for importing it
+
+# ---------------------- Clustering Cache ---------------------- #
+
+# features: the (sorted) columns the model was fitted on
+# labels: cluster label per row; centers: cluster centroids (None for DBSCAN)
+# engine, inertia, n_iter, converged: how a K-Means fit went (None for DBSCAN)
+# silhouette: (sampled) silhouette score, filled in by K-Means sweeps
+ClusterResult = namedtuple("ClusterResult", ["features", "labels", "centers",
+                                             "engine", "inertia", "n_iter", "converged", "silhouette"],
+                           defaults=(None, None, None, None, None))
+
+
+def _arrays(value):
+    """numpy buffers held by a cached namedtuple (dense arrays and the parts of sparse matrices)."""
+    for field in value:
+        if isinstance(field, np.ndarray):
+            yield field
+        elif hasattr(field, 'indptr'):  # scipy CSR/CSC matrix
+            yield from (field.data, field.indices, field.indptr)
+
+
+class ClusteringCache:
+    """
+    LRU cache of clustering results, bounded by number of entries and by total bytes of
+    the stored arrays. Keys are (algorithm, sorted features, params, dataset fingerprint).
+    Lookups are counted in the metrics under name (not at all without one).
+    """
+
+    def __init__(self, max_entries=64, max_bytes=256 * 1024 * 1024, name=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(algorithm, features, params, fingerprint):
+        return (algorithm, tuple(sorted(features)), tuple(sorted(params.items())), fingerprint)
+
+    @staticmethod
+    def _size(result):
+        return sum(array.nbytes for array in _arrays(result))
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+        if self.name is not None:
+            count_cache(self.name, hit=result is not None)
+        return result
+
+    def put(self, key, result):
+        size = self._size(result)
+        if size > self.max_bytes:
+            return
+        # cached arrays are shared between requests
+        for array in _arrays(result):
+            array.flags.writeable = False
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= self._size(self._entries.pop(key))
+            self._entries[key] = result
+            self.total_bytes += size
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= self._size(evicted)
+
+    def keys(self, fingerprint=None):
+        """Cached keys, most recently used last; only those of one dataset if fingerprint is given."""
+        with self._lock:
+            return [key for key in self._entries if fingerprint is None or key[3] == fingerprint]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+cluster_cache = ClusteringCache(
+    name="clusters",
+    max_entries=int(os.environ.get("SEGMENTATION_CACHE_ENTRIES", 64)),
+    max_bytes=int(os.environ.get("SEGMENTATION_CACHE_MB", 256)) * 1024 * 1024,
+)
+
+
+# ---------------------- Mini-Batch K-Means ---------------------- #
+
+# engine="auto" switches from exact KMeans to mini-batch above this many rows
+KMEANS_MINIBATCH_THRESHOLD = int(os.environ.get("KMEANS_MINIBATCH_THRESHOLD", 100_000))
+KMEANS_ENGINES = ("auto", "exact", "minibatch")
+KMEANS_CHUNKSIZE = 10_000
+
+
+def resolve_kmeans_engine(n_rows, engine="auto"):
+    if engine not in KMEANS_ENGINES:
+        raise ValueError(f"Unknown K-Means engine '{engine}', expected one of {', '.join(KMEANS_ENGINES)}")
+    if engine != "auto":
+        return engine
+    return "minibatch" if n_rows > KMEANS_MINIBATCH_THRESHOLD else "exact"
+
+
+def streaming_kmeans(iter_chunks, n_clusters, max_epochs=10, tol=1e-3, patience=10, random_state=42):
+    """
+    MiniBatchKMeans fitted with partial_fit, one chunk at a time. iter_chunks() returns a
+    fresh iterator of float arrays (one epoch), so the data never has to be in memory at once.
+    Converged once `patience` chunks in a row move the centroids by at most tol (relative
+    Frobenius norm), which usually happens before the first epoch is over.
+    Returns (model, chunks seen, converged).
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    model = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3)
+    previous = None
+    n_steps = stable = 0
+    for _ in range(max_epochs):
+        for chunk in iter_chunks():
+            model.partial_fit(chunk)
+            n_steps += 1
+            centers = model.cluster_centers_
+            if previous is not None:
+                shift = np.linalg.norm(centers - previous) / max(np.linalg.norm(previous), 1e-12)
+                stable = stable + 1 if shift <= tol else 0
+                if stable >= patience:
+                    return model, n_steps, True
+            previous = centers.copy()
+    return model, n_steps, False
+
+
+def minibatch_kmeans(X, n_clusters, chunksize=KMEANS_CHUNKSIZE, max_epochs=10, tol=1e-3, random_state=42):
+    """
+    Mini-batch K-Means over an in-memory matrix, visited in shuffled chunks every epoch.
+    Returns (labels, centers, inertia, chunks seen, converged); labels and inertia are
+    computed chunk by chunk as well.
+    """
+    rng = np.random.default_rng(random_state)
+    chunksize = max(chunksize, n_clusters)
+
+    def iter_chunks():
+        order = rng.permutation(len(X))
+        for start in range(0, len(X), chunksize):
+            yield X[np.sort(order[start:start + chunksize])]
+
+    model, n_epochs, converged = streaming_kmeans(iter_chunks, n_clusters, max_epochs, tol, random_state)
+
+    labels = np.empty(len(X), dtype=np.int32)
+    inertia = 0.0
+    for start in range(0, len(X), chunksize):
+        chunk = X[start:start + chunksize]
+        chunk_labels = model.predict(chunk)
+        labels[start:start + chunksize] = chunk_labels
+        inertia += float(((chunk - model.cluster_centers_[chunk_labels]) ** 2).sum())
+    return labels, model.cluster_centers_, inertia, n_epochs, converged
+
+
+def fit_kmeans_matrix(X, features, n_clusters, engine="exact"):
+    """One K-Means fit of the matrix X (columns = features) with a concrete engine."""
+    if engine == "minibatch":
+        labels, centers, inertia, n_iter, converged = minibatch_kmeans(X, n_clusters)
+        return ClusterResult(features, labels, centers, engine, inertia, n_iter, converged)
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+    labels = kmeans.fit_predict(X)
+    return ClusterResult(features, labels, kmeans.cluster_centers_, engine,
+                         float(kmeans.inertia_), int(kmeans.n_iter_),
+                         bool(kmeans.n_iter_ < kmeans.max_iter))
+
+
+# ---------------------- K-Means Sweep ---------------------- #
+
+KMEANS_SWEEP_MAX_CLUSTERS = 20
+# silhouette is O(n^2): score a sample of this many rows on larger datasets
+SILHOUETTE_SAMPLE_SIZE = int(os.environ.get("SILHOUETTE_SAMPLE_SIZE", 3000))
+
+
+def sampled_silhouette(X, labels, sample_size=SILHOUETTE_SAMPLE_SIZE, random_state=42):
+    """Silhouette score on at most sample_size rows, or None when there is a single cluster."""
+    from sklearn.metrics import silhouette_score
+
+    if len(np.unique(labels)) < 2:
+        return None
+    sample_size = sample_size if len(X) > sample_size else None
+    return float(silhouette_score(X, labels, sample_size=sample_size, random_state=random_state))
+
+
+def kmeans_sweep_point(X, features, n_clusters, engine="exact"):
+    """
+    Fit for one k of a sweep, with its silhouette (runs in a worker process). X is the
+    clustering input, or a SharedMatrix of it memory-mapped here (see training.share_matrix).
+    """
+    if isinstance(X, SharedMatrix):
+        X = np.asarray(attach_matrix(X).values)
+    result = fit_kmeans_matrix(X, features, n_clusters, engine)
+    return result._replace(silhouette=sampled_silhouette(X, result.labels))
+
+
+# ---------------------- Scalable DBSCAN ---------------------- #
+
+# mode="auto" switches to sampling above this many rows, or when the neighbor graph would be too big
+DBSCAN_SAMPLE_THRESHOLD = int(os.environ.get("DBSCAN_SAMPLE_THRESHOLD", 200_000))
+DBSCAN_MAX_GRAPH_NNZ = int(os.environ.get("DBSCAN_MAX_GRAPH_NNZ", 20_000_000))
+DBSCAN_SAMPLE_SIZE = int(os.environ.get("DBSCAN_SAMPLE_SIZE", 50_000))
+DBSCAN_MODES = ("auto", "exact", "indexed", "sampled")
+
+# radius: distances up to radius are stored, so the graph answers any eps <= radius
+NeighborGraph = namedtuple("NeighborGraph", ["radius", "graph"])
+
+# kd-trees prune well in few dimensions; ball trees degrade more gracefully with many one-hot columns
+KD_TREE_MAX_DIMENSIONS = 15
+
+# not named: a cached graph of a smaller radius is a miss, see Segmentation.neighbor_graph
+neighbor_graph_cache = ClusteringCache(
+    max_entries=4,
+    max_bytes=int(os.environ.get("DBSCAN_GRAPH_CACHE_MB", 512)) * 1024 * 1024,
+)
+
+
+def choose_tree_algorithm(n_features):
+    return "kd_tree" if n_features <= KD_TREE_MAX_DIMENSIONS else "ball_tree"
+
+
+def tree_index(X, radius):
+    """Fitted kd/ball tree over X answering radius queries (radius is the default query radius)."""
+    from sklearn.neighbors import NearestNeighbors
+
+    return NearestNeighbors(radius=radius, algorithm=choose_tree_algorithm(X.shape[1])).fit(X)
+
+
+def estimate_graph_nnz(X, radius, n_probe=1000, random_state=42, index=None):
+    """
+    Stored entries of the radius-neighbors graph of X, extrapolated from a sample of query points.
+    Pass the tree index of X (built for this radius) to reuse it.
+    """
+    index = index if index is not None else tree_index(X, radius)
+    rng = np.random.default_rng(random_state)
+    probe = rng.choice(len(X), size=min(n_probe, len(X)), replace=False)
+    counts = [len(neighbors) for neighbors in index.radius_neighbors(X[probe], return_distance=False)]
+    return int(np.mean(counts) * len(X))
+
+
+def resolve_dbscan_mode(X, eps, mode="auto", index=None):
+    """The concrete mode for mode="auto": the cached-graph path while it fits in memory, else sampling."""
+    if mode not in DBSCAN_MODES:
+        raise ValueError(f"Unknown DBSCAN mode '{mode}', expected one of {', '.join(DBSCAN_MODES)}")
+    if mode != "auto":
+        return mode
+    if len(X) > DBSCAN_SAMPLE_THRESHOLD or estimate_graph_nnz(X, eps, index=index) > DBSCAN_MAX_GRAPH_NNZ:
+        return "sampled"
+    return "indexed"
+
+
+def radius_neighbors_graph(X, radius, index=None):
+    """Sparse (CSR) graph of pairwise distances <= radius, built with a tree index (reused if given)."""
+    index = index if index is not None else tree_index(X, radius)
+    return index.radius_neighbors_graph(X, mode="distance").tocsr()
+
+
+def auto_neighbor_graph(X, eps):
+    """
+    mode="auto" in one pass: ("indexed", graph) when the radius-neighbors graph fits in memory,
+    else ("sampled", None). The tree index is built once, for both the estimate and the graph.
+    """
+    if len(X) > DBSCAN_SAMPLE_THRESHOLD:
+        return "sampled", None
+    index = tree_index(X, eps)
+    if resolve_dbscan_mode(X, eps, "auto", index=index) == "sampled":
+        return "sampled", None
+    return "indexed", radius_neighbors_graph(X, eps, index=index)
+
+
+def dbscan_labels(X, eps, min_samples):
+    from sklearn.cluster import DBSCAN
+
+    return DBSCAN(eps=eps, min_samples=min_samples).fit_predict(X)
+
+
+def dbscan_labels_from_graph(graph, eps, min_samples):
+    """
+    DBSCAN over a precomputed radius-neighbors graph. The graph may have been built for a
+    larger radius: entries farther than eps are ignored, so one graph serves a whole sweep.
+    """
+    from sklearn.cluster import DBSCAN
+
+    return DBSCAN(eps=eps, min_samples=min_samples, metric="precomputed").fit_predict(graph)
+
+
+def sampled_dbscan_labels(X, eps, min_samples, sample_size=DBSCAN_SAMPLE_SIZE, random_state=42):
+    """
+    Approximate DBSCAN for large inputs: cluster a uniform sample, then give every other row the
+    label of its nearest core sample if that core sample is within eps (noise otherwise).
+    min_samples is scaled by the sampling rate so the density threshold stays comparable.
+    """
+    from sklearn.cluster import DBSCAN
+    from sklearn.neighbors import NearestNeighbors
+
+    n_rows = len(X)
+    if n_rows <= sample_size:
+        return DBSCAN(eps=eps, min_samples=min_samples,
+                      algorithm=choose_tree_algorithm(X.shape[1])).fit_predict(X)
+
+    rng = np.random.default_rng(random_state)
+    sample = np.sort(rng.choice(n_rows, size=sample_size, replace=False))
+    sample_min_samples = max(2, int(round(min_samples * sample_size / n_rows)))
+    dbscan = DBSCAN(eps=eps, min_samples=sample_min_samples,
+                    algorithm=choose_tree_algorithm(X.shape[1])).fit(X[sample])
+
+    labels = np.full(n_rows, -1, dtype=dbscan.labels_.dtype)
+    labels[sample] = dbscan.labels_
+    core = dbscan.core_sample_indices_
+    if len(core) == 0:
+        return labels
+
+    rest = np.ones(n_rows, dtype=bool)
+    rest[sample] = False
+    index = NearestNeighbors(n_neighbors=1, algorithm=choose_tree_algorithm(X.shape[1]))
+    index.fit(X[sample[core]])
+    distances, nearest = index.kneighbors(X[rest])
+    labels[rest] = np.where(distances[:, 0] <= eps, dbscan.labels_[core][nearest[:, 0]], -1)
+    return labels
+
+
+# ---------------------- Cluster Statistics ---------------------- #
+
+# (stat name, column): per-cluster averages reported to the frontend
+CLUSTER_NUMERIC_STATS = [
+    ("avg_total_spend", "Total Spend"),
+    ("avg_age", "Age"),
+    ("avg_items_purchased", "Items Purchased"),
+    ("avg_rating", "Average Rating"),
+    ("avg_days_since_last_purchase", "Days Since Last Purchase")
+]
+
+# (stat name, column): per-cluster category shares
+CLUSTER_DISTRIBUTIONS = [
+    ("gender_distribution", "Gender"),
+    ("membership_type_distribution", "Membership Type"),
+    ("satisfaction_level_distribution", "Satisfaction Level")
+]
+
+
+def _grouped_means(codes, n_clusters, values):
+    """Per-cluster mean of values (NaNs skipped) with two bincounts."""
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    sums = np.bincount(codes, weights=np.where(present, values, 0.0), minlength=n_clusters)
+    counts = np.bincount(codes, weights=present, minlength=n_clusters)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def _grouped_distributions(codes, n_clusters, values):
+    """Per-cluster normalized value counts, most frequent first, from one bincount over (cluster, category)."""
+    category_codes, categories = pd.factorize(values)
+    present = category_codes >= 0
+    n_categories = len(categories)
+    counts = np.bincount(codes[present] * n_categories + category_codes[present],
+                         minlength=n_clusters * n_categories).reshape(n_clusters, n_categories)
+    distributions = []
+    for row in counts:
+        total = row.sum()
+        order = np.argsort(-row, kind='stable')
+        distributions.append({categories[i]: row[i] / total for i in order if row[i] > 0})
+    return distributions
+
+
+@timed("aggregate")
+def summarize_clusters(df_clusters, standardization_params):
+    """
+    Statistics for every cluster of df_clusters (a frame with a 'Cluster' column) in a single
+    grouped pass: size, de-standardized averages, % with discount and category distributions.
+    Clusters are keyed by label, in order of first appearance.
+    """
+    labels, clusters = pd.factorize(df_clusters['Cluster'])
+    n_clusters = len(clusters)
+    sizes = np.bincount(labels, minlength=n_clusters)
+
+    averages = {}
+    for stat_name, col_name in CLUSTER_NUMERIC_STATS:
+        if col_name not in df_clusters.columns:
+            averages[stat_name] = np.zeros(n_clusters)
+            continue
+        means = _grouped_means(labels, n_clusters, df_clusters[col_name])
+        # unstandardize columns before returning to frontend
+        if col_name in standardization_params:
+            means = means * standardization_params[col_name]["std"] + \
+                standardization_params[col_name]["mean"]
+        averages[stat_name] = means
+    pct_discount = _grouped_means(labels, n_clusters, df_clusters['Discount Applied']) * 100
+
+    distributions = {}
+    for stat_name, col_name in CLUSTER_DISTRIBUTIONS:
+        if col_name in df_clusters.columns:
+            distributions[stat_name] = _grouped_distributions(
+                labels, n_clusters, df_clusters[col_name])
+        else:
+            distributions[stat_name] = [{}] * n_clusters
+
+    stats = {}
+    for i, cluster in enumerate(clusters):
+        stats[int(cluster)] = {
+            'size': int(sizes[i]),
+            **{stat_name: float(values[i]) for stat_name, values in averages.items()},
+            'pct_discount_applied': float(pct_discount[i]),
+            **{stat_name: dists[i] for stat_name, dists in distributions.items()}
+        }
+    return stats
 
 
 class Segmentation:
 
-    def __init__(self, df):
+    def __init__(self, df, fingerprint=None, matrix=None):
+        """
+        fingerprint identifies df in the clustering cache; it is computed from df if not given.
+        matrix: the same data as a FeatureMatrix (see features.py); clustering inputs are then
+        taken from it in float32 instead of being copied out of df in float64.
+        """
         self.df = df
+        self.matrix = matrix
+        self._fingerprint = fingerprint
 
-    def dbscan(self):
-        X, _ = make_blobs(n_samples=300, centers=3, cluster_std=0.5)
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            self._fingerprint = dataset_fingerprint(self.df)
+        return self._fingerprint
 
-        dbscan = DBSCAN(eps=0.3, min_samples=5)
-        labels = dbscan.fit_predict(X)
+    def _feature_values(self, features):
+        """The clustering input for the features (in the given order)."""
+        if self.matrix is not None:
+            return self.matrix.take(features)
+        return self.df[features].to_numpy(dtype=np.float64)
 
-        plt.scatter(X[:, 0], X[:, 1], c=labels, cmap='viridis')
-        plt.show()
+    def fit_kmeans(self, features, n_clusters=3, engine="exact"):
+        """
+        K-Means labels and centroids for the features, fitted once and then served from the cache.
 
-    def k_means_cluster(self, features, n_clusters=3, plot=True):
+        engine: "exact" is sklearn's full-batch KMeans; "minibatch" fits MiniBatchKMeans
+        incrementally over chunks; "auto" uses mini-batch above KMEANS_MINIBATCH_THRESHOLD rows.
+        """
+        engine = resolve_kmeans_engine(len(self.df), engine)
+        key = self._kmeans_key(features, n_clusters, engine)
+        result = cluster_cache.get(key)
+        if result is None:
+            features = sorted(features)
+            X = self._feature_values(features)
+            with timed("fit"):
+                result = run_in_pool(fit_kmeans_matrix, X, features, n_clusters, engine)
+            cluster_cache.put(key, result)
+        return result
+
+    def _kmeans_key(self, features, n_clusters, engine):
+        params = {"n_clusters": n_clusters, "random_state": 42}
+        if engine != "exact":
+            params["engine"] = engine
+        return cluster_cache.make_key("kmeans", features, params, self.fingerprint)
+
+    def kmeans_sweep(self, features, k_min=2, k_max=10, engine="exact"):
+        """
+        K-Means fits for every k in [k_min, k_max] with their silhouette scores. Missing fits
+        run in parallel on the worker process pool; all of them land in the clustering cache,
+        so fit_kmeans for any k of the sweep is a cache hit afterwards.
+        """
+        if not 2 <= k_min <= k_max <= KMEANS_SWEEP_MAX_CLUSTERS:
+            raise ValueError(f"Expected 2 <= k_min <= k_max <= {KMEANS_SWEEP_MAX_CLUSTERS}")
+        engine = resolve_kmeans_engine(len(self.df), engine)
+        features = sorted(features)
+        X = None
+
+        results, missing = {}, []
+        for k in range(k_min, k_max + 1):
+            result = cluster_cache.get(self._kmeans_key(features, k, engine))
+            if result is not None and result.silhouette is None:
+                # fitted by a single /segmentation/kmeans call: only the score is missing
+                if X is None:
+                    X = self._feature_values(features)
+                with timed("fit"):
+                    result = result._replace(silhouette=run_in_pool(sampled_silhouette, X, result.labels))
+                cluster_cache.put(self._kmeans_key(features, k, engine), result)
+            if result is None:
+                missing.append(k)
+            else:
+                results[k] = result
+
+        if missing:
+            if X is None:
+                X = self._feature_values(features)
+            with timed("fit"), tempfile.TemporaryDirectory(prefix="kmeans-sweep-") as directory:
+                # the worker processes map one .npy copy of X instead of unpickling X for every k
+                if process_pool_running() and len(missing) > 1:
+                    X = share_matrix(FeatureMatrix(X, features), directory)
+                fitted = map_in_pool(kmeans_sweep_point, [X] * len(missing), [features] * len(missing),
+                                     missing, [engine] * len(missing))
+            for k, result in zip(missing, fitted):
+                cluster_cache.put(self._kmeans_key(features, k, engine), result)
+                results[k] = result
+        return [results[k] for k in range(k_min, k_max + 1)]
+
+    def neighbor_graph(self, features, X, eps):
+        """
+        Cached radius-neighbors graph of the features, reused by every DBSCAN fit with a
+        smaller or equal eps. A larger eps rebuilds the graph at the new radius.
+        """
+        key = neighbor_graph_cache.make_key("radius_graph", features, {}, self.fingerprint)
+        cached = neighbor_graph_cache.get(key)
+        count_cache("neighbor_graphs", hit=cached is not None and cached.radius >= eps)
+        if cached is not None and cached.radius >= eps:
+            return cached.graph
+        with timed("fit"):
+            graph = run_in_pool(radius_neighbors_graph, X, eps)
+        neighbor_graph_cache.put(key, NeighborGraph(eps, graph))
+        return graph
+
+    def auto_neighbor_graph(self, features, X, eps):
+        """
+        Resolve mode="auto" (see resolve_dbscan_mode) to ("indexed", graph) or ("sampled", None).
+        A cached graph small enough for the indexed path is used as is; otherwise the estimate
+        and the graph share one tree index (see auto_neighbor_graph), and the graph is cached.
+        """
+        if len(X) > DBSCAN_SAMPLE_THRESHOLD:
+            return "sampled", None
+        key = neighbor_graph_cache.make_key("radius_graph", features, {}, self.fingerprint)
+        cached = neighbor_graph_cache.get(key)
+        # a graph of a larger radius has at least as many entries as the one for eps
+        hit = cached is not None and cached.radius >= eps and cached.graph.nnz <= DBSCAN_MAX_GRAPH_NNZ
+        count_cache("neighbor_graphs", hit=hit)
+        if hit:
+            return "indexed", cached.graph
+        with timed("fit"):
+            mode, graph = run_in_pool(auto_neighbor_graph, X, eps)
+        if graph is not None:
+            neighbor_graph_cache.put(key, NeighborGraph(eps, graph))
+        return mode, graph
+
+    def fit_dbscan(self, features, eps=0.5, min_samples=5, mode="exact", sample_size=None):
+        """
+        DBSCAN labels for the features, fitted once and then served from the cache.
+
+        mode: "exact" runs sklearn's DBSCAN on the feature matrix; "indexed" clusters a cached
+        radius-neighbors graph (same labels, cheap eps/min_samples sweeps); "sampled" clusters a
+        sample of sample_size rows and assigns the rest to the nearest core point; "auto" picks
+        "indexed" or "sampled" from the row count and the estimated graph size.
+        """
+        if mode not in DBSCAN_MODES:
+            raise ValueError(f"Unknown DBSCAN mode '{mode}', expected one of {', '.join(DBSCAN_MODES)}")
+        sample_size = sample_size or DBSCAN_SAMPLE_SIZE
+        params = {"eps": eps, "min_samples": min_samples}
+        if mode != "exact":
+            # "exact" keeps the original key, so its cached results are shared with older callers
+            params.update(mode=mode, sample_size=sample_size)
+        key = cluster_cache.make_key("dbscan", features, params, self.fingerprint)
+        result = cluster_cache.get(key)
+        if result is None:
+            features = sorted(features)
+            X = self._feature_values(features)
+            graph = None
+            if mode == "auto":
+                mode, graph = self.auto_neighbor_graph(features, X, eps)
+            if mode == "indexed":
+                if graph is None:
+                    graph = self.neighbor_graph(features, X, eps)
+                with timed("fit"):
+                    labels = run_in_pool(dbscan_labels_from_graph, graph, eps, min_samples)
+            else:
+                with timed("fit"):
+                    if mode == "sampled":
+                        labels = run_in_pool(sampled_dbscan_labels, X, eps, min_samples, sample_size)
+                    else:
+                        labels = run_in_pool(dbscan_labels, X, eps, min_samples)
+            result = ClusterResult(features, labels, None)
+            cluster_cache.put(key, result)
+        return result
+
+    def refit_cached(self, previous_fingerprint):
+        """
+        Refit, for this dataset, every K-Means and DBSCAN clustering cached for an earlier version
+        of it (e.g. before rows were appended, see ingest.py), so the same requests stay cache hits.
+        Returns the number of clusterings fitted.
+        """
+        refit = 0
+        for algorithm, features, params, _ in cluster_cache.keys(previous_fingerprint):
+            params = dict(params)
+            if algorithm == "kmeans":
+                self.fit_kmeans(list(features), params["n_clusters"], params.get("engine", "exact"))
+            elif algorithm == "dbscan":
+                self.fit_dbscan(list(features), params["eps"], params["min_samples"],
+                                params.get("mode", "exact"), params.get("sample_size"))
+            else:
+                continue
+            refit += 1
+        return refit
+
+    def k_means_cluster(self, features, n_clusters=3, plot=True, engine="exact"):
         """
         K-Means clusters are formed by partitioning data into k groups based on similarity
+        (engine: "exact", "minibatch" or "auto", see fit_kmeans)
         """
 
         """
@@ -42,22 +631,23 @@ class Segmentation:
 
         In this implementation, the most relevant features for visualization are automatically selected based on the variance of cluster centers, highlighting the features that best separate the clusters.
         """
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        cluster_labels = kmeans.fit_predict(self.df[features])
+        result = self.fit_kmeans(features, n_clusters=n_clusters, engine=engine)
 
-        # create copy 
-        df_with_clusters = self.df.copy()
-        df_with_clusters['Cluster'] = cluster_labels
+        # copy-on-write copy: the shared df is not modified or duplicated
+        df_with_clusters = self.df.assign(Cluster=result.labels)
 
         # Automatically select most relevant features (highest variance in cluster centers)
-        centers = kmeans.cluster_centers_
+        centers = result.centers
         variances = centers.var(axis=0)
-        feature_variance = list(zip(features, variances))
+        feature_variance = list(zip(result.features, variances))
 
         # Sort features by variance descending
         feature_variance.sort(key=lambda x: x[1], reverse=True)
 
         if plot:
+            # interactive windows (scripts and notebooks); the API renders through plotting.py
+            import matplotlib.pyplot as plt
+            import seaborn as sns  # data viz library
             if len(features) >= 3:
                 top3 = [fv[0] for fv in feature_variance[:3]]
                 fig = plt.figure(figsize=(10, 7))
@@ -91,7 +681,7 @@ class Segmentation:
 
         return df_with_clusters
 
-    def dbscan_cluster(self, features, eps=0.5, min_samples=5, plot=True):
+    def dbscan_cluster(self, features, eps=0.5, min_samples=5, plot=True, mode="exact", sample_size=None):
         """
         Perform DBSCAN clustering on the selected features.
 
@@ -105,6 +695,10 @@ class Segmentation:
             The number of samples (or total weight) in a neighborhood for a point to be considered as a core point.
         plot : bool, optional (default=True)
             If True, automatically plots the clusters using the most relevant features (highest variance).
+        mode : str, optional (default="exact")
+            "exact", "indexed", "sampled" or "auto", see fit_dbscan.
+        sample_size : int, optional
+            Rows clustered directly in "sampled" mode (default DBSCAN_SAMPLE_SIZE).
 
         Returns:
         --------
@@ -117,19 +711,20 @@ class Segmentation:
         - This method automatically selects the most relevant features for visualization based on variance, and creates a 2D or 3D scatter plot of the clusters.
         - Cluster label -1 indicates noise points (outliers) detected by DBSCAN.
         """
-        X = self.df[features].values
-        dbscan = DBSCAN(eps=eps, min_samples=min_samples)
-        cluster_labels = dbscan.fit_predict(X)
-
-        df_with_clusters = self.df.copy()
-        df_with_clusters['Cluster'] = cluster_labels
+        result = self.fit_dbscan(features, eps=eps, min_samples=min_samples,
+                                 mode=mode, sample_size=sample_size)
 
-        # Automatically select most relevant features (highest variance)
-        variances = X.var(axis=0)
-        feature_variance = list(zip(features, variances))
-        feature_variance.sort(key=lambda x: x[1], reverse=True)
+        df_with_clusters = self.df.assign(Cluster=result.labels)
 
         if plot:
+            # Automatically select most relevant features (highest variance)
+            variances = self.df[result.features].values.var(axis=0)
+            feature_variance = list(zip(result.features, variances))
+            feature_variance.sort(key=lambda x: x[1], reverse=True)
+
+            # interactive windows (scripts and notebooks); the API renders through plotting.py
+            import matplotlib.pyplot as plt
+            import seaborn as sns  # data viz library
             if len(features) >= 3:
                 top3 = [fv[0] for fv in feature_variance[:3]]
                 fig = plt.figure(figsize=(10, 7))
@@ -163,33 +758,39 @@ class Segmentation:
 
         return df_with_clusters
 
-    def plot_feature_boxplot_by_cluster(self, features, n_clusters, feature_to_plot, standardization_params=None):
-        """
-        Generate a boxplot of a selected feature grouped by cluster.
-        """
-        
-        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-        cluster_labels = kmeans.fit_predict(self.df[features])
-        df_with_clusters = self.df.copy()
-        df_with_clusters['Cluster'] = cluster_labels + 1  # 1-based for user
-        
+    def _boxplot_frame(self, features, n_clusters, feature_to_plot, standardization_params, engine):
+        """'Cluster' (1-based) and the de-standardized feature_to_plot: all a boxplot needs."""
+        result = self.fit_kmeans(features, n_clusters=n_clusters, engine=engine)
+        df_with_clusters = self.df[[feature_to_plot]].assign(Cluster=result.labels + 1)  # 1-based for user
 
         if standardization_params is not None and feature_to_plot in standardization_params:
             std = standardization_params[feature_to_plot]["std"]
             mean = standardization_params[feature_to_plot]["mean"]
             df_with_clusters[feature_to_plot] = df_with_clusters[feature_to_plot] * std + mean
-        
-        # Create boxplot
-        buf = io.BytesIO()
-        plt.figure(figsize=(8, 5))
-        sns.boxplot(x='Cluster', y=feature_to_plot,
-                    data=df_with_clusters, palette='Set2')
-        plt.title(f"{feature_to_plot} Distribution by Cluster")
-        plt.xlabel("Cluster")
-        plt.ylabel(feature_to_plot)
-        plt.tight_layout()
-        plt.savefig(buf, format='png')
-        plt.close()
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        return img_base64
+        return df_with_clusters
+
+    def plot_feature_boxplot_by_cluster(self, features, n_clusters, feature_to_plot, standardization_params=None,
+                                        engine="exact", fmt=None, method="auto"):
+        """
+        Generate a boxplot of a selected feature grouped by cluster.
+        Returns a base64 PNG, or the raw image bytes when fmt ("png", "svg", "webp") is given.
+        The chart is drawn from feature_boxplot_stats, so rendering does not depend on the row count.
+        """
+        stats = self.feature_boxplot_stats(features, n_clusters, feature_to_plot, standardization_params,
+                                           engine=engine, method=method)
+        with timed("render"):
+            image = run_in_pool(cluster_boxplot, stats, feature_to_plot, fmt or 'png')
+        return image if fmt else base64.b64encode(image).decode('utf-8')
+
+    def feature_boxplot_stats(self, features, n_clusters, feature_to_plot, standardization_params=None,
+                              engine="exact", method="auto", max_outliers=MAX_BOXPLOT_OUTLIERS):
+        """
+        Per-cluster quartiles, whiskers and a capped outlier sample of feature_to_plot (de-standardized),
+        clusters numbered from 1. method: "exact", "sketch" or "auto" (see quantiles.boxplot_stats).
+        """
+        if method not in BOXPLOT_METHODS:
+            raise ValueError(f"Unknown boxplot method '{method}', expected one of {', '.join(BOXPLOT_METHODS)}")
+        df_plot = self._boxplot_frame(features, n_clusters, feature_to_plot, standardization_params, engine)
+        with timed("aggregate"):
+            return run_in_pool(boxplot_stats, df_plot['Cluster'].to_numpy(), df_plot[feature_to_plot].to_numpy(),
+                               1.5, max_outliers, method)
@@ -0,0 +1,142 @@
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+'''
+Opt-in startup profiler for the API process.
+
+With STARTUP_PROFILE=1 every import that loads new modules is timed (self time, i.e.
+excluding the nested imports it triggers, and cumulative time), and the API records its
+initialization stages (module import, process pool start, artifact loading, ...). Once
+startup finishes, report() prints the stages, the most expensive packages and the
+slowest imports to stderr, and warns when the total exceeds STARTUP_BUDGET_SECONDS;
+uninstall() then restores the original __import__.
+Without the flag nothing is hooked and stage() costs nothing.
+
+This module must be imported before anything heavy, so the profiler sees those imports.
+
+Environment:
+STARTUP_PROFILE         1 to enable (default off)
+STARTUP_BUDGET_SECONDS  boot-time budget to check the total against (default: none)
+'''
+
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE", "").lower() not in ("", "0", "false", "no")
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", 0)) or None
+
+
+class StartupProfiler:
+
+    def __init__(self, enabled=STARTUP_PROFILE, budget_seconds=STARTUP_BUDGET_SECONDS):
+        self.enabled = enabled
+        self.budget_seconds = budget_seconds
+        self.started = time.perf_counter()
+        self.stages = []  # (name, seconds), in order
+        self.imports = {}  # module -> [self seconds, cumulative seconds]
+        self._last_mark = self.started
+        self._original_import = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if enabled:
+            self.install()
+
+    # ---------------------- Import Timing ---------------------- #
+
+    def install(self):
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # most import statements find their module in sys.modules: only time the ones that load something
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        n_modules = len(sys.modules)
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if len(sys.modules) > n_modules:
+                if level:  # relative import: name it like the module it resolves to
+                    package = (globals or {}).get('__package__') or ''
+                    base = package.rsplit('.', level - 1)[0] if level > 1 else package
+                    name = f"{base}.{name}" if name else base
+                with self._lock:
+                    entry = self.imports.setdefault(name, [0.0, 0.0])
+                    entry[0] += elapsed - nested
+                    entry[1] += elapsed
+
+    # ---------------------- Stages ---------------------- #
+
+    def mark(self, name):
+        """Record the time since the previous mark (or since this module was imported) as a stage."""
+        now = time.perf_counter()
+        if self.enabled:
+            self.stages.append((name, now - self._last_mark))
+        self._last_mark = now
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+            self._last_mark = time.perf_counter()
+
+    # ---------------------- Report ---------------------- #
+
+    def summary(self, top=15):
+        with self._lock:
+            imports = {name: tuple(times) for name, times in self.imports.items()}
+        packages = {}
+        for name, (self_seconds, _) in imports.items():
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0.0) + self_seconds
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "budget_seconds": self.budget_seconds,
+            "stages": [{"stage": name, "seconds": seconds} for name, seconds in self.stages],
+            "packages": [{"package": package, "seconds": seconds} for package, seconds in
+                         sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]],
+            "imports": [{"module": name, "self_seconds": times[0], "cumulative_seconds": times[1]}
+                        for name, times in sorted(imports.items(), key=lambda item: item[1][1], reverse=True)[:top]],
+        }
+
+    def report(self, top=15, file=None):
+        """Print the startup summary (see summary()) if profiling is enabled; returns it or None."""
+        if not self.enabled:
+            return None
+        file = file or sys.stderr
+        summary = self.summary(top)
+        print(f"startup: {summary['total_seconds']:.3f}s since the profiler was imported", file=file)
+        for stage in summary["stages"]:
+            print(f"  stage   {stage['seconds']:8.3f}s  {stage['stage']}", file=file)
+        for package in summary["packages"]:
+            print(f"  package {package['seconds']:8.3f}s  {package['package']}", file=file)
+        for module in summary["imports"]:
+            print(f"  import  {module['cumulative_seconds']:8.3f}s  {module['module']}"
+                  f" (self {module['self_seconds']:.3f}s)", file=file)
+        if self.budget_seconds and summary["total_seconds"] > self.budget_seconds:
+            print(f"startup: WARNING {summary['total_seconds']:.3f}s exceeds the budget of "
+                  f"{self.budget_seconds:.3f}s", file=file)
+        return summary
+
+
+profiler = StartupProfiler()
@@ -0,0 +1,256 @@
+import os
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from dataset import STANDARDIZED_COLUMNS, merge_moments, params_from_moments
+from encoding import CATEGORICAL_COLUMNS, FeatureEncoder
+
+'''
+Out-of-core training for datasets that do not fit in RAM.
+
+The CSV is read in chunks, so peak memory is bounded by the chunk size instead of the row count:
+1. scan_csv: one pass collecting what the in-memory pipeline derives from the whole frame
+   (standardization means/stds, the 'Satisfaction Level' mode, the dummy column layout).
+2. iter_split_chunks: encodes each chunk with a FeatureEncoder and splits it 80/20
+   into train/holdout rows with a seeded, per-chunk random mask.
+3. Linear regression accumulates the normal equations (X'X, X'y); XGBoost reads the chunks
+   through its external-memory iterator (ExtMemQuantileDMatrix).
+4. evaluate_holdout: a final pass computing holdout metrics, keeping a small holdout sample for plots.
+'''
+
+ID_COLUMN = "Customer ID"
+TARGET_COLUMN = "Total Spend"
+DEFAULT_CHUNKSIZE = 100_000
+MAX_HOLDOUT_SAMPLE = 5000  # holdout rows kept in memory for residual plots
+
+# sufficient_stats: the normal-equation sums of a linear fit (None for XGBoost)
+StreamingFit = namedtuple(
+    "StreamingFit", ["model", "feature_columns", "standardization_params", "metrics",
+                     "X_sample", "y_sample", "y_pred_sample", "sufficient_stats"])
+
+
+# ---------------------- Pass 1: Dataset Statistics ---------------------- #
+
+
+class StreamStats:
+    """Whole-dataset statistics accumulated one chunk at a time."""
+
+    def __init__(self):
+        self.n_rows = 0
+        self.columns = None
+        self.categories = {col: set() for col in CATEGORICAL_COLUMNS}
+        self.satisfaction_counts = {}
+        self._moments = {col: (0, 0.0, 0.0) for col in STANDARDIZED_COLUMNS}  # (count, mean, M2)
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        self.n_rows += len(chunk)
+
+        for col in CATEGORICAL_COLUMNS:
+            self.categories[col].update(chunk[col].dropna().unique().tolist())
+        for value, count in chunk["Satisfaction Level"].value_counts().items():
+            self.satisfaction_counts[value] = self.satisfaction_counts.get(value, 0) + int(count)
+
+        for col in STANDARDIZED_COLUMNS:
+            self._moments[col] = merge_moments(self._moments[col], chunk[col])
+
+    @property
+    def standardization_params(self):
+        """Same as the in-memory params: mean and sample std (ddof=1)."""
+        return params_from_moments(self._moments)
+
+    @property
+    def satisfaction_mode(self):
+        """Most frequent 'Satisfaction Level' (ties broken like Series.mode: smallest value)."""
+        top = max(self.satisfaction_counts.values())
+        return min(value for value, count in self.satisfaction_counts.items() if count == top)
+
+    @property
+    def feature_columns(self):
+        """Model input layout, in the order pd.get_dummies produces on the full frame."""
+        plain = [col for col in self.columns
+                 if col not in CATEGORICAL_COLUMNS and col not in (ID_COLUMN, TARGET_COLUMN)]
+        dummies = [f"{col}_{value}" for col in CATEGORICAL_COLUMNS
+                   for value in sorted(self.categories[col])]
+        return plain + dummies
+
+
+def scan_csv(csv_path, chunksize=DEFAULT_CHUNKSIZE):
+    stats = StreamStats()
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        stats.update(chunk)
+    return stats
+
+
+# ---------------------- Pass 2+: Encoded Chunks ---------------------- #
+
+
+def iter_split_chunks(csv_path, stats, chunksize=DEFAULT_CHUNKSIZE, test_size=0.2, random_state=42):
+    """
+    Yield (X, y, holdout_mask) per chunk: X is the encoded, standardized float matrix in
+    stats.feature_columns order. The mask only depends on random_state and the chunk
+    position, so every pass over the file sees the same split.
+    """
+    encoder = FeatureEncoder(stats.feature_columns)
+    params = stats.standardization_params
+    standardize = [(encoder.numeric_index[col], params[col]["mean"], params[col]["std"])
+                   for col in STANDARDIZED_COLUMNS]
+    satisfaction_mode = stats.satisfaction_mode
+
+    for chunk_index, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize)):
+        chunk["Satisfaction Level"] = chunk["Satisfaction Level"].fillna(satisfaction_mode)
+        X = encoder.encode_batch(chunk)
+        for position, mean, std in standardize:
+            X[:, position] = (X[:, position] - mean) / std
+        y = chunk[TARGET_COLUMN].to_numpy(dtype=np.float64)
+        rng = np.random.default_rng([random_state, chunk_index])
+        yield X, y, rng.random(len(y)) < test_size
+
+
+def evaluate_holdout(predict, csv_path, stats, chunksize=DEFAULT_CHUNKSIZE, test_size=0.2, random_state=42):
+    """
+    Holdout r2 / mae / rmse accumulated over all chunks, plus the first MAX_HOLDOUT_SAMPLE
+    holdout rows (X, y, predictions) for residual plots.
+    """
+    n, sum_y, sum_y2, sse, sae = 0, 0.0, 0.0, 0.0, 0.0
+    sample_X, sample_y, sample_pred = [], [], []
+    kept = 0
+    for X, y, holdout in iter_split_chunks(csv_path, stats, chunksize, test_size, random_state):
+        X_test, y_test = X[holdout], y[holdout]
+        if len(y_test) == 0:
+            continue
+        y_pred = predict(X_test)
+        errors = y_test - y_pred
+        n += len(y_test)
+        sum_y += y_test.sum()
+        sum_y2 += (y_test ** 2).sum()
+        sse += (errors ** 2).sum()
+        sae += np.abs(errors).sum()
+        if kept < MAX_HOLDOUT_SAMPLE:
+            take = MAX_HOLDOUT_SAMPLE - kept
+            sample_X.append(X_test[:take])
+            sample_y.append(y_test[:take])
+            sample_pred.append(y_pred[:take])
+            kept += len(sample_y[-1])
+
+    sst = sum_y2 - sum_y * sum_y / n
+    metrics = {"r2": float(1 - sse / sst), "mae": float(sae / n), "rmse": float(np.sqrt(sse / n))}
+    return metrics, np.vstack(sample_X), np.concatenate(sample_y), np.concatenate(sample_pred)
+
+
+def _fit_result(model, stats, metrics_and_sample, sufficient_stats=None):
+    metrics, X_sample, y_sample, y_pred_sample = metrics_and_sample
+    feature_columns = stats.feature_columns
+    return StreamingFit(
+        model=model,
+        feature_columns=feature_columns,
+        standardization_params=stats.standardization_params,
+        metrics=metrics,
+        X_sample=pd.DataFrame(X_sample, columns=feature_columns),
+        y_sample=pd.Series(y_sample, name=TARGET_COLUMN),
+        y_pred_sample=y_pred_sample,
+        sufficient_stats=sufficient_stats,
+    )
+
+
+# ---------------------- Linear Regression ---------------------- #
+
+# sums over the training rows that determine a least-squares fit (see linear_model_from_sufficient_stats)
+SufficientStats = namedtuple("SufficientStats", ["n", "sum_x", "sum_y", "xtx", "xty"])
+
+
+def sufficient_stats(X, y, previous=None):
+    """Normal-equation sums of the rows (X, y), added to previous ones when given."""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    stats = SufficientStats(len(y), X.sum(axis=0), float(y.sum()), X.T @ X, X.T @ y)
+    if previous is None:
+        return stats
+    return SufficientStats(*(a + b for a, b in zip(previous, stats)))
+
+
+def linear_model_from_sufficient_stats(n, sum_x, sum_y, xtx, xty, feature_columns):
+    """
+    sklearn LinearRegression from accumulated sums: centers the normal equations and takes
+    the minimum-norm least-squares solution, as LinearRegression.fit does on the full matrix.
+    """
+    from sklearn.linear_model import LinearRegression
+
+    mean_x = sum_x / n
+    mean_y = sum_y / n
+    xtx_centered = xtx - n * np.outer(mean_x, mean_x)
+    xty_centered = xty - n * mean_x * mean_y
+    coef = np.linalg.lstsq(xtx_centered, xty_centered, rcond=None)[0]
+
+    model = LinearRegression()
+    model.coef_ = coef
+    model.intercept_ = float(mean_y - mean_x @ coef)
+    model.n_features_in_ = len(feature_columns)
+    model.feature_names_in_ = np.asarray(feature_columns, dtype=object)
+    return model
+
+
+def fit_linear_regression_streaming(csv_path, chunksize=DEFAULT_CHUNKSIZE, test_size=0.2, random_state=42):
+    stats = scan_csv(csv_path, chunksize)
+    sums = None
+    for X, y, holdout in iter_split_chunks(csv_path, stats, chunksize, test_size, random_state):
+        sums = sufficient_stats(X[~holdout], y[~holdout], sums)
+
+    model = linear_model_from_sufficient_stats(*sums, stats.feature_columns)
+    # predict on the raw matrix: the intercept/coef math is all that is needed here
+    holdout = evaluate_holdout(lambda X: X @ model.coef_ + model.intercept_,
+                               csv_path, stats, chunksize, test_size, random_state)
+    return _fit_result(model, stats, holdout, sums)
+
+
+# ---------------------- XGBoost ---------------------- #
+
+
+def fit_xgboost_streaming(csv_path, n_estimators=100, learning_rate=0.1, max_depth=4, random_state=42,
+                          chunksize=DEFAULT_CHUNKSIZE, test_size=0.2):
+    import xgboost
+    from xgboost import XGBRegressor
+
+    class TrainingChunks(xgboost.DataIter):
+        """Feeds the training rows of each chunk to XGBoost's external-memory DMatrix."""
+
+        def __init__(self, cache_prefix):
+            self._chunks = None
+            super().__init__(cache_prefix=cache_prefix)
+
+        def reset(self):
+            self._chunks = None
+
+        def next(self, input_data):
+            if self._chunks is None:
+                self._chunks = iter_split_chunks(csv_path, stats, chunksize, test_size, random_state)
+            for X, y, holdout in self._chunks:
+                if (~holdout).any():
+                    input_data(data=X[~holdout], label=y[~holdout],
+                               feature_names=stats.feature_columns)
+                    return True
+            return False
+
+    stats = scan_csv(csv_path, chunksize)
+    params = {
+        "objective": "reg:squarederror",
+        "tree_method": "hist",
+        "learning_rate": learning_rate,
+        "max_depth": max_depth,
+        "seed": random_state,
+    }
+    with tempfile.TemporaryDirectory() as cache_dir:
+        dtrain = xgboost.ExtMemQuantileDMatrix(
+            TrainingChunks(os.path.join(cache_dir, "xgb")))
+        booster = xgboost.train(params, dtrain, num_boost_round=n_estimators)
+        del dtrain  # release the external-memory pages before their directory is removed
+
+    model = XGBRegressor(n_estimators=n_estimators, learning_rate=learning_rate,
+                         max_depth=max_depth, random_state=random_state)
+    model.load_model(bytearray(booster.save_raw(raw_format="ubj")))
+    holdout = evaluate_holdout(lambda X: booster.inplace_predict(X),
+                               csv_path, stats, chunksize, test_size, random_state)
+    return _fit_result(model, stats, holdout)
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+'''
+Synthetic customers with the schema of e-com_customer_behavior.csv, for benchmarks and
+load tests at sizes the bundled CSV does not reach (10k to 10M+ rows).
+
+Rows are drawn per membership tier with the tier-level ranges and shares of the real
+data (Gold customers buy more, spend more per item, rate higher and return sooner), so
+models and clusterings see data of the same shape. Generation is vectorized and
+chunked: write_csv produces 10M rows in bounded memory. The same (n_rows, seed) always
+gives the same rows.
+'''
+
+CSV_COLUMNS = [
+    "Customer ID", "Gender", "Age", "City", "Membership Type", "Total Spend", "Items Purchased",
+    "Average Rating", "Discount Applied", "Days Since Last Purchase", "Satisfaction Level",
+]
+
+CITIES = [
+    "Atlanta", "Austin", "Boston", "Chicago", "Dallas", "Denver", "Houston", "Las Vegas",
+    "Los Angeles", "Miami", "New York", "Orlando", "Philadelphia", "Phoenix", "Portland",
+    "San Diego", "San Francisco", "Seattle",
+]
+
+SATISFACTION_LEVELS = ["Neutral", "Satisfied", "Unsatisfied"]
+
+# tier -> share of customers, items purchased range, price per item (mean, std),
+# rating (mean, std, min), days since last purchase range, discount rate, satisfaction shares
+MEMBERSHIP_PROFILES = {
+    "Bronze": {"share": 0.345, "items": (7, 12), "price": (49.0, 4.0), "rating": (3.3, 0.3, 2.3),
+               "days": (18, 80), "discount": 0.80, "satisfaction": (0.34, 0.05, 0.61)},
+    "Silver": {"share": 0.325, "items": (10, 15), "price": (60.0, 4.5), "rating": (4.1, 0.29, 3.5),
+               "days": (12, 65), "discount": 0.71, "satisfaction": (0.59, 0.30, 0.11)},
+    "Gold": {"share": 0.330, "items": (14, 21), "price": (77.0, 5.5), "rating": (4.7, 0.19, 4.0),
+             "days": (8, 35), "discount": 0.49, "satisfaction": (0.10, 0.85, 0.05)},
+}
+
+AGE_RANGE = (26, 45)
+MISSING_SATISFACTION_RATE = 0.002  # the real data has a few missing levels, imputed by clean_data
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def generate_customers(n_rows, seed=0, start_id=1):
+    """n_rows synthetic customers as a DataFrame with the CSV's columns (ids from start_id)."""
+    rng = np.random.default_rng([seed, start_id])
+    tiers = list(MEMBERSHIP_PROFILES)
+    shares = np.array([MEMBERSHIP_PROFILES[tier]["share"] for tier in tiers])
+    tier_codes = rng.choice(len(tiers), size=n_rows, p=shares / shares.sum())
+
+    items = np.empty(n_rows, dtype=np.int64)
+    spend = np.empty(n_rows)
+    rating = np.empty(n_rows)
+    days = np.empty(n_rows, dtype=np.int64)
+    discount = np.empty(n_rows, dtype=bool)
+    satisfaction = np.empty(n_rows, dtype=object)
+    for code, tier in enumerate(tiers):
+        profile = MEMBERSHIP_PROFILES[tier]
+        rows = np.flatnonzero(tier_codes == code)
+        n = len(rows)
+        items[rows] = rng.integers(profile["items"][0], profile["items"][1] + 1, size=n)
+        spend[rows] = items[rows] * rng.normal(*profile["price"], size=n)
+        mean, std, low = profile["rating"]
+        rating[rows] = np.clip(rng.normal(mean, std, size=n), low, 5.0)
+        days[rows] = rng.integers(profile["days"][0], profile["days"][1] + 1, size=n)
+        discount[rows] = rng.random(n) < profile["discount"]
+        satisfaction[rows] = np.array(SATISFACTION_LEVELS, dtype=object)[
+            rng.choice(len(SATISFACTION_LEVELS), size=n, p=profile["satisfaction"])]
+    satisfaction[rng.random(n_rows) < MISSING_SATISFACTION_RATE] = np.nan
+
+    return pd.DataFrame({
+        "Customer ID": np.arange(start_id, start_id + n_rows),
+        "Gender": np.where(rng.random(n_rows) < 0.5, "Male", "Female"),
+        "Age": rng.integers(AGE_RANGE[0], AGE_RANGE[1] + 1, size=n_rows),
+        "City": np.array(CITIES)[rng.integers(len(CITIES), size=n_rows)],
+        "Membership Type": np.array(tiers)[tier_codes],
+        "Total Spend": spend.round(2),
+        "Items Purchased": items,
+        "Average Rating": rating.round(1),
+        "Discount Applied": discount,
+        "Days Since Last Purchase": days,
+        "Satisfaction Level": satisfaction,
+    }, columns=CSV_COLUMNS)
+
+
+def write_csv(path, n_rows, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """Write n_rows synthetic customers to a CSV like the bundled one, chunk by chunk. Returns path."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", newline="") as file:
+        for start in range(0, n_rows, chunksize):
+            chunk = generate_customers(min(chunksize, n_rows - start), seed=seed, start_id=start + 1)
+            # the bundled CSV spells booleans in upper case
+            chunk["Discount Applied"] = np.where(chunk["Discount Applied"], "TRUE", "FALSE")
+            chunk.to_csv(file, header=start == 0, index=False)
+    return path
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# the backend modules use flat imports (see train.py); keep the work in this process and off disk
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CPU_WORKERS", "0")
+os.environ.setdefault("MODEL_ARTIFACT_DIR", "")
+os.environ.setdefault("METRICS_ENABLED", "0")
+
+
+@pytest.fixture
+def customers_csv(tmp_path):
+    """A small synthetic CSV with the bundled dataset's schema (see synthetic.py)."""
+    from synthetic import write_csv
+
+    return write_csv(str(tmp_path / "customers.csv"), 2000, seed=7)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import segmentation
+from segmentation import summarize_clusters
+from synthetic import generate_customers
+
+FEATURES = ["Age", "Items Purchased", "Average Rating"]
+
+
+@pytest.fixture
+def standardized():
+    """Synthetic customers with standardized numeric columns (like encoded_df) and raw categories."""
+    df = generate_customers(1500, seed=5)
+    df["Discount Applied"] = df["Discount Applied"].astype(int)
+    params = {}
+    for col in FEATURES + ["Days Since Last Purchase"]:
+        params[col] = {"mean": float(df[col].mean()), "std": float(df[col].std())}
+        df[col] = (df[col] - params[col]["mean"]) / params[col]["std"]
+    return df, params
+
+
+def reference_cluster_stats(df_clusters, standardization_params):
+    """The per-cluster loop summarize_clusters replaced (formerly in api.py)."""
+    stats = {}
+    for cluster in df_clusters['Cluster'].unique():
+        cluster_df = df_clusters[df_clusters['Cluster'] == cluster]
+        numeric_averages = {}
+        for stat_name, col_name in segmentation.CLUSTER_NUMERIC_STATS:
+            if col_name in cluster_df.columns:
+                value = cluster_df[col_name].mean()
+                if col_name in ["Age", "Items Purchased", "Average Rating", "Days Since Last Purchase"]:
+                    std = standardization_params[col_name]["std"]
+                    mean = standardization_params[col_name]["mean"]
+                    value = (value * std) + mean
+                numeric_averages[stat_name] = value
+            else:
+                numeric_averages[stat_name] = 0
+        stats[int(cluster)] = {
+            'size': len(cluster_df),
+            **numeric_averages,
+            'pct_discount_applied': cluster_df['Discount Applied'].mean() * 100,
+            **{stat_name: cluster_df[col_name].value_counts(normalize=True).to_dict()
+               if col_name in cluster_df.columns else {}
+               for stat_name, col_name in segmentation.CLUSTER_DISTRIBUTIONS}
+        }
+    return stats
+
+
+def assert_stats_equal(stats, expected):
+    assert list(stats) == list(expected)
+    for cluster, values in expected.items():
+        assert list(stats[cluster]) == list(values)
+        for name, value in values.items():
+            if isinstance(value, dict):
+                assert list(stats[cluster][name]) == list(value), name  # most frequent first
+                assert stats[cluster][name] == pytest.approx(value), name
+            else:
+                assert stats[cluster][name] == pytest.approx(value), name
+
+
+def test_summarize_clusters_matches_the_per_cluster_loop(standardized):
+    df, params = standardized
+    rng = np.random.default_rng(2)
+    df_clusters = df.assign(Cluster=rng.choice([2, 0, -1, 1], size=len(df), p=[0.4, 0.3, 0.1, 0.2]))
+    df_clusters.loc[df_clusters.index[::40], "Satisfaction Level"] = np.nan
+
+    assert_stats_equal(summarize_clusters(df_clusters, params), reference_cluster_stats(df_clusters, params))
+
+
+def test_summarize_clusters_without_category_columns(standardized):
+    df, params = standardized
+    df_clusters = df.drop(columns=["Gender", "Membership Type", "Satisfaction Level", "Total Spend"])
+    df_clusters["Cluster"] = np.arange(len(df)) % 3
+
+    assert_stats_equal(summarize_clusters(df_clusters, params), reference_cluster_stats(df_clusters, params))
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset import STANDARDIZED_COLUMNS, CustomerDataset, merge_moments, params_from_moments
+from synthetic import generate_customers
+
+
+def test_merged_moments_match_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.normal(loc=40, scale=7, size=10_000)
+    values[::53] = np.nan
+
+    moments = (0, 0.0, 0.0)
+    for chunk in np.array_split(values, [1, 2, 500, 4000, 9999]):
+        moments = merge_moments(moments, chunk)
+    n, mean, m2 = moments
+    present = values[~np.isnan(values)]
+
+    assert n == len(present)
+    assert mean == pytest.approx(present.mean(), rel=1e-12)
+    assert params_from_moments({"x": moments})["x"]["std"] == pytest.approx(present.std(ddof=1), rel=1e-12)
+
+
+def test_merging_nothing_keeps_the_moments():
+    moments = merge_moments((0, 0.0, 0.0), [1.0, 2.0, 4.0])
+    assert merge_moments(moments, [np.nan]) == moments
+    assert merge_moments(moments, []) == moments
+
+
+def test_append_matches_a_fresh_load(customers_csv):
+    dataset = CustomerDataset(customers_csv)
+    dataset.encoded_df  # load before appending, as the API does
+    records = generate_customers(60, seed=11, start_id=5000).dropna(subset=["Satisfaction Level"])
+    dataset.append(records[:25].drop(columns=["Customer ID"]))
+    appended = dataset.append(records[25:].drop(columns=["Customer ID"]))
+    assert appended.first_index == 2025
+    assert appended.rows["Customer ID"].iloc[0] == dataset.clean_df["Customer ID"].iloc[2024] + 1
+
+    fresh = CustomerDataset(customers_csv)
+    assert appended.fingerprint == dataset.fingerprint == fresh.fingerprint
+    assert dataset.n_rows == len(dataset.encoded_df) == len(fresh.encoded_df) == 2000 + len(records)
+    for col in STANDARDIZED_COLUMNS:
+        assert dataset.standardization_params[col]["mean"] == pytest.approx(
+            fresh.standardization_params[col]["mean"], rel=1e-12)
+        assert dataset.standardization_params[col]["std"] == pytest.approx(
+            fresh.standardization_params[col]["std"], rel=1e-12)
+
+    appended_df = dataset.encoded_df.reset_index(drop=True)
+    fresh_df = fresh.encoded_df.reset_index(drop=True)
+    assert list(appended_df.columns) == list(fresh_df.columns)
+    pd.testing.assert_frame_equal(appended_df, fresh_df, check_dtype=False, rtol=1e-9)
+    np.testing.assert_allclose(dataset.feature_matrix.values, fresh.feature_matrix.values, rtol=1e-6)
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+
+from encoding import CATEGORICAL_COLUMNS, INPUT_RENAME_MAP, FeatureEncoder
+from synthetic import generate_customers
+
+FEATURE_COLUMNS = [
+    "Age", "Items Purchased", "Average Rating", "Discount Applied", "Days Since Last Purchase",
+    "Gender_Female", "Gender_Male", "City_Denver", "City_Miami", "City_Seattle",
+    "Membership Type_Bronze", "Membership Type_Gold", "Membership Type_Silver",
+    "Satisfaction Level_Neutral", "Satisfaction Level_Satisfied", "Satisfaction Level_Unsatisfied",
+]
+
+
+def reference_encoding(records):
+    """The encoding FeatureEncoder replaces: pd.get_dummies, then reindex to the training layout."""
+    df = records.rename(columns=INPUT_RENAME_MAP)
+    present = [col for col in CATEGORICAL_COLUMNS if col in df.columns]
+    encoded = pd.get_dummies(df, columns=present).reindex(columns=FEATURE_COLUMNS, fill_value=0)
+    return encoded.to_numpy(dtype=np.float64)
+
+
+def test_encode_batch_matches_get_dummies():
+    records = generate_customers(500, seed=3).drop(columns=["Customer ID", "Total Spend"])
+    records = records.dropna(subset=["Satisfaction Level"])  # get_dummies drops NaN, the encoder too
+    encoder = FeatureEncoder(FEATURE_COLUMNS)
+
+    # most cities are not in the layout: unknown categories encode as all zeros
+    np.testing.assert_array_equal(encoder.encode_batch(records), reference_encoding(records))
+
+
+def test_encode_one_matches_get_dummies_with_api_names_and_missing_fields():
+    record = {"Gender": "Male", "Age": 27, "City": "Paris", "Membership_Type": "Gold",
+              "Items_Purchased": 14, "Discount_Applied": True, "Days_Since_Last_Purchase": 9}
+    encoder = FeatureEncoder(FEATURE_COLUMNS)
+
+    expected = reference_encoding(pd.DataFrame([record]))
+    np.testing.assert_array_equal(encoder.encode_one(record), expected)
+    np.testing.assert_array_equal(encoder.encode_batch(pd.DataFrame([record])), expected)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from quantiles import KLLSketch, boxplot_stats
+
+
+def rank_error(values, estimate, q):
+    """How far (as a fraction of n) the estimate's rank is from the q-quantile's rank."""
+    ordered = np.sort(values)
+    low = np.searchsorted(ordered, estimate, side="left")
+    high = np.searchsorted(ordered, estimate, side="right")
+    target = q * len(values)
+    return 0.0 if low <= target <= high else min(abs(low - target), abs(high - target)) / len(values)
+
+
+@pytest.mark.parametrize("distribution", ["normal", "lognormal", "integers"])
+def test_kll_quartiles_within_rank_error(distribution):
+    rng = np.random.default_rng(0)
+    values = {
+        "normal": lambda: rng.normal(size=200_000),
+        "lognormal": lambda: rng.lognormal(sigma=2.0, size=200_000),
+        "integers": lambda: rng.integers(0, 50, size=200_000).astype(float),
+    }[distribution]()
+    sketch = KLLSketch(k=200)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+
+    assert sketch.n == len(values)
+    for q, estimate in zip([0.25, 0.5, 0.75], sketch.quantile([0.25, 0.5, 0.75])):
+        assert rank_error(values, estimate, q) < 0.02  # about 1/k, with margin
+    assert sketch.quantile([0.0, 1.0]).tolist() == [values.min(), values.max()]
+
+
+def test_merged_sketches_stay_within_rank_error():
+    rng = np.random.default_rng(1)
+    parts = [rng.normal(loc=i, size=30_000) for i in range(4)]
+    merged = KLLSketch(random_state=0).update(parts[0])
+    for i, part in enumerate(parts[1:], start=1):
+        merged.merge(KLLSketch(random_state=i).update(part))
+
+    values = np.concatenate(parts)
+    for q, estimate in zip([0.25, 0.5, 0.75], merged.quantile([0.25, 0.5, 0.75])):
+        assert rank_error(values, estimate, q) < 0.02
+
+
+def test_exact_boxplot_stats_match_numpy():
+    rng = np.random.default_rng(2)
+    labels = rng.integers(0, 4, size=5000)
+    values = rng.standard_normal(5000) ** 3
+    values[::31] = np.nan
+
+    for stats in boxplot_stats(labels, values, method="exact"):
+        group = values[(labels == stats["cluster"]) & ~np.isnan(values)]
+        q1, median, q3 = np.percentile(group, [25, 50, 75])
+        assert (stats["q1"], stats["median"], stats["q3"]) == pytest.approx((q1, median, q3))
+        low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+        inside = group[(group >= low) & (group <= high)]
+        assert (stats["whisker_low"], stats["whisker_high"]) == (inside.min(), inside.max())
+        assert stats["n_outliers"] == len(group) - len(inside)
+        assert stats["count"] == len(group)
+
+
+def test_sketched_boxplot_quartiles_close_to_exact():
+    rng = np.random.default_rng(3)
+    labels = rng.integers(0, 5, size=300_000)
+    values = rng.lognormal(size=300_000)
+
+    exact = boxplot_stats(labels, values, method="exact")
+    sketched = boxplot_stats(labels, values, method="sketch", max_outliers=10)
+    for exact_stats, sketch_stats in zip(exact, sketched):
+        group = values[labels == exact_stats["cluster"]]
+        assert sketch_stats["count"] == exact_stats["count"]
+        for q, name in [(0.25, "q1"), (0.5, "median"), (0.75, "q3")]:
+            assert rank_error(group, sketch_stats[name], q) < 0.02
+        outliers = sketch_stats["outliers"]
+        assert len(outliers) == min(10, sketch_stats["n_outliers"])
+        assert outliers == sorted(outliers)
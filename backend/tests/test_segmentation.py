@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+import segmentation
+from segmentation import Segmentation, dbscan_labels, dbscan_labels_from_graph, radius_neighbors_graph
+from synthetic import generate_customers
+
+FEATURES = ["Age", "Items Purchased", "Average Rating"]
+
+
+@pytest.fixture
+def standardized():
+    """Synthetic customers with standardized numeric columns (like encoded_df) and raw categories."""
+    df = generate_customers(1500, seed=5)
+    df["Discount Applied"] = df["Discount Applied"].astype(int)
+    params = {}
+    for col in FEATURES + ["Days Since Last Purchase"]:
+        params[col] = {"mean": float(df[col].mean()), "std": float(df[col].std())}
+        df[col] = (df[col] - params[col]["mean"]) / params[col]["std"]
+    return df, params
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    segmentation.cluster_cache.clear()
+    segmentation.neighbor_graph_cache.clear()
+    yield
+    segmentation.cluster_cache.clear()
+    segmentation.neighbor_graph_cache.clear()
+
+
+@pytest.mark.parametrize("eps, min_samples", [(0.2, 4), (0.3, 8), (0.3, 12), (0.5, 10)])
+def test_graph_dbscan_matches_exact_dbscan(standardized, eps, min_samples):
+    X = standardized[0][FEATURES].to_numpy()
+    # one graph at the largest radius serves every smaller eps
+    graph = radius_neighbors_graph(X, 0.5)
+    np.testing.assert_array_equal(dbscan_labels_from_graph(graph, eps, min_samples),
+                                  dbscan_labels(X, eps, min_samples))
+
+
+@pytest.mark.parametrize("mode", ["indexed", "auto"])
+def test_fit_dbscan_modes_match_exact(standardized, mode):
+    seg = Segmentation(standardized[0], fingerprint="test")
+    exact = seg.fit_dbscan(FEATURES, eps=0.3, min_samples=8, mode="exact").labels
+    assert len(set(exact)) > 10
+    np.testing.assert_array_equal(seg.fit_dbscan(FEATURES, eps=0.3, min_samples=8, mode=mode).labels, exact)
+    # the cached graph (radius 0.3) answers a smaller eps too
+    np.testing.assert_array_equal(seg.fit_dbscan(FEATURES, eps=0.25, min_samples=5, mode=mode).labels,
+                                  seg.fit_dbscan(FEATURES, eps=0.25, min_samples=5, mode="exact").labels)
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
+
+from dataset import clean_data, encode_and_standardize
+from streaming import fit_linear_regression_streaming, linear_model_from_sufficient_stats, sufficient_stats
+
+
+def test_chunked_normal_equations_match_linear_regression():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 6))
+    X[:, 5] = rng.random(3000) < 0.3  # a one-hot like column
+    y = X @ rng.normal(size=6) + 4.0 + rng.normal(scale=0.1, size=3000)
+    columns = [f"x{i}" for i in range(6)]
+
+    sums = None
+    for start in range(0, len(y), 700):
+        sums = sufficient_stats(X[start:start + 700], y[start:start + 700], sums)
+    streamed = linear_model_from_sufficient_stats(*sums, columns)
+    expected = LinearRegression().fit(X, y)
+
+    np.testing.assert_allclose(streamed.coef_, expected.coef_, rtol=1e-8, atol=1e-10)
+    assert streamed.intercept_ == pytest.approx(expected.intercept_)
+
+
+def test_collinear_dummies_give_the_same_predictions():
+    # a full set of dummies is collinear with the intercept: both solvers take the minimum-norm solution
+    rng = np.random.default_rng(1)
+    groups = rng.integers(3, size=1000)
+    X = np.column_stack([rng.normal(size=1000), np.eye(3)[groups]])
+    y = 2.0 * X[:, 0] + np.array([1.0, 5.0, -2.0])[groups] + rng.normal(scale=0.1, size=1000)
+
+    streamed = linear_model_from_sufficient_stats(*sufficient_stats(X, y), ["a", "b", "c", "d"])
+    expected = LinearRegression().fit(X, y)
+
+    np.testing.assert_allclose(X @ streamed.coef_ + streamed.intercept_, expected.predict(X), atol=1e-8)
+
+
+def test_streaming_fit_of_a_csv_matches_an_in_memory_fit(customers_csv):
+    fit = fit_linear_regression_streaming(customers_csv, chunksize=300)
+
+    encoded, params = encode_and_standardize(clean_data(pd.read_csv(customers_csv)))
+    for col, values in params.items():
+        assert fit.standardization_params[col]["mean"] == pytest.approx(values["mean"])
+        assert fit.standardization_params[col]["std"] == pytest.approx(values["std"])
+
+    X = encoded[fit.feature_columns].to_numpy(dtype=np.float64)
+    y = encoded["Total Spend"].to_numpy(dtype=np.float64)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    in_memory = LinearRegression().fit(X_train, y_train)
+    rmse = np.sqrt(mean_squared_error(y_test, in_memory.predict(X_test)))
+
+    # a different 80/20 split of the same rows: the same relationship and error, not the same numbers
+    assert fit.sufficient_stats.n == pytest.approx(0.8 * len(y), rel=0.05)
+    assert np.corrcoef(X @ fit.model.coef_ + fit.model.intercept_, in_memory.predict(X))[0, 1] > 0.999
+    assert fit.metrics["rmse"] == pytest.approx(rmse, rel=0.15)
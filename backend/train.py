@@ -0,0 +1,106 @@
+import argparse
+import os
+import sys
+import time
+
+if __package__:
+    # `python -m backend.train` from the repository root: the backend modules use flat imports
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from artifacts import ArtifactStore, DEFAULT_ARTIFACT_DIR, IN_MEMORY, STREAMING
+from main import Main
+from registry import MODEL_SPECS, STREAMING_TRAINERS, ModelRegistry, model_class
+from training import TRAINING_CORES, format_result, train_parallel
+
+'''
+Build model artifacts ahead of time so API workers load them at boot instead of training.
+
+From the root of the repository:
+python -m backend.train
+python -m backend.train --models xgboost random-forest --force
+python -m backend.train --streaming --chunksize 200000   (out-of-core, see streaming.py)
+python -m backend.train --parallel --cores 8              (all models at once, see training.py)
+'''
+
+
+def train_streaming(model_name, csv_path, chunksize=None):
+    """Train one model out-of-core from the CSV, without loading the dataset into memory."""
+    model = model_class(model_name)(None)
+    getattr(model, STREAMING_TRAINERS[model_name])(csv_path, chunksize)
+    return model
+
+
+def build_artifacts(model_names=None, artifact_dir=DEFAULT_ARTIFACT_DIR, force=False,
+                    streaming=False, chunksize=None, parallel=False, cores=TRAINING_CORES):
+    """
+    Train and save every requested model that has no artifact yet. Returns {name: path}.
+    With parallel=True the models train concurrently within `cores` cores (see training.py).
+    Streaming artifacts have keys of their own: the API loads them with
+    MODEL_ARTIFACT_TRAINING=streaming.
+    """
+    main = Main()
+    fingerprint = main.fingerprint
+    store = ArtifactStore(artifact_dir)
+    training = STREAMING if streaming else IN_MEMORY
+    model_names = list(model_names or (STREAMING_TRAINERS if streaming else MODEL_SPECS))
+    pending = [name for name in model_names if force or not store.exists(name, {}, fingerprint, training)]
+    trained = train_parallel(main.feature_matrix, pending, cores) if parallel and pending else {}
+
+    paths = {}
+    for name in model_names:
+        path = store.path_for(name, {}, fingerprint, training)
+        if name not in pending:
+            print(f"{name}: up to date ({path})")
+        elif name in trained:
+            store.save(name, {}, fingerprint, trained[name].model,
+                       standardization_params=main.standardization_params)
+            print(f"{format_result(name, trained[name])} -> {path}")
+        else:
+            start = time.perf_counter()
+            if streaming:
+                model = train_streaming(name, main.dataset.csv_path, chunksize)
+                standardization_params = model.standardization_params
+            else:
+                # a registry without a store always trains; the artifact is written below
+                model = ModelRegistry().get(name, lambda: main.feature_matrix, fingerprint=fingerprint)
+                standardization_params = main.standardization_params
+            store.save(name, {}, fingerprint, model,
+                       standardization_params=standardization_params)
+            print(f"{name}: trained in {time.perf_counter() - start:.2f}s -> {path}")
+        paths[name] = path
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train models and write them to the artifact store.")
+    parser.add_argument("--models", nargs="+", choices=list(MODEL_SPECS),
+                        help="models to build (default: all)")
+    parser.add_argument("--artifact-dir",
+                        default=os.environ.get("MODEL_ARTIFACT_DIR") or DEFAULT_ARTIFACT_DIR,
+                        help="directory to write artifacts to")
+    parser.add_argument("--force", action="store_true",
+                        help="retrain even if an artifact already exists")
+    parser.add_argument("--streaming", action="store_true",
+                        help="train out-of-core from CSV chunks (linear-regression and xgboost only)")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="rows per chunk in --streaming mode")
+    parser.add_argument("--parallel", action="store_true",
+                        help="train all models at once, each with its own share of the cores")
+    parser.add_argument("--cores", type=int, default=TRAINING_CORES,
+                        help="cores a --parallel run may use (default: TRAINING_CORES or all)")
+    args = parser.parse_args(argv)
+    if args.parallel and args.streaming:
+        parser.error("--parallel and --streaming cannot be combined")
+    if args.cores < 1:
+        parser.error("--cores must be at least 1")
+    if args.streaming and args.models:
+        unsupported = [name for name in args.models if name not in STREAMING_TRAINERS]
+        if unsupported:
+            parser.error(f"no streaming mode for: {', '.join(unsupported)}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build_artifacts(args.models, args.artifact_dir, args.force, args.streaming, args.chunksize,
+                    args.parallel, args.cores)
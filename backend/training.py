@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from features import FeatureMatrix
+from registry import MODEL_SPECS, model_class
+from workers import WORKER_START_METHOD
+
+'''
+Parallel training of the registered models.
+
+train_parallel fits every model at the same time, each in its own process with an explicit
+core budget: its estimator gets that many threads (n_jobs / nthread) and threadpoolctl caps
+the BLAS and OpenMP pools in that process to the same number, so the budgets together never
+exceed the cores given. A full retrain then takes about as long as the slowest model.
+A FeatureMatrix is written once to temporary .npy files that every training process
+memory-maps, instead of being pickled into each of them (an encoded DataFrame still is).
+
+Environment:
+TRAINING_CORES  cores shared by a parallel training run (default: all)
+'''
+
+TRAINING_CORES = int(os.environ.get("TRAINING_CORES", 0)) or os.cpu_count() or 1
+
+# model name -> share of the spare cores, about its single-core fit time relative to the others.
+# These models take an n_jobs argument; the rest are single-threaded and get one core each.
+TRAINING_CORE_WEIGHTS = {
+    "random-forest": 4,
+    "xgboost": 1,
+}
+
+# n_jobs: the model's core budget; wall_seconds/cpu_seconds: its fit, cpu_seconds over all its threads
+TrainingResult = namedtuple("TrainingResult", ["model", "n_jobs", "wall_seconds", "cpu_seconds"])
+
+# a FeatureMatrix as sent to the training processes: its arrays saved as .npy files, see share_matrix
+SharedMatrix = namedtuple("SharedMatrix", ["path", "columns", "extra_paths"])
+
+
+def share_matrix(df, directory):
+    """What to send to the training processes for df: a SharedMatrix for a FeatureMatrix, else df itself."""
+    if not isinstance(df, FeatureMatrix):
+        return df
+    path = os.path.join(directory, "features.npy")
+    np.save(path, df.values)
+    extra_paths = {}
+    for position, (name, column) in enumerate(df.extras.items()):
+        extra_paths[name] = os.path.join(directory, f"extra-{position}.npy")
+        np.save(extra_paths[name], column)
+    return SharedMatrix(path, df.feature_columns, extra_paths)
+
+
+def attach_matrix(df):
+    """The training data behind share_matrix(df), memory-mapped read-only (runs in a training process)."""
+    if isinstance(df, SharedMatrix):
+        extras = {name: np.load(path, mmap_mode='r') for name, path in df.extra_paths.items()}
+        return FeatureMatrix(np.load(df.path, mmap_mode='r'), df.columns, extras)
+    return df
+
+
+def core_budgets(model_names, cores=TRAINING_CORES):
+    """
+    Threads per model, adding up to at most `cores` (when there are at least as many cores as
+    models): one per model, and the spare cores split by TRAINING_CORE_WEIGHTS.
+    """
+    budgets = {name: 1 for name in model_names}
+    weighted = [name for name in model_names if name in TRAINING_CORE_WEIGHTS]
+    spare = cores - len(model_names)
+    if not weighted or spare <= 0:
+        return budgets
+    total_weight = sum(TRAINING_CORE_WEIGHTS[name] for name in weighted)
+    shares = {name: spare * TRAINING_CORE_WEIGHTS[name] / total_weight for name in weighted}
+    for name in weighted:
+        budgets[name] += int(shares[name])
+    # cores left over by rounding down go to the largest remainders
+    left = spare - sum(int(share) for share in shares.values())
+    for name in sorted(weighted, key=lambda name: shares[name] - int(shares[name]), reverse=True)[:left]:
+        budgets[name] += 1
+    return budgets
+
+
+def fit_model(model_name, df, n_jobs):
+    """Train one registered model within n_jobs threads (runs in a training process)."""
+    from threadpoolctl import threadpool_limits
+
+    cls, train_method = model_class(model_name), MODEL_SPECS[model_name][1]
+    df = attach_matrix(df)
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    with threadpool_limits(limits=n_jobs):
+        model = cls(df, n_jobs=n_jobs) if model_name in TRAINING_CORE_WEIGHTS else cls(df)
+        getattr(model, train_method)()
+    wall_seconds, cpu_seconds = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    model.df = None  # the caller has the frame: do not send it back
+    return TrainingResult(model, n_jobs, wall_seconds, cpu_seconds)
+
+
+def train_parallel(df, model_names=None, cores=TRAINING_CORES):
+    """
+    Train the given registered models (default: all) concurrently, one process each.
+    Returns {model name: TrainingResult} in the order given; the models hold df again.
+    With fewer cores than models, at most `cores` models train at a time.
+    """
+    model_names = list(model_names or MODEL_SPECS)
+    budgets = core_budgets(model_names, cores)
+    # biggest budgets (the slowest models) first, in case they have to queue
+    order = sorted(model_names, key=lambda name: TRAINING_CORE_WEIGHTS.get(name, 0), reverse=True)
+    context = multiprocessing.get_context(WORKER_START_METHOD)
+    with tempfile.TemporaryDirectory(prefix="training-") as directory, \
+            ProcessPoolExecutor(max_workers=max(1, min(len(model_names), cores)), mp_context=context) as pool:
+        shared = share_matrix(df, directory)
+        futures = {name: pool.submit(fit_model, name, shared, budgets[name]) for name in order}
+        results = {name: futures[name].result() for name in model_names}
+    for result in results.values():
+        result.model.df = df
+    return results
+
+
+def format_result(model_name, result):
+    return (f"{model_name}: trained in {result.wall_seconds:.2f}s "
+            f"({result.cpu_seconds:.2f}s CPU, {result.n_jobs} core{'s' if result.n_jobs != 1 else ''})")
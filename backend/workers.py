@@ -0,0 +1,127 @@
+import asyncio
+import importlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+'''
+Process pool and admission control for CPU-bound work (model and clustering fits, plots).
+
+Only pure module-level functions and plain data (numpy arrays, small frames, params) are
+sent to the workers; every cache stays in the API process. The pool only exists once
+start_process_pool() was called (the API does so at startup); before that, and for
+scripts and notebooks, run_in_pool and map_in_pool simply run the work inline.
+
+Environment:
+CPU_WORKERS      worker processes (default min(4, cpu count)); 0 keeps all work in-process
+CPU_QUEUE_DEPTH  CPU-bound requests admitted at once, running or queued (default 4 per worker);
+                 further ones are rejected with WorkerPoolBusy (HTTP 503) instead of queueing
+'''
+
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", min(4, os.cpu_count() or 1)))
+CPU_QUEUE_DEPTH = int(os.environ.get("CPU_QUEUE_DEPTH", max(CPU_WORKERS, 1) * 4))
+
+# "spawn" starts clean interpreters: forking a server process that already runs threads is unsafe
+WORKER_START_METHOD = os.environ.get("WORKER_START_METHOD", "spawn")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class WorkerPoolBusy(RuntimeError):
+    """Raised when CPU_QUEUE_DEPTH CPU-bound requests are already admitted."""
+
+
+# ---------------------- Process Pool ---------------------- #
+
+
+def _import_modules(modules):
+    for module in modules:
+        importlib.import_module(module)
+
+
+def start_process_pool(preload_modules=()):
+    """
+    Start the process-wide pool (no-op when CPU_WORKERS=0 or already started) and import
+    preload_modules in every worker in the background, so the first task does not pay for it.
+    """
+    global _pool
+    if CPU_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=CPU_WORKERS,
+                mp_context=multiprocessing.get_context(WORKER_START_METHOD))
+            for _ in range(CPU_WORKERS):
+                _pool.submit(_import_modules, list(preload_modules))
+        return _pool
+
+
+def process_pool_running():
+    """True while the pool started by start_process_pool is up: pool tasks run in other processes."""
+    return _pool is not None
+
+
+def run_in_pool(fn, *args):
+    """fn(*args) in a worker process if the pool is running, else in the calling thread."""
+    pool = _pool
+    if pool is None:
+        return fn(*args)
+    return pool.submit(fn, *args).result()
+
+
+def map_in_pool(fn, *iterables):
+    """list(map(fn, ...)) across the process pool; inline without a pool or for a single task."""
+    tasks = list(zip(*iterables))
+    pool = _pool
+    if pool is None or len(tasks) <= 1:
+        return [fn(*args) for args in tasks]
+    return [future.result() for future in [pool.submit(fn, *args) for args in tasks]]
+
+
+def shutdown_process_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+# ---------------------- Admission Control ---------------------- #
+
+_admitted = 0
+_admitted_lock = threading.Lock()
+
+
+@contextmanager
+def admit():
+    """Reserve one of the CPU_QUEUE_DEPTH slots for the duration of the block, or raise WorkerPoolBusy."""
+    global _admitted
+    with _admitted_lock:
+        if _admitted >= CPU_QUEUE_DEPTH:
+            raise WorkerPoolBusy(f"{_admitted} CPU-bound requests already in progress")
+        _admitted += 1
+    try:
+        yield
+    finally:
+        with _admitted_lock:
+            _admitted -= 1
+
+
+def admitted_count():
+    return _admitted
+
+
+async def offload(fn, *args, **kwargs):
+    """
+    Run a CPU-bound request body from an async handler without blocking the event loop.
+
+    fn runs on a thread, where it consults the caches and hands its heavy stages to the
+    process pool with run_in_pool; the slot is held until it finishes. Raises
+    WorkerPoolBusy right away when the queue is full.
+    """
+    with admit():
+        return await asyncio.to_thread(fn, *args, **kwargs)